@@ -3,34 +3,155 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 from datetime import datetime
-from utils import get_table_cached
-
-def run():
-    st.title("📊 Dashboard Penjualan Optik")
-
-    df = get_table_cached("pembayaran")
-    df_transaksi = get_table_cached("transaksi_detail")
+from utils import get_rollup
+
+KOLOM_PEMBAYARAN = [
+    "id", "tanggal_bayar", "nominal_pembayaran", "user_name",
+    "id_transaksi", "nama", "total_harga", "status"
+]
+KOLOM_TRANSAKSI = [
+    "id", "tanggal", "status_frame", "harga_frame",
+    "status_lensa", "tipe_lensa", "jenis_lensa"
+]
+
+# ==============================
+# FUNGSI KATEGORI FRAME
+# ==============================
+# Sekaligus satu kolom: harga kosong/bukan angka jatuh ke ">Rp1.500.000",
+# tanpa kolom harga_frame dianggap 0, sama seperti versi per baris
+def kategorikan_frame(df):
+    if "harga_frame" in df.columns:
+        harga = pd.to_numeric(df["harga_frame"], errors="coerce")
+    else:
+        harga = pd.Series(0, index=df.index)
+
+    return np.select(
+        [
+            df["status_frame"] == "Punya Sendiri",
+            harga < 300000,
+            harga < 700000,
+            harga < 1500000,
+        ],
+        [
+            "Punya Sendiri",
+            "<Rp300.000",
+            "Rp300.000 - Rp700.000",
+            "Rp700.000 - Rp1.500.000",
+        ],
+        default=">Rp1.500.000"
+    )
 
+# ==============================
+# ROLLUP PEMBAYARAN
+# ==============================
+# Nominal & jumlah pembayaran per hari + 5 pembayaran terbaru
+def agregasi_pembayaran(df):
+    kosong = {
+        "jumlah_baris": len(df),
+        "harian": pd.DataFrame(
+            {"nominal": pd.Series(dtype="float64"), "jumlah": pd.Series(dtype="int64")},
+            index=pd.DatetimeIndex([], name="tanggal_bayar")
+        ),
+        "terbaru": pd.DataFrame(columns=KOLOM_PEMBAYARAN),
+    }
     if df.empty:
-        st.warning("Data pembayaran belum tersedia.")
-        return
+        return kosong
 
-    required_cols = ["tanggal_bayar", "nominal_pembayaran", "user_name"]
-    for col in required_cols:
-        if col not in df.columns:
-            st.error(f"Kolom {col} tidak ditemukan di Supabase.")
-            st.stop()
-
-    # Bersihkan data pembayaran
+    df = df.copy()
     df["nominal_pembayaran"] = pd.to_numeric(
         df["nominal_pembayaran"], errors="coerce"
     ).fillna(0)
-
     df["tanggal_bayar"] = pd.to_datetime(df["tanggal_bayar"], errors="coerce")
     df = df.dropna(subset=["tanggal_bayar"])
 
-    df["tahun"] = df["tanggal_bayar"].dt.year
-    df["bulan"] = df["tanggal_bayar"].dt.month
+    if df.empty:
+        return kosong
+
+    harian = df.groupby(df["tanggal_bayar"].dt.normalize()).agg(
+        nominal=("nominal_pembayaran", "sum"),
+        jumlah=("nominal_pembayaran", "size")
+    )
+
+    return {
+        "jumlah_baris": kosong["jumlah_baris"],
+        "harian": harian,
+        "terbaru": ambil_terbaru(df),
+    }
+
+def ambil_terbaru(df):
+    return df.sort_values(["tanggal_bayar", "id"], ascending=False).head(5)
+
+def gabung_pembayaran(lama, baru):
+    return {
+        "jumlah_baris": lama["jumlah_baris"] + baru["jumlah_baris"],
+        "harian": pd.concat([lama["harian"], baru["harian"]]).groupby(level=0).sum(),
+        "terbaru": ambil_terbaru(pd.concat([lama["terbaru"], baru["terbaru"]])),
+    }
+
+# ==============================
+# ROLLUP KATEGORI PENJUALAN
+# ==============================
+# Jumlah item per (dimensi, tahun, bulan, nilai):
+# dimensi "frame" (kategori harga), "status_lensa", "tipe_jenis"
+def agregasi_kategori(df):
+    kolom = ["dimensi", "tahun", "bulan", "nilai", "jumlah"]
+    if df.empty:
+        return pd.DataFrame(columns=kolom)
+
+    df = df.copy()
+    df.columns = df.columns.str.lower()
+    df["tanggal"] = pd.to_datetime(df["tanggal"], errors="coerce")
+    df = df.dropna(subset=["tanggal"])
+
+    dimensi = {
+        "frame": kategorikan_frame(df),
+        "status_lensa": df["status_lensa"],
+        "tipe_jenis": df["tipe_lensa"] + " — " + df["jenis_lensa"],
+    }
+
+    df_long = pd.concat([
+        pd.DataFrame({
+            "dimensi": nama,
+            "tahun": df["tanggal"].dt.year,
+            "bulan": df["tanggal"].dt.month,
+            "nilai": nilai,
+        })
+        for nama, nilai in dimensi.items()
+    ]).dropna(subset=["nilai"])
+
+    return (
+        df_long
+        .groupby(["dimensi", "tahun", "bulan", "nilai"], as_index=False)
+        .size()
+        .rename(columns={"size": "jumlah"})
+    )
+
+def gabung_kategori(lama, baru):
+    return (
+        pd.concat([lama, baru])
+        .groupby(["dimensi", "tahun", "bulan", "nilai"], as_index=False)["jumlah"]
+        .sum()
+    )
+
+def run():
+    st.title("📊 Dashboard Penjualan Optik")
+
+    rollup_bayar = get_rollup(
+        "dashboard_pembayaran", "pembayaran", KOLOM_PEMBAYARAN,
+        agregasi_pembayaran, gabung_pembayaran
+    )
+    df_kategori = get_rollup(
+        "dashboard_kategori", "transaksi_detail", KOLOM_TRANSAKSI,
+        agregasi_kategori, gabung_kategori
+    )
+
+    if rollup_bayar is None or rollup_bayar["jumlah_baris"] == 0:
+        st.warning("Data pembayaran belum tersedia.")
+        return
+
+    harian = rollup_bayar["harian"]
+    tahun_harian = harian.index.year
+    bulan_harian = harian.index.month
 
     now = datetime.now()
     bulan_sekarang = now.month
@@ -39,14 +160,14 @@ def run():
     # =========================
     # KPI SECTION
     # =========================
-    df_bulan_ini = df[
-        (df["tahun"] == tahun_sekarang) &
-        (df["bulan"] == bulan_sekarang)
+    df_bulan_ini = harian[
+        (tahun_harian == tahun_sekarang) &
+        (bulan_harian == bulan_sekarang)
     ]
 
-    total_bulan_ini = df_bulan_ini["nominal_pembayaran"].sum()
-    total_tahun_ini = df[df["tahun"] == tahun_sekarang]["nominal_pembayaran"].sum()
-    total_transaksi = len(df_bulan_ini)
+    total_bulan_ini = df_bulan_ini["nominal"].sum()
+    total_tahun_ini = harian[tahun_harian == tahun_sekarang]["nominal"].sum()
+    total_transaksi = int(df_bulan_ini["jumlah"].sum())
 
     col1, col2, col3 = st.columns(3)
     col1.metric("💰 Bulan Ini", f"Rp {total_bulan_ini:,.0f}".replace(",", "."))
@@ -58,15 +179,17 @@ def run():
     # =========================
     # GRAFIK BULANAN
     # =========================
-    tahun_list = sorted(df["tahun"].unique())
+    tahun_list = sorted(tahun_harian.unique())
     tahun_pilih = st.selectbox("Pilih Tahun", tahun_list, index=len(tahun_list)-1)
 
-    df_tahun = df[df["tahun"] == tahun_pilih]
+    df_tahun = harian[tahun_harian == tahun_pilih]
 
     df_chart = (
-        df_tahun
-        .groupby("bulan", as_index=False)["nominal_pembayaran"]
+        df_tahun["nominal"]
+        .groupby(df_tahun.index.month)
         .sum()
+        .rename_axis("bulan")
+        .reset_index(name="nominal_pembayaran")
         .sort_values("bulan")
     )
     df_chart["nominal_format"] = df_chart["nominal_pembayaran"] \
@@ -114,72 +237,43 @@ def run():
     # =========================
     st.subheader("📦 Kategori Penjualan", divider="rainbow")
 
-    if df_transaksi.empty:
+    if df_kategori is None or df_kategori.empty:
         st.warning("Data transaksi detail belum tersedia.")
-    else:
-        df_transaksi.columns = df_transaksi.columns.str.lower()
+        df_kategori = agregasi_kategori(pd.DataFrame())
 
-        # Parse tanggal
-        df_transaksi["tanggal"] = pd.to_datetime(df_transaksi["tanggal"], errors="coerce")
-        df_transaksi = df_transaksi.dropna(subset=["tanggal"])
-        df_transaksi["tahun_t"] = df_transaksi["tanggal"].dt.year
-        df_transaksi["bulan_t"] = df_transaksi["tanggal"].dt.month
-
-        df_trx_bulan = df_transaksi[
-            (df_transaksi["tahun_t"] == tahun_sekarang) &
-            (df_transaksi["bulan_t"] == bulan_sekarang)
-        ]
-
-        # ==============================
-        # FUNGSI KATEGORI FRAME
-        # ==============================
-        def kategorikan_frame(row):
-            if row["status_frame"] == "Punya Sendiri":
-                return "Punya Sendiri"
-            harga = pd.to_numeric(row.get("harga_frame", 0), errors="coerce") or 0
-            if harga < 300000:
-                return "<Rp300.000"
-            elif harga < 700000:
-                return "Rp300.000 - Rp700.000"
-            elif harga < 1500000:
-                return "Rp700.000 - Rp1.500.000"
-            else:
-                return ">Rp1.500.000"
-
-        df_transaksi["kategori_frame"] = df_transaksi.apply(kategorikan_frame, axis=1)
-        df_trx_bulan["kategori_frame"] = df_trx_bulan.apply(kategorikan_frame, axis=1)
-
-        # Hitung frame
-        urutan_frame = [
-            "<Rp300.000",
-            "Rp300.000 - Rp700.000",
-            "Rp700.000 - Rp1.500.000",
-            ">Rp1.500.000",
-            "Punya Sendiri"
+    def tabel_kategori(dimensi):
+        df_dimensi = df_kategori[df_kategori["dimensi"] == dimensi]
+        df_dimensi_bulan = df_dimensi[
+            (df_dimensi["tahun"] == tahun_sekarang) &
+            (df_dimensi["bulan"] == bulan_sekarang)
         ]
 
-        frame_total = df_transaksi["kategori_frame"].value_counts().rename("Total")
-        frame_bulan = df_trx_bulan["kategori_frame"].value_counts().rename("Bulan Ini")
+        total = df_dimensi.groupby("nilai")["jumlah"].sum().sort_values(ascending=False)
+        bulan = df_dimensi_bulan.groupby("nilai")["jumlah"].sum().sort_values(ascending=False)
 
-        df_frame_tabel = pd.DataFrame({
-            "Bulan Ini": frame_bulan,
-            "Total": frame_total
+        return pd.DataFrame({
+            "Bulan Ini": bulan,
+            "Total": total
         }).fillna(0).astype(int)
 
-        df_frame_tabel = df_frame_tabel.reindex(
-            [k for k in urutan_frame if k in df_frame_tabel.index]
-        )
-        df_frame_tabel.index.name = "Kategori Frame"
+    # Hitung frame
+    urutan_frame = [
+        "<Rp300.000",
+        "Rp300.000 - Rp700.000",
+        "Rp700.000 - Rp1.500.000",
+        ">Rp1.500.000",
+        "Punya Sendiri"
+    ]
 
-        # Hitung status lensa
-        status_total = df_transaksi["status_lensa"].value_counts().rename("Total")
-        status_bulan = df_trx_bulan["status_lensa"].value_counts().rename("Bulan Ini")
+    df_frame_tabel = tabel_kategori("frame")
+    df_frame_tabel = df_frame_tabel.reindex(
+        [k for k in urutan_frame if k in df_frame_tabel.index]
+    )
+    df_frame_tabel.index.name = "Kategori Frame"
 
-        df_status_tabel = pd.DataFrame({
-            "Bulan Ini": status_bulan,
-            "Total": status_total
-        }).fillna(0).astype(int)
-        df_status_tabel.index.name = "Status Lensa"
+    # Hitung status lensa
+    df_status_tabel = tabel_kategori("status_lensa")
+    df_status_tabel.index.name = "Status Lensa"
 
     # Urutan fix sesuai tabel lensa
     urutan_tipe_jenis = [
@@ -193,16 +287,7 @@ def run():
         "Single Vision — Photochromic",
         "Single Vision — Photochromic Bluray",
     ]       
-    df_transaksi["tipe_jenis"] = df_transaksi["tipe_lensa"] + " — " + df_transaksi["jenis_lensa"]
-    df_trx_bulan["tipe_jenis"] = df_trx_bulan["tipe_lensa"] + " — " + df_trx_bulan["jenis_lensa"]
-
-    tipejenis_total = df_transaksi["tipe_jenis"].value_counts().rename("Total")
-    tipejenis_bulan = df_trx_bulan["tipe_jenis"].value_counts().rename("Bulan Ini")
-
-    df_tipejenis_tabel = pd.DataFrame({
-        "Bulan Ini": tipejenis_bulan,
-        "Total": tipejenis_total
-    }).fillna(0).astype(int)
+    df_tipejenis_tabel = tabel_kategori("tipe_jenis")
 
     # Filter hanya yang ada di urutan, lalu reindex sesuai urutan
     df_tipejenis_tabel = df_tipejenis_tabel.reindex(
@@ -236,7 +321,7 @@ def run():
     # =========================
     st.subheader("🕒 Transaksi Terbaru", divider="rainbow")
 
-    df_latest = df.sort_values("tanggal_bayar", ascending=False).head(5)
+    df_latest = rollup_bayar["terbaru"]
     df_latest_display = df_latest[[
         "tanggal_bayar",
         "id_transaksi",
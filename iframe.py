@@ -1,5 +1,5 @@
 import streamlit as st
-from utils import get_table_raw, get_supabase, catat_logframe_supabase
+from utils import get_table_raw, insert_row_supabase, adjust_stock, catat_logframe_supabase
 
 
 def run():
@@ -10,7 +10,6 @@ def run():
         st.session_state.last_action = None
 
     user = st.session_state.get("user", "Unknown")
-    supabase = get_supabase()
 
     # ==============================
     # AMBIL DATA FRESH
@@ -57,26 +56,21 @@ def run():
                 return
 
             row_id = int(row["id"].values[0])
-            stock_lama = int(row["stock"].values[0] or 0)
-            stock_baru = stock_lama + jumlah_input
 
             try:
-                response = (
-                    supabase.table("frames")
-                    .update({"stock": stock_baru})
-                    .eq("id", row_id)
-                    .execute()
-                )
+                hasil = adjust_stock("frames", {"id": row_id}, jumlah_input)
 
-                if not response.data:
+                if hasil is None:
                     st.error("Update gagal.")
-                    st.write(response)
                     return
 
             except Exception as e:
                 st.error(f"Supabase error: {e}")
                 return
 
+            stock_lama = hasil["stock_lama"]
+            stock_baru = hasil["stock_baru"]
+
             catat_logframe_supabase(
                 merk=selected_merk,
                 kode=selected_kode,
@@ -116,14 +110,14 @@ def run():
                 return
 
             try:
-                response = supabase.table("frames").insert({
+                response = insert_row_supabase("frames", {
                     "merk": selected_merk,
                     "kode": selected_kode,
                     "distributor": distributor,
                     "harga_modal": harga_modal,
                     "harga_jual": harga_jual,
                     "stock": stock_baru
-                }).execute()
+                })
 
                 if not response.data:
                     st.error("Insert gagal.")
@@ -186,14 +180,14 @@ def run():
                 return
 
             try:
-                response = supabase.table("frames").insert({
+                response = insert_row_supabase("frames", {
                     "merk": selected_merk,
                     "kode": selected_kode,
                     "distributor": distributor,
                     "harga_modal": harga_modal,
                     "harga_jual": harga_jual,
                     "stock": stock_baru
-                }).execute()
+                })
 
                 if not response.data:
                     st.error("Insert gagal.")
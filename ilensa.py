@@ -1,6 +1,6 @@
 import streamlit as st
 from datetime import datetime
-from utils import get_table_raw, get_supabase, catat_loglensa_supabase
+from utils import get_table_raw, adjust_stock, catat_loglensa_supabase
 
 
 def run():
@@ -15,7 +15,6 @@ def run():
         st.session_state.last_lensa_action = None
 
     user = st.session_state.get("user", "Unknown")
-    supabase = get_supabase()
 
     # ==============================
     # AMBIL DATA DARI SUPABASE
@@ -103,26 +102,25 @@ def run():
                 df_lensa["add_power"] == str(selected_add)
             ]
 
-        stock_lama = int(filter_stock["stock"].values[0])
-        stock_baru = stock_lama + jumlah_input
+        if filter_stock.empty:
+            st.error("Data lensa tidak ditemukan.")
+            return
 
         # ==============================
         # UPDATE STOCK DI SUPABASE
         # ==============================
-        query = supabase.table("lensa") \
-            .update({"stock": stock_baru}) \
-            .eq("jenis", selected_jenis) \
-            .eq("tipe", selected_tipe) \
-            .eq("merk", selected_merk) \
-            .eq("sph", selected_sph) \
-            .eq("cyl", selected_cyl)
-
-        if selected_tipe == "Single Vision":
-            query = query.is_("add_power", None)
-        else:
-            query = query.eq("add_power", selected_add)
-
-        query.execute()
+        try:
+            hasil = adjust_stock("lensa", {"id": int(filter_stock["id"].values[0])}, jumlah_input)
+        except Exception as e:
+            st.error(f"Supabase error: {e}")
+            return
+
+        if hasil is None:
+            st.error("Update gagal.")
+            return
+
+        stock_lama = hasil["stock_lama"]
+        stock_baru = hasil["stock_baru"]
 
         # ==============================
         # CATAT LOG
@@ -3,10 +3,10 @@ import pandas as pd
 from datetime import datetime, date
 from zoneinfo import ZoneInfo
 from utils import (
-    get_table_cached, insert_row_supabase, get_supabase, 
+    get_table_cached, get_lensa_catalog, get_cascade, cascade_opsi, insert_row_supabase, insert_rows_supabase, adjust_stock_batch,
     generate_id_pembayaran_supabase, generate_id_transaksi_supabase, 
     get_or_create_pelanggan_id_supabase, cari_harga_lensa_luar, cari_harga_lensa_stock, 
-    catat_logframe_supabase, catat_loglensa_supabase
+    buat_row_logframe, buat_row_loglensa, LOG_KEY, invalidate_tables
     )
 
 @st.dialog("✅ Pembayaran Berhasil")
@@ -23,31 +23,23 @@ def dialog_ringkasan_kasir(data, reset_func):
         st.rerun()
         
 def run():
-    @st.cache_data(ttl=60)
     def load_data():
-        df_frame = get_table_cached("frames")
-        df_lensa_stock = get_table_cached("lensa")
+        df_frame = get_table_cached("frames", columns=["id", "merk", "kode", "harga_jual", "stock"])
         df_lensa_luar = get_table_cached("lensa_luar_stock")
 
-        return df_frame, df_lensa_stock, df_lensa_luar
+        return df_frame, df_lensa_luar
 
-    df_frame, df_lensa_stock, df_lensa_luar = load_data()
+    df_frame, df_lensa_luar = load_data()
+    # Katalog lensa stock sudah dinormalisasi di utils, hanya dibaca
+    katalog_lensa = get_lensa_catalog()
+    df_lensa_stock = katalog_lensa["df"]
     
     df_frame.columns = df_frame.columns.str.lower()
-    df_lensa_stock.columns = df_lensa_stock.columns.str.lower()
     df_lensa_luar.columns = df_lensa_luar.columns.str.lower()
-    
-    def format_2digit(val):
-        try:
-            return f"{float(val):.2f}"
-        except Exception:
-            return str(val).strip() if val is not None else ""
-        
-    df_lensa_stock['sph'] = df_lensa_stock['sph'].apply(format_2digit)
-    df_lensa_stock['cyl'] = df_lensa_stock['cyl'].apply(format_2digit)
-    df_lensa_stock['add_power'] = df_lensa_stock['add_power'].apply(format_2digit)
-    for col in ['jenis', 'tipe', 'merk']:
-        df_lensa_stock[col] = df_lensa_stock[col].astype(str).str.strip()
+
+    # Index pilihan bertingkat, dibangun ulang hanya kalau versi tabel berubah
+    cascade_frame = get_cascade(df_frame, ["merk", "kode"])
+    cascade_luar = get_cascade(df_lensa_luar, ["status", "tipe", "merk", "jenis", "nama_lensa"])
     
 
     st.title("🧾 Transaksi Kasir")
@@ -71,10 +63,10 @@ def run():
     st.subheader("➕ Tambah Item")
     status_frame = st.selectbox("Status Frame", ["Stock", "Punya Sendiri"])
     if status_frame == "Stock":
-        merk_options = [""] + sorted(df_frame['merk'].dropna().unique())
+        merk_options = [""] + list(cascade_opsi(cascade_frame))
         merk_frame = st.selectbox("Merk Frame", merk_options, format_func=lambda x: "-- Pilih Merk --" if x == "" else x)
         if merk_frame:
-            kode_options = [""] + sorted(df_frame[df_frame['merk'] == merk_frame]['kode'].dropna().unique())
+            kode_options = [""] + list(cascade_opsi(cascade_frame, merk_frame))
         else:
             kode_options = [""]            
         kode_frame = st.selectbox("Kode Frame", kode_options, format_func=lambda x: "-- Pilih Kode --" if x == "" else x)
@@ -87,31 +79,21 @@ def run():
         
     status_lensa = st.selectbox("Status Lensa", ["Stock", "Inti", "Pesan", "Overlens"])
     if status_lensa == "Stock":
-        df_lensa = df_lensa_stock.copy()
+        df_lensa = katalog_lensa["df"]
+        cascade_lensa = katalog_lensa["cascade"]
         # Tipe Lensa
-        tipe_option = sorted(df_lensa['tipe'].dropna().unique())
-        tipe_lensa = st.selectbox("Tipe Lensa", tipe_option)
+        tipe_lensa = st.selectbox("Tipe Lensa", cascade_opsi(cascade_lensa))
         # Merk Lensa
-        df_merk = df_lensa[df_lensa['tipe'] == tipe_lensa]
-        merk_option = sorted(df_merk['merk'].dropna().unique())
-        merk_lensa = st.selectbox("Merk Lensa", merk_option)
+        merk_lensa = st.selectbox("Merk Lensa", cascade_opsi(cascade_lensa, tipe_lensa))
         # Jenis Lensa
-        df_jenis = df_lensa[(df_lensa['tipe'] == tipe_lensa) & (df_lensa['merk'] == merk_lensa)]
-        jenis_option = sorted(df_jenis['jenis'].dropna().unique())
-        jenis_lensa = st.selectbox("Jenis Lensa", jenis_option)
+        jenis_lensa = st.selectbox("Jenis Lensa", cascade_opsi(cascade_lensa, tipe_lensa, merk_lensa))
     else:
-        df_lensa = df_lensa_luar[df_lensa_luar['status'] == status_lensa].copy()
         # Tipe Lensa
-        tipe_option = sorted(df_lensa['tipe'].dropna().unique())
-        tipe_lensa = st.selectbox("Tipe Lensa", tipe_option)
+        tipe_lensa = st.selectbox("Tipe Lensa", cascade_opsi(cascade_luar, status_lensa))
         # Merk Lensa
-        df_merk = df_lensa[df_lensa['tipe'] == tipe_lensa]
-        merk_option = sorted(df_merk['merk'].dropna().unique())
-        merk_lensa = st.selectbox("Merk Lensa", merk_option)
+        merk_lensa = st.selectbox("Merk Lensa", cascade_opsi(cascade_luar, status_lensa, tipe_lensa))
         # Jenis Lensa
-        df_jenis = df_lensa[(df_lensa['tipe'] == tipe_lensa) & (df_lensa['merk'] == merk_lensa)]
-        jenis_option = sorted(df_jenis['jenis'].dropna().unique())
-        jenis_lensa = st.selectbox("Jenis Lensa", jenis_option)
+        jenis_lensa = st.selectbox("Jenis Lensa", cascade_opsi(cascade_luar, status_lensa, tipe_lensa, merk_lensa))
     # Nama Lensa hanya untuk non-stock
     nama_lensa = ""
     if status_lensa == "Stock":
@@ -119,29 +101,26 @@ def run():
         st.markdown("**Ukuran Lensa**")     
         colR, colL = st.columns(2)
         # List Ukuran
-        sph_list = sorted(df_lensa['sph'].dropna().unique())
-        cyl_list = sorted(df_lensa['cyl'].dropna().unique())
-        add_list = sorted(df_lensa['add_power'].dropna().unique())
+        sph_list = katalog_lensa["sph"]
+        cyl_list = katalog_lensa["cyl"]
+        add_list = katalog_lensa["add_power"]
 
         with colR:
             sph_r = st.selectbox("SPH R", sph_list, index = sph_list.index("0.00"))
             cyl_r = st.selectbox("CYL R", cyl_list, index = cyl_list.index("0.00"))
             axis_r = st.selectbox("Axis R", list(range(0, 181))) if cyl_r != "0.00" else None
-            add_r = st.selectbox("Add R", sorted(df_lensa['add_power'].dropna().unique())) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else None
+            add_r = st.selectbox("Add R", add_list) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else None
         with colL:
             sph_l = st.selectbox("SPH L", sph_list, index = sph_list.index("0.00"))
             cyl_l = st.selectbox("CYL L", cyl_list, index = cyl_list.index("0.00"))
             axis_l = st.selectbox("Axis L", list(range(0, 181))) if cyl_l != "0.00" else None
-            add_l = st.selectbox("Add L", sorted(df_lensa['add_power'].dropna().unique())) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else None
+            add_l = st.selectbox("Add L", add_list) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else None
     
     else:
         keterangan = st.text_input("Keterangan", key="keterangan")
-        df_lensa.columns = df_lensa.columns.str.lower().str.strip().str.replace(" ", "_")
-        nama_lensa = st.selectbox("Nama Lensa", sorted(df_lensa[
-            (df_lensa['jenis'] == jenis_lensa) & 
-            (df_lensa['tipe'] == tipe_lensa) & 
-            (df_lensa['merk'] == merk_lensa)
-        ]['nama_lensa'].dropna().unique()))
+        nama_lensa = st.selectbox("Nama Lensa", cascade_opsi(
+            cascade_luar, status_lensa, tipe_lensa, merk_lensa, jenis_lensa
+        ))
                 
         st.markdown("**Ukuran Lensa**")
         colR, colL = st.columns(2)
@@ -177,7 +156,7 @@ def run():
             st.stop()
 
     else:
-        harga_lensa = cari_harga_lensa_luar(df_lensa, tipe_lensa, jenis_lensa, nama_lensa, sph_r, cyl_r, add_dipakai, False)
+        harga_lensa = cari_harga_lensa_luar(df_lensa_luar, tipe_lensa, jenis_lensa, nama_lensa, sph_r, cyl_r, add_dipakai, False, status=status_lensa)
         if harga_lensa is None:
             st.warning("⚠️ Ukuran tidak sesuai rentang harga manapun!")
             st.stop()
@@ -383,26 +362,13 @@ def run():
             item['subtotal_setelah_pembulatan'] = subtotal
 
         # ==============================
-        # INSERT HEADER TRANSAKSI
-        # ==============================
-        insert_row_supabase("transaksi", {
-            "id_transaksi": id_transaksi,
-            "tanggal": tanggal_transaksi,
-            "id_pelanggan": id_pelanggan,
-            "nama": nama,
-            "total_harga": harga_final,
-            "user_name": user
-        })
-
-        # ==============================
-        # INSERT DETAIL + UPDATE STOCK + LOG
+        # SUSUN DETAIL + ITEM STOCK
         # ==============================
-        supabase = get_supabase()
+        detail_rows = []
+        stock_items = []
 
         for item in st.session_state.daftar_item:
-
-            # INSERT DETAIL
-            insert_row_supabase("transaksi_detail", {
+            detail_rows.append({
                 "timestamp_log": datetime.now().replace(microsecond=0),
                 "tanggal": tanggal_transaksi,
                 "id_transaksi": id_transaksi,
@@ -434,101 +400,104 @@ def run():
                 "user_name": user
             })
 
-            # ==========================
-            # UPDATE STOCK FRAME
-            # ==========================
             if item['status_frame'] == "Stock":
-                frame = supabase.table("frames") \
-                    .select("stock") \
-                    .eq("merk", item['merk_frame']) \
-                    .eq("kode", item['kode_frame']) \
-                    .execute()
-
-                if frame.data:
-                    stock_lama = frame.data[0]["stock"] or 0
-                    stock_baru = max(0, stock_lama - 1)
-
-                    supabase.table("frames") \
-                        .update({"stock": stock_baru}) \
-                        .eq("merk", item['merk_frame']) \
-                        .eq("kode", item['kode_frame']) \
-                        .execute()
-
-                    catat_logframe_supabase(
-                        item['merk_frame'],
-                        item['kode_frame'],
-                        "kasir",
-                        status_frame=item['status_frame'],
-                        id_transaksi=id_transaksi,
-                        nama=nama,
-                        user=user
-                    )
-                                        
-            # Update stok lensa
-            if item['status_lensa'] == "Stock":
+                stock_items.append({
+                    "tabel": "frames",
+                    "key": {"merk": item['merk_frame'], "kode": item['kode_frame']},
+                    "delta": -1
+                })
 
+            if item['status_lensa'] == "Stock":
                 for side in ["r", "l"]:
-                    sph = item[f"sph_{side}"]
-                    cyl = item[f"cyl_{side}"]
-                    add = item[f"add_{side}"]
-
-                    # Ambil data dulu
-                    query = supabase.table("lensa") \
-                        .select("stock") \
-                        .eq("tipe", item['tipe_lensa']) \
-                        .eq("jenis", item['jenis_lensa']) \
-                        .eq("merk", item['merk_lensa']) \
-                        .eq("sph", sph) \
-                        .eq("cyl", cyl)
-
-                    if add:
-                        query = query.eq("add_power", add)
-                    else:
-                        query = query.is_("add_power", None)
-
-                    lensa = query.execute()
-
-                    if lensa.data:
-                        stock_lama = lensa.data[0]["stock"] or 0
-                        stock_baru = max(0, stock_lama - 1)
-
-                        # 🔥 UPDATE QUERY TERPISAH
-                        update_query = supabase.table("lensa") \
-                            .update({"stock": stock_baru}) \
-                            .eq("tipe", item['tipe_lensa']) \
-                            .eq("jenis", item['jenis_lensa']) \
-                            .eq("merk", item['merk_lensa']) \
-                            .eq("sph", sph) \
-                            .eq("cyl", cyl)
-
-                        if add:
-                            update_query = update_query.eq("add_power", add)
-                        else:
-                            update_query = update_query.is_("add_power", None)
-
-                        update_query.execute()
-
-                        # Log
-                        catat_loglensa_supabase(
-                            jenis=item['jenis_lensa'],
-                            tipe=item['tipe_lensa'],
-                            merk=item['merk_lensa'],
-                            sph=sph,
-                            cyl=cyl,
-                            add_power=add,
-                            source="kasir",
-                            status_lensa=item['status_lensa'],
-                            id_transaksi=id_transaksi,
-                            nama=nama,
-                            user=user
-                        )
+                    stock_items.append({
+                        "tabel": "lensa",
+                        "key": {
+                            "tipe": item['tipe_lensa'],
+                            "jenis": item['jenis_lensa'],
+                            "merk": item['merk_lensa'],
+                            "sph": item[f"sph_{side}"],
+                            "cyl": item[f"cyl_{side}"],
+                            "add_power": item[f"add_{side}"] or None
+                        },
+                        "delta": -1
+                    })
 
-        # Simpan pembayaran
-        existing = supabase.table("pembayaran") \
-            .select("id") \
-            .eq("id_transaksi", id_transaksi) \
-            .execute()
+        # ==============================
+        # UPDATE STOCK (SATU RPC)
+        # ==============================
+        # Stock yang tidak cukup membatalkan seluruh batch, belum ada yang tersimpan
+        try:
+            hasil_stock = adjust_stock_batch(stock_items)
+        except Exception as e:
+            st.session_state['simpan_pembayaran'] = False
+            st.error(f"❌ Gagal update stock, transaksi dibatalkan: {e}")
+            st.stop()
 
+        # ==============================
+        # INSERT HEADER + DETAIL
+        # ==============================
+        insert_row_supabase("transaksi", {
+            "id_transaksi": id_transaksi,
+            "tanggal": tanggal_transaksi,
+            "id_pelanggan": id_pelanggan,
+            "nama": nama,
+            "total_harga": harga_final,
+            "user_name": user
+        })
+
+        insert_rows_supabase("transaksi_detail", detail_rows)
+
+        # ==============================
+        # LOG (SATU INSERT PER TABEL)
+        # ==============================
+        # Satu log per SKU per transaksi, sama seperti cek duplicate sebelumnya
+        log_frame_rows, log_lensa_rows, sudah_dicatat = [], [], set()
+
+        for hasil in hasil_stock:
+            stock_item = stock_items[hasil["urutan"] - 1]
+            sku = (stock_item["tabel"],) + tuple(stock_item["key"].values())
+            if sku in sudah_dicatat:
+                continue
+            sudah_dicatat.add(sku)
+
+            key = stock_item["key"]
+            if stock_item["tabel"] == "frames":
+                row_log = buat_row_logframe(
+                    key["merk"],
+                    key["kode"],
+                    "kasir",
+                    status_frame="Stock",
+                    stock_lama=hasil["stock_lama"],
+                    stock_baru=hasil["stock_baru"],
+                    id_transaksi=id_transaksi,
+                    nama=nama,
+                    user=user
+                )
+                if row_log:
+                    log_frame_rows.append(row_log)
+            else:
+                row_log = buat_row_loglensa(
+                    jenis=key["jenis"],
+                    tipe=key["tipe"],
+                    merk=key["merk"],
+                    sph=key["sph"],
+                    cyl=key["cyl"],
+                    add_power=key["add_power"],
+                    source="kasir",
+                    status_lensa="Stock",
+                    stock_lama=hasil["stock_lama"],
+                    stock_baru=hasil["stock_baru"],
+                    id_transaksi=id_transaksi,
+                    nama=nama,
+                    user=user
+                )
+                if row_log:
+                    log_lensa_rows.append(row_log)
+
+        insert_rows_supabase("log_frames", log_frame_rows, on_conflict=LOG_KEY)
+        insert_rows_supabase("log_lensa", log_lensa_rows, on_conflict=LOG_KEY)
+
+        # Simpan pembayaran
         pembayaran_ke = 1        
         
         tanggal_bayar = tanggal_str
@@ -561,6 +530,8 @@ def run():
         }
 
         st.session_state['simpan_pembayaran'] = False
+        # Tabel lain sudah ditambal write-through oleh helper insert/adjust_stock
+        invalidate_tables("pelanggan")
         st.rerun()
 
     def reset_form_kasir():
@@ -1,25 +1,34 @@
 import streamlit as st
 import pandas as pd
-from utils import get_table_cached
+from utils import get_table_cached, get_cascade, cascade_opsi, tabel_halaman, get_opsi_log, opsi_status_log
+
+
+def siapkan_tampilan(df):
+    # Format satu halaman log untuk st.dataframe
+    if "timestamp_log" in df.columns:
+        df["timestamp_log"] = pd.to_datetime(df["timestamp_log"], errors="coerce")
+    df = df.drop(columns=["id"], errors="ignore")
+    df.columns = [col.replace("_", " ").title() for col in df.columns]
+    return df
 
 
 def run():
     st.title("📋 Log Aktivitas Frame")
 
-    df = get_table_cached("log_frames")
-
-    if df.empty:
-        st.warning("Belum ada log frame.")
-        return
+    # Pilihan filter dari tabel master frames + kombinasi unik di log
+    # (SKU yang sudah diganti/dihapus tetap bisa dicari), isi log diambil per halaman
+    df_opsi = get_opsi_log("log_frames", ["merk", "kode", "status"])
+    df = pd.concat(
+        [get_table_cached("frames").reindex(columns=["merk", "kode"]), df_opsi[["merk", "kode"]]],
+        ignore_index=True
+    )
 
-    if "timestamp_log" in df.columns:
-        df["timestamp_log"] = pd.to_datetime(df["timestamp_log"], errors="coerce")
-        df = df.sort_values("timestamp_log", ascending=False).reset_index(drop=True)
+    cascade_merk = get_cascade(df, ["merk", "kode"])
 
     # ==============================
     # FILTER SECTION
     # ==============================
-    merk_options = sorted(df["merk"].dropna().unique().tolist())
+    merk_options = list(cascade_opsi(cascade_merk))
 
     col1, col2, col3 = st.columns([3, 3, 2])
 
@@ -34,11 +43,9 @@ def run():
 
     # Kode options bergantung pada merk yang dipilih
     if filter_merk:
-        df_kode_src = df[df["merk"] == filter_merk]
+        kode_options = list(cascade_opsi(cascade_merk, filter_merk))
     else:
-        df_kode_src = df
-
-    kode_options = sorted(df_kode_src["kode"].dropna().unique().tolist())
+        kode_options = list(cascade_opsi(get_cascade(df, ["kode"])))
 
     with col2:
         filter_kode = st.selectbox(
@@ -49,7 +56,7 @@ def run():
             key="logframe_kode"
         )
 
-    status_options = sorted(df["status"].dropna().unique().tolist())
+    status_options = opsi_status_log(df_opsi)
 
     with col3:
         filter_status = st.selectbox(
@@ -67,25 +74,26 @@ def run():
         st.rerun()
 
     # ==============================
-    # APPLY FILTER
+    # APPLY FILTER (DI SERVER)
     # ==============================
-    filtered_df = df.copy()
+    filters = []
 
     if filter_merk:
-        filtered_df = filtered_df[filtered_df["merk"] == filter_merk]
+        filters.append(("eq", "merk", filter_merk))
     if filter_kode:
-        filtered_df = filtered_df[filtered_df["kode"] == filter_kode]
+        filters.append(("eq", "kode", filter_kode))
     if filter_status:
-        filtered_df = filtered_df[filtered_df["status"] == filter_status]
-
-    st.caption(f"Menampilkan {len(filtered_df)} dari {len(df)} log")
+        filters.append(("eq", "status", filter_status))
 
     # ==============================
     # TAMPIL DATA
     # ==============================
-    df_display = filtered_df.drop(columns=["id"], errors="ignore").reset_index(drop=True)
-    df_display.index = df_display.index + 1
-    df_display.index.name = "No"
-    df_display.columns = [col.replace("_", " ").title() for col in df_display.columns]
-
-    st.dataframe(df_display, use_container_width=True)
+    tabel_halaman(
+        "log_frames",
+        key="logframe",
+        filters=filters,
+        order="timestamp_log.desc,id.desc",
+        siapkan=siapkan_tampilan,
+        satuan="log",
+        kosong="Belum ada log frame." if not filters else "Tidak ada data ditemukan."
+    )
@@ -1,25 +1,37 @@
 import streamlit as st
 import pandas as pd
-from utils import get_table_cached
+from utils import get_lensa_catalog, get_cascade, cascade_opsi, tabel_halaman, get_opsi_log, opsi_status_log
+
+
+def siapkan_tampilan(df):
+    # Format satu halaman log untuk st.dataframe
+    if "timestamp_log" in df.columns:
+        df["timestamp_log"] = pd.to_datetime(df["timestamp_log"], errors="coerce")
+    df = df.drop(columns=["id"], errors="ignore")
+    df.columns = [col.replace("_", " ").title() for col in df.columns]
+    return df
 
 
 def run():
     st.title("📋 Log Aktivitas Lensa")
 
-    df = get_table_cached("log_lensa")
+    # Pilihan filter dari katalog lensa + kombinasi unik di log
+    # (lensa yang sudah diganti/dihapus tetap bisa dicari), isi log diambil per halaman
+    df_opsi = get_opsi_log("log_lensa", ["tipe", "merk", "jenis", "status"])
+    df = pd.concat(
+        [
+            get_lensa_catalog()["df"][["tipe", "merk", "jenis"]].astype(object),
+            df_opsi[["tipe", "merk", "jenis"]],
+        ],
+        ignore_index=True
+    )
 
-    if df.empty:
-        st.warning("Belum ada data.")
-        return
-
-    if "timestamp_log" in df.columns:
-        df["timestamp_log"] = pd.to_datetime(df["timestamp_log"], errors="coerce")
-        df = df.sort_values("timestamp_log", ascending=False).reset_index(drop=True)
+    cascade_tipe = get_cascade(df, ["tipe", "merk", "jenis"])
 
     # ==============================
     # FILTER SECTION
     # ==============================
-    tipe_options = sorted(df["tipe"].dropna().unique().tolist())
+    tipe_options = list(cascade_opsi(cascade_tipe))
 
     col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
 
@@ -34,11 +46,9 @@ def run():
 
     # Merk options bergantung tipe
     if filter_tipe:
-        df_merk_src = df[df["tipe"] == filter_tipe]
+        merk_options = list(cascade_opsi(cascade_tipe, filter_tipe))
     else:
-        df_merk_src = df
-
-    merk_options = sorted(df_merk_src["merk"].dropna().unique().tolist())
+        merk_options = list(cascade_opsi(get_cascade(df, ["merk", "jenis"])))
 
     with col2:
         filter_merk = st.selectbox(
@@ -51,26 +61,24 @@ def run():
 
     # Jenis options bergantung tipe + merk
     if filter_tipe and filter_merk:
-        df_jenis_src = df[(df["tipe"] == filter_tipe) & (df["merk"] == filter_merk)]
+        jenis_options = cascade_opsi(cascade_tipe, filter_tipe, filter_merk)
     elif filter_tipe:
-        df_jenis_src = df[df["tipe"] == filter_tipe]
+        jenis_options = cascade_opsi(get_cascade(df, ["tipe", "jenis"]), filter_tipe)
     elif filter_merk:
-        df_jenis_src = df[df["merk"] == filter_merk]
+        jenis_options = cascade_opsi(get_cascade(df, ["merk", "jenis"]), filter_merk)
     else:
-        df_jenis_src = df
-
-    jenis_options = sorted(df_jenis_src["jenis"].dropna().unique().tolist())
+        jenis_options = cascade_opsi(get_cascade(df, ["jenis"]))
 
     with col3:
         filter_jenis = st.selectbox(
             "Jenis",
-            options=[""] + jenis_options,
+            options=[""] + list(jenis_options),
             index=0,
             placeholder="Semua Jenis",
             key="loglensa_jenis"
         )
 
-    status_options = sorted(df["status"].dropna().unique().tolist())
+    status_options = opsi_status_log(df_opsi)
 
     with col4:
         filter_status = st.selectbox(
@@ -89,27 +97,28 @@ def run():
         st.rerun()
 
     # ==============================
-    # APPLY FILTER
+    # APPLY FILTER (DI SERVER)
     # ==============================
-    filtered_df = df.copy()
+    filters = []
 
     if filter_tipe:
-        filtered_df = filtered_df[filtered_df["tipe"] == filter_tipe]
+        filters.append(("eq", "tipe", filter_tipe))
     if filter_merk:
-        filtered_df = filtered_df[filtered_df["merk"] == filter_merk]
+        filters.append(("eq", "merk", filter_merk))
     if filter_jenis:
-        filtered_df = filtered_df[filtered_df["jenis"] == filter_jenis]
+        filters.append(("eq", "jenis", filter_jenis))
     if filter_status:
-        filtered_df = filtered_df[filtered_df["status"] == filter_status]
-
-    st.caption(f"Menampilkan {len(filtered_df)} dari {len(df)} log")
+        filters.append(("eq", "status", filter_status))
 
     # ==============================
     # TAMPIL DATA
     # ==============================
-    df_display = filtered_df.drop(columns=["id"], errors="ignore").reset_index(drop=True)
-    df_display.index = df_display.index + 1
-    df_display.index.name = "No"
-    df_display.columns = [col.replace("_", " ").title() for col in df_display.columns]
-
-    st.dataframe(df_display, use_container_width=True)
+    tabel_halaman(
+        "log_lensa",
+        key="loglensa",
+        filters=filters,
+        order="timestamp_log.desc,id.desc",
+        siapkan=siapkan_tampilan,
+        satuan="log",
+        kosong="Belum ada data." if not filters else "Tidak ada data ditemukan."
+    )
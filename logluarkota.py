@@ -1,120 +1,76 @@
 import streamlit as st
 import pandas as pd
-from utils import get_table_cached
+from utils import get_table_cached, get_table_raw, tabel_halaman, pola_ilike, invalidate_tables, generasi_tabel
 
 @st.cache_data(ttl=60)
-def load_data():
-    df_detail = get_table_cached("pesanan_luar_kota_detail")
-    df_pembayaran = get_table_cached("pembayaran_luar_kota")
-    return df_detail, df_pembayaran
-
-
-def run():
-    st.title("📜 History Pesanan Luar Kota")
-
-    if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
-        st.rerun()
-
-    df_detail, df_pembayaran = load_data()
-
-    if df_detail.empty:
-        st.info("Belum ada pesanan luar kota.")
-        return
-
-    # ==============================
-    # FORMAT TANGGAL
-    # ==============================
-    df_detail["tanggal_ambil"] = pd.to_datetime(
-        df_detail["tanggal_ambil"], errors="coerce"
+def load_bulan(generasi=None):
+    # Hanya tanggal_ambil untuk pilihan bulan, isi tabel diambil per halaman
+    df = get_table_cached("pesanan_luar_kota_detail", columns=["tanggal_ambil"])
+    if df.empty:
+        return []
+    tanggal = pd.to_datetime(df["tanggal_ambil"], errors="coerce").dropna()
+    bulan = tanggal.dt.to_period("M").drop_duplicates().sort_values(ascending=False)
+    return [p.to_timestamp() for p in bulan]
+
+
+@st.cache_data(ttl=30)
+def load_total_status(ids, generasi=None):
+    # Total per header + status pembayaran terakhir, hanya untuk id di halaman ini
+    ids = list(ids)
+    df_total = get_table_raw(
+        "pesanan_luar_kota_detail",
+        columns=["id_transaksi", "total_harga"],
+        filters=[("in_", "id_transaksi", ids)],
+        parallel=False
     )
+    if df_total.empty:
+        df_total = pd.DataFrame(columns=["id_transaksi", "total_harga_header"])
+    else:
+        df_total["total_harga"] = pd.to_numeric(df_total["total_harga"], errors="coerce")
+        df_total = (
+            df_total
+            .groupby("id_transaksi", as_index=False)["total_harga"]
+            .sum()
+            .rename(columns={"total_harga": "total_harga_header"})
+        )
 
-    df_detail = df_detail.dropna(subset=["tanggal_ambil"])
-
-    df_detail["bulan"] = df_detail["tanggal_ambil"].dt.strftime("%B %Y")
-    df_detail["tanggal"] = df_detail["tanggal_ambil"].dt.strftime("%d-%m-%Y")
-
-    # ==============================
-    # FORMAT UKURAN
-    # ==============================
-    def format_ukuran(sph, cyl, axis, add):
-        return f"SPH: {sph}, CYL: {cyl}, Axis: {axis}, Add: {add}"
-
-    df_detail["ukuran_r"] = df_detail.apply(
-        lambda r: format_ukuran(
-            r["sph_r"], r["cyl_r"], r["axis_r"], r["add_r"]
-        ),
-        axis=1
+    df_status = get_table_raw(
+        "pembayaran_luar_kota_status",
+        columns=["id_transaksi", "status"],
+        filters=[("in_", "id_transaksi", ids)],
+        parallel=False
     )
+    if df_status.empty:
+        df_status = pd.DataFrame(columns=["id_transaksi", "status"])
 
-    df_detail["ukuran_l"] = df_detail.apply(
-        lambda r: format_ukuran(
-            r["sph_l"], r["cyl_l"], r["axis_l"], r["add_l"]
-        ),
-        axis=1
-    )
+    return df_total, df_status
 
-    # ==============================
-    # HITUNG TOTAL PER HEADER
-    # ==============================
-    df_total = (
-        df_detail
-        .groupby("id_transaksi", as_index=False)["total_harga"]
-        .sum()
-    )
 
-    df_detail = df_detail.merge(
-        df_total,
-        on="id_transaksi",
-        suffixes=("", "_header")
+def format_ukuran(df, sisi):
+    return (
+        "SPH: " + df[f"sph_{sisi}"].astype(str)
+        + ", CYL: " + df[f"cyl_{sisi}"].astype(str)
+        + ", Axis: " + df[f"axis_{sisi}"].astype(str)
+        + ", Add: " + df[f"add_{sisi}"].astype(str)
     )
 
-    # ==============================
-    # AMBIL STATUS TERAKHIR PEMBAYARAN
-    # ==============================
-    if not df_pembayaran.empty:
-        df_status = (
-            df_pembayaran
-            .sort_values("pembayaran_ke")
-            .groupby("id_transaksi", as_index=False)
-            .last()[["id_transaksi", "status"]]
-        )
-
-        df_detail = df_detail.merge(
-            df_status,
-            on="id_transaksi",
-            how="left"
-        )
-    else:
-        df_detail["status"] = "Belum Lunas"
-
-    # ==============================
-    # FILTER BULAN
-    # ==============================
-    bulan_opsi = ["-- Semua Bulan --"] + sorted(
-        df_detail["bulan"].dropna().unique()
-    )[::-1]
-
-    bulan_terpilih = st.selectbox("📅 Pilih Bulan", bulan_opsi)
-
-    if bulan_terpilih != "-- Semua Bulan --":
-        df_detail = df_detail[
-            df_detail["bulan"] == bulan_terpilih
-        ]
 
-    # ==============================
-    # FILTER NAMA
-    # ==============================
-    keyword = st.text_input("🔍 Cari Nama").strip().lower()
+def siapkan_tampilan(df_detail):
+    # Format satu halaman pesanan untuk st.dataframe
+    df_detail["tanggal_ambil"] = pd.to_datetime(df_detail["tanggal_ambil"], errors="coerce")
+    df_detail["tanggal"] = df_detail["tanggal_ambil"].dt.strftime("%d-%m-%Y")
 
-    if keyword:
-        df_detail = df_detail[
-            df_detail["nama"].str.lower().str.contains(keyword)
-        ]
+    df_detail["ukuran_r"] = format_ukuran(df_detail, "r")
+    df_detail["ukuran_l"] = format_ukuran(df_detail, "l")
 
-    if df_detail.empty:
-        st.info("Tidak ada data yang cocok.")
-        return
+    df_total, df_status = load_total_status(
+        tuple(df_detail["id_transaksi"].unique()),
+        generasi_tabel("pesanan_luar_kota_detail", "pembayaran_luar_kota_status")
+    )
+    df_detail = df_detail.merge(df_total, on="id_transaksi", how="left")
+    df_detail = df_detail.merge(df_status, on="id_transaksi", how="left")
+    # Belum ada pembayaran -> belum lunas
+    df_detail["status"] = df_detail["status"].fillna("Belum Lunas")
 
     # ==============================
     # FORMAT RUPIAH
@@ -144,12 +100,58 @@ def run():
     )
 
     # Khusus kolom Total Harga Header → Total Harga
-    hasil = hasil.rename(columns={
+    return hasil.rename(columns={
         "Total Harga Header": "Total Harga"
     })
 
-    hasil = hasil.reset_index(drop=True)
-    hasil.index = hasil.index + 1
-    hasil.index.name = "No"
 
-    st.dataframe(hasil, use_container_width=True)
\ No newline at end of file
+def run():
+    st.title("📜 History Pesanan Luar Kota")
+
+    if st.button("🔄 Refresh Data"):
+        invalidate_tables("pesanan_luar_kota_detail", "pembayaran_luar_kota")
+        st.rerun()
+
+    bulan_list = load_bulan(generasi_tabel("pesanan_luar_kota_detail"))
+
+    if not bulan_list:
+        st.info("Belum ada pesanan luar kota.")
+        return
+
+    # ==============================
+    # FILTER BULAN
+    # ==============================
+    bulan_label = {b.strftime("%B %Y"): b for b in bulan_list}
+    bulan_opsi = ["-- Semua Bulan --"] + list(bulan_label)
+
+    bulan_terpilih = st.selectbox("📅 Pilih Bulan", bulan_opsi)
+
+    # Baris tanpa tanggal_ambil tidak ditampilkan
+    filters = [("not_.is_", "tanggal_ambil", "null")]
+
+    if bulan_terpilih != "-- Semua Bulan --":
+        awal = bulan_label[bulan_terpilih]
+        akhir = awal + pd.offsets.MonthBegin(1)
+        filters.append(("gte", "tanggal_ambil", awal.strftime("%Y-%m-%d")))
+        filters.append(("lt", "tanggal_ambil", akhir.strftime("%Y-%m-%d")))
+
+    # ==============================
+    # FILTER NAMA
+    # ==============================
+    keyword = st.text_input("🔍 Cari Nama").strip()
+
+    if keyword:
+        filters.append(("ilike", "nama", pola_ilike(keyword)))
+
+    # ==============================
+    # TAMPIL DATA
+    # ==============================
+    tabel_halaman(
+        "pesanan_luar_kota_detail",
+        key="logluarkota",
+        filters=filters,
+        order="tanggal_ambil.desc,id_transaksi.desc,id.desc",
+        siapkan=siapkan_tampilan,
+        satuan="pesanan",
+        kosong="Tidak ada data yang cocok."
+    )
@@ -1,6 +1,58 @@
 import streamlit as st
 import pandas as pd
-from utils import get_table_cached, get_table_raw, get_supabase
+import numpy as np
+from utils import (
+    get_table_cached, get_table_raw, get_supabase, invalidate_tables, generasi_tabel,
+    get_pembayaran_transaksi, cari_posisi, tabel_halaman, pola_ilike
+)
+
+
+KOLOM_HISTORY = [
+    'tanggal', 'id_transaksi', 'nama', 'merk_frame', 'kode_frame',
+    'jenis_lensa', 'tipe_lensa', 'harga_frame', 'harga_lensa',
+    'total_harga', 'user_name'
+]
+
+
+@st.cache_data(max_entries=2)
+def periode_transaksi(versi, _tanggal):
+    # Pasangan tahun/bulan yang ada transaksinya, untuk pilihan filter
+    tanggal = pd.to_datetime(_tanggal, errors='coerce').dropna()
+    return pd.DataFrame({
+        'tahun': tanggal.dt.year,
+        'bulan_num': tanggal.dt.month,
+        'bulan_nama': tanggal.dt.strftime('%B'),
+    }).drop_duplicates().reset_index(drop=True)
+
+
+@st.cache_data(ttl=30)
+def status_transaksi(ids, generasi=None):
+    # Status pembayaran terakhir, hanya untuk id di halaman ini
+    df_status = get_table_raw(
+        "pembayaran_status",
+        columns=["id_transaksi", "status"],
+        filters=[("in_", "id_transaksi", list(ids))],
+        parallel=False
+    )
+    if df_status.empty:
+        df_status = pd.DataFrame(columns=['id_transaksi', 'status'])
+    return df_status
+
+
+def siapkan_history(df):
+    # Format satu halaman history untuk st.dataframe
+    df_status = status_transaksi(
+        tuple(df['id_transaksi'].unique()),
+        generasi_tabel("pembayaran_status")
+    )
+    df = df.merge(df_status, on='id_transaksi', how='left')
+
+    kolom = KOLOM_HISTORY[:-1] + ['status', 'user_name']
+    df = df[[col for col in kolom if col in df.columns]].copy()
+
+    df['tanggal'] = pd.to_datetime(df['tanggal'], errors='coerce').dt.strftime('%d-%m-%Y')
+    df.columns = [col.replace('_', ' ').title() for col in df.columns]
+    return df
 
 
 def run():
@@ -10,10 +62,10 @@ def run():
     # Ambil Data
     # ==============================
     df_detail = get_table_cached("transaksi_detail")
-    df_pembayaran = get_table_cached("pembayaran")
 
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        invalidate_tables("transaksi_detail", penuh=True)
+        invalidate_tables("pembayaran", "frames")
         st.rerun()
 
     if df_detail.empty:
@@ -22,44 +74,6 @@ def run():
 
     # Normalisasi kolom
     df_detail.columns = df_detail.columns.str.strip().str.lower().str.replace(' ', '_')
-    df_pembayaran.columns = df_pembayaran.columns.str.strip().str.lower().str.replace(' ', '_')
-
-    # ==============================
-    # Ambil status terakhir pembayaran
-    # ==============================
-    if not df_pembayaran.empty and "pembayaran_ke" in df_pembayaran.columns:
-        df_status = (
-            df_pembayaran
-            .sort_values(by='pembayaran_ke')
-            .groupby('id_transaksi', as_index=False)
-            .last()
-        )[['id_transaksi', 'status']]
-    else:
-        df_status = pd.DataFrame(columns=['id_transaksi', 'status'])
-
-    # Merge status ke detail
-    df_ringkas = df_detail.merge(df_status, on='id_transaksi', how='left')
-
-    # ==============================
-    # Pilih Kolom
-    # ==============================
-    selected_cols = [
-        'tanggal', 'id_transaksi', 'nama', 'merk_frame', 'kode_frame',
-        'jenis_lensa', 'tipe_lensa', 'harga_frame', 'harga_lensa',
-        'total_harga', 'status', 'user_name'
-    ]
-    df_ringkas = df_ringkas[[col for col in selected_cols if col in df_ringkas.columns]]
-
-    # ==============================
-    # Format tanggal + sort descending (terbaru di atas)
-    # ==============================
-    df_ringkas['tanggal'] = pd.to_datetime(df_ringkas['tanggal'], errors='coerce')
-    df_ringkas = df_ringkas.dropna(subset=['tanggal'])
-    df_ringkas = df_ringkas.sort_values('tanggal', ascending=False).reset_index(drop=True)
-    df_ringkas['tahun'] = df_ringkas['tanggal'].dt.year
-    df_ringkas['bulan_num'] = df_ringkas['tanggal'].dt.month
-    df_ringkas['bulan_nama'] = df_ringkas['tanggal'].dt.strftime('%B')
-    df_ringkas['tanggal'] = df_ringkas['tanggal'].dt.strftime('%d-%m-%Y')
 
     # ==============================
     # TAB: History vs Revisi
@@ -67,20 +81,19 @@ def run():
     tab1, tab2 = st.tabs(["📋 History Transaksi", "✏️ Revisi Transaksi"])
 
     # ==============================
-    # TAB 1: HISTORY
+    # TAB 1: HISTORY (PER HALAMAN DARI SUPABASE)
     # ==============================
     with tab1:
         col1, col2, col3 = st.columns(3)
 
-        tahun_list = sorted(df_ringkas['tahun'].unique(), reverse=True)
+        df_periode = periode_transaksi(df_detail.attrs.get("versi"), df_detail["tanggal"])
+
+        tahun_list = sorted(df_periode['tahun'].unique(), reverse=True)
         with col1:
             selected_tahun = st.selectbox("Pilih Tahun", tahun_list, key="ht_tahun")
 
-        df_filtered = df_ringkas[df_ringkas['tahun'] == selected_tahun]
-
         bulan_tersedia = (
-            df_filtered[['bulan_num', 'bulan_nama']]
-            .drop_duplicates()
+            df_periode[df_periode['tahun'] == selected_tahun]
             .sort_values('bulan_num')
         )
         bulan_options = ["Semua"] + bulan_tersedia['bulan_nama'].tolist()
@@ -88,27 +101,36 @@ def run():
         with col2:
             selected_bulan = st.selectbox("Pilih Bulan", bulan_options, key="ht_bulan")
 
-        if selected_bulan != "Semua":
-            df_filtered = df_filtered[df_filtered['bulan_nama'] == selected_bulan]
-
         with col3:
             search_nama = st.text_input("🔍 Cari Nama", key="ht_nama")
 
-        if search_nama:
-            df_filtered = df_filtered[
-                df_filtered['nama'].str.contains(search_nama, case=False, na=False)
-            ]
-
-        if not df_filtered.empty:
-            df_display = df_filtered.drop(
-                columns=['tahun', 'bulan_num', 'bulan_nama'], errors='ignore'
-            ).reset_index(drop=True)
-            df_display.index = df_display.index + 1
-            df_display.index.name = "No"
-            df_display.columns = [col.replace('_', ' ').title() for col in df_display.columns]
-            st.dataframe(df_display, use_container_width=True)
-        else:
+        if selected_tahun is None:
             st.info("Tidak ada data ditemukan.")
+        else:
+            # Filter tahun/bulan sebagai rentang tanggal di server
+            awal = pd.Timestamp(year=int(selected_tahun), month=1, day=1)
+            akhir = awal + pd.offsets.YearBegin(1)
+            if selected_bulan != "Semua":
+                bulan_num = int(bulan_tersedia.loc[bulan_tersedia['bulan_nama'] == selected_bulan, 'bulan_num'].iloc[0])
+                awal = awal.replace(month=bulan_num)
+                akhir = awal + pd.offsets.MonthBegin(1)
+
+            filters = [
+                ("gte", "tanggal", awal.strftime("%Y-%m-%d")),
+                ("lt", "tanggal", akhir.strftime("%Y-%m-%d")),
+            ]
+            if search_nama:
+                filters.append(("ilike", "nama", pola_ilike(search_nama)))
+
+            tabel_halaman(
+                "transaksi_detail",
+                key="ht",
+                columns=KOLOM_HISTORY,
+                filters=filters,
+                order="tanggal.desc,id.desc",
+                siapkan=siapkan_history,
+                satuan="transaksi"
+            )
 
     # ==============================
     # TAB 2: REVISI TRANSAKSI
@@ -139,11 +161,12 @@ def run():
         with col2:
             cari_id = st.text_input("Cari ID Transaksi", placeholder="contoh: OM/T/001", key="revisi_cari_id")
 
-        df_cari = df_detail.copy()
+        posisi = np.arange(len(df_detail))
         if cari_nama:
-            df_cari = df_cari[df_cari["nama"].str.contains(cari_nama.strip(), case=False, na=False)]
+            posisi = np.intersect1d(posisi, cari_posisi(df_detail, cari_nama.strip(), ["nama"]))
         if cari_id:
-            df_cari = df_cari[df_cari["id_transaksi"].str.contains(cari_id.strip(), case=False, na=False)]
+            posisi = np.intersect1d(posisi, cari_posisi(df_detail, cari_id.strip(), ["id_transaksi"]))
+        df_cari = df_detail.iloc[posisi]
 
         if not cari_nama and not cari_id:
             st.info("Masukkan nama atau ID transaksi untuk mencari.")
@@ -275,7 +298,8 @@ def run():
 
                                 st.success(f"Koreksi berhasil! {merk_frame} {kode_frame} → {merk_baru} {kode_baru}")
                                 st.session_state.pop("revisi_id", None)
-                                st.cache_data.clear()
+                                invalidate_tables("transaksi_detail", penuh=True)
+                                invalidate_tables("frames", "log_frames")
                                 st.rerun()
 
                         with col_cancel:
@@ -365,7 +389,8 @@ def run():
 
                                 st.success(f"Frame {merk_frame} {kode_frame} dicatat rusak. Pengganti: {merk_pengganti} {kode_pengganti}")
                                 st.session_state.pop("revisi_id", None)
-                                st.cache_data.clear()
+                                invalidate_tables("transaksi_detail", penuh=True)
+                                invalidate_tables("frames", "log_frames")
                                 st.rerun()
 
                         with col_cancel:
@@ -492,9 +517,7 @@ def run():
                                 }).eq("id_transaksi", trx_id).execute()
 
                                 # Update pembayaran — ambil data fresh
-                                df_pemb = get_table_raw("pembayaran")
-                                df_pemb.columns = df_pemb.columns.str.lower()
-                                df_pemb_trx = df_pemb[df_pemb["id_transaksi"] == trx_id]
+                                df_pemb_trx = get_pembayaran_transaksi("pembayaran", trx_id)
 
                                 if not df_pemb_trx.empty:
                                     total_dibayar = int(df_pemb_trx["nominal_pembayaran"].sum())
@@ -513,7 +536,8 @@ def run():
                                     f"Total baru: Rp {total_baru:,}".replace(",", ".")
                                 )
                                 st.session_state.pop("revisi_id", None)
-                                st.cache_data.clear()
+                                invalidate_tables("transaksi_detail", "pembayaran", penuh=True)
+                                invalidate_tables("transaksi", "frames", "log_frames")
                                 st.rerun()
 
                         with col_cancel:
@@ -3,10 +3,10 @@ import pandas as pd
 from datetime import datetime, date
 from zoneinfo import ZoneInfo
 from utils import (
-    get_table_cached, insert_row_supabase, get_supabase,
+    get_table_cached, get_lensa_catalog, get_cascade, cascade_opsi, insert_row_supabase, insert_rows_supabase, adjust_stock_batch,
     generate_id_skw_supabase, generate_id_pemb_skw_supabase,
     cari_harga_lensa_luar, cari_harga_lensa_stock,
-    catat_loglensa_supabase
+    buat_row_loglensa, LOG_KEY, stock_tidak_cukup
 )
 
 @st.dialog("✅ Pembayaran Berhasil")
@@ -26,28 +26,19 @@ def now_jkt():
     return datetime.now(ZoneInfo("Asia/Jakarta")).replace(microsecond=0)
 
 def run():
-    @st.cache_data(ttl=60)
     def load_data():
-        df_lensa_stock = get_table_cached("lensa")
         df_lensa_luar = get_table_cached("lensa_luar_stock")
-        return df_lensa_stock, df_lensa_luar
+        return df_lensa_luar
 
-    df_lensa_stock, df_lensa_luar = load_data()
+    df_lensa_luar = load_data()
+    # Katalog lensa stock sudah dinormalisasi di utils, hanya dibaca
+    katalog_lensa = get_lensa_catalog()
+    df_lensa_stock = katalog_lensa["df"]
 
-    df_lensa_stock.columns = df_lensa_stock.columns.str.lower()
     df_lensa_luar.columns = df_lensa_luar.columns.str.lower()
 
-    def format_2digit(val):
-        try:
-            return f"{float(val):.2f}"
-        except Exception:
-            return str(val).strip() if val is not None else ""
-
-    df_lensa_stock['sph'] = df_lensa_stock['sph'].apply(format_2digit)
-    df_lensa_stock['cyl'] = df_lensa_stock['cyl'].apply(format_2digit)
-    df_lensa_stock['add_power'] = df_lensa_stock['add_power'].apply(format_2digit)
-    for col in ['jenis', 'tipe', 'merk']:
-        df_lensa_stock[col] = df_lensa_stock[col].astype(str).str.strip()
+    # Index pilihan bertingkat, dibangun ulang hanya kalau versi tabel berubah
+    cascade_luar = get_cascade(df_lensa_luar, ["status", "tipe", "merk", "jenis", "nama_lensa"])
 
     st.title("📦 Pesanan Luar Kota")
     today = now_jkt().strftime("%d-%m-%Y, %H:%M:%S")
@@ -66,23 +57,21 @@ def run():
     status_lensa = st.selectbox("Status Lensa", ["Stock", "Inti", "Pesan", "Overlens"])
 
     if status_lensa == "Stock":
-        df_lensa = df_lensa_stock.copy()
+        df_lensa = katalog_lensa["df"]
+        cascade = katalog_lensa["cascade"]
+        pilihan = ()
     else:
-        df_lensa = df_lensa_luar[df_lensa_luar['status'] == status_lensa].copy()
+        cascade = cascade_luar
+        pilihan = (status_lensa,)
 
     # Tipe Lensa
-    tipe_option = sorted(df_lensa['tipe'].dropna().unique())
-    tipe_lensa = st.selectbox("Tipe Lensa", tipe_option)
+    tipe_lensa = st.selectbox("Tipe Lensa", cascade_opsi(cascade, *pilihan))
 
     # Merk Lensa
-    df_merk = df_lensa[df_lensa['tipe'] == tipe_lensa]
-    merk_option = sorted(df_merk['merk'].dropna().unique())
-    merk_lensa = st.selectbox("Merk Lensa", merk_option)
+    merk_lensa = st.selectbox("Merk Lensa", cascade_opsi(cascade, *pilihan, tipe_lensa))
 
     # Jenis Lensa
-    df_jenis = df_lensa[(df_lensa['tipe'] == tipe_lensa) & (df_lensa['merk'] == merk_lensa)]
-    jenis_option = sorted(df_jenis['jenis'].dropna().unique())
-    jenis_lensa = st.selectbox("Jenis Lensa", jenis_option)
+    jenis_lensa = st.selectbox("Jenis Lensa", cascade_opsi(cascade, *pilihan, tipe_lensa, merk_lensa))
 
     nama_lensa = ""
 
@@ -90,26 +79,24 @@ def run():
         st.markdown("**Ukuran Lensa**")
         colR, colL = st.columns(2)
 
-        sph_list = sorted(df_lensa['sph'].dropna().unique())
-        cyl_list = sorted(df_lensa['cyl'].dropna().unique())
+        sph_list = katalog_lensa["sph"]
+        cyl_list = katalog_lensa["cyl"]
 
         with colR:
             sph_r = st.selectbox("SPH R", sph_list, index=sph_list.index("0.00"))
             cyl_r = st.selectbox("CYL R", cyl_list, index=cyl_list.index("0.00"))
             axis_r = st.selectbox("Axis R", list(range(0, 181))) if cyl_r != "0.00" else None
-            add_r = st.selectbox("Add R", sorted(df_lensa['add_power'].dropna().unique())) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else ""
+            add_r = st.selectbox("Add R", katalog_lensa["add_power"]) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else ""
         with colL:
             sph_l = st.selectbox("SPH L", sph_list, index=sph_list.index("0.00"))
             cyl_l = st.selectbox("CYL L", cyl_list, index=cyl_list.index("0.00"))
             axis_l = st.selectbox("Axis L", list(range(0, 181))) if cyl_l != "0.00" else None
-            add_l = st.selectbox("Add L", sorted(df_lensa['add_power'].dropna().unique())) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else ""
+            add_l = st.selectbox("Add L", katalog_lensa["add_power"]) if tipe_lensa in ["Progressive", "Kryptok", "Flattop"] else ""
 
     else:
-        nama_lensa = st.selectbox("Nama Lensa", sorted(df_lensa[
-            (df_lensa['jenis'] == jenis_lensa) &
-            (df_lensa['tipe'] == tipe_lensa) &
-            (df_lensa['merk'] == merk_lensa)
-        ]['nama_lensa'].dropna().unique()))
+        nama_lensa = st.selectbox("Nama Lensa", cascade_opsi(
+            cascade_luar, status_lensa, tipe_lensa, merk_lensa, jenis_lensa
+        ))
 
         st.markdown("**Ukuran Lensa**")
         colR, colL = st.columns(2)
@@ -137,7 +124,7 @@ def run():
             st.warning("⚠️ Harga lensa stock tidak ditemukan!")
             st.stop()
     else:
-        harga_lensa = cari_harga_lensa_luar(df_lensa, tipe_lensa, jenis_lensa, nama_lensa, sph_r, cyl_r, add_dipakai, pakai_reseller=True)
+        harga_lensa = cari_harga_lensa_luar(df_lensa_luar, tipe_lensa, jenis_lensa, nama_lensa, sph_r, cyl_r, add_dipakai, pakai_reseller=True, status=status_lensa)
         if harga_lensa is None:
             st.warning("⚠️ Ukuran tidak sesuai rentang harga manapun!")
             st.stop()
@@ -278,24 +265,16 @@ def run():
         id_transaksi = generate_id_skw_supabase(nama, tanggal_ambil)
         id_pembayaran = generate_id_pemb_skw_supabase(nama, tanggal_ambil)
         user = st.session_state.get("user", "Unknown")
-        supabase = get_supabase()
 
         total_item = sum(item["subtotal"] - item["diskon"] for item in st.session_state.daftar_item_luar)
         total = total_item
 
-        # ===================== INSERT HEADER =====================
-        insert_row_supabase("pesanan_luar_kota", {
-            "timestamp_log": now_jkt(),
-            "tanggal_ambil": tanggal_ambil,
-            "id_transaksi": id_transaksi,
-            "nama": nama,
-            "total_harga": int(total),
-            "user_name": user
-        })
+        # ===================== SUSUN DETAIL + ITEM STOK =====================
+        detail_rows = []
+        stock_items = []
 
-        # ===================== INSERT DETAIL + UPDATE STOK =====================
         for item in st.session_state.daftar_item_luar:
-            insert_row_supabase("pesanan_luar_kota_detail", {
+            detail_rows.append({
                 "timestamp_log": now_jkt(),
                 "tanggal_ambil": tanggal_ambil,
                 "id_transaksi": id_transaksi,
@@ -319,56 +298,86 @@ def run():
                 "user_name": user
             })
 
-            # ===================== UPDATE STOK LENSA =====================
             if item['status_lensa'] == "Stock":
                 for side in ["r", "l"]:
-                    sph = item[f"sph_{side}"]
-                    cyl = item[f"cyl_{side}"]
-                    add = item[f"add_{side}"]
-
-                    query = (
-                        supabase.table("lensa")
-                        .select("id, stock")
-                        .eq("tipe", item["tipe_lensa"])
-                        .eq("jenis", item["jenis_lensa"])
-                        .eq("merk", item["merk_lensa"])
-                        .eq("sph", sph)
-                        .eq("cyl", cyl)
-                    )
-                    if add:
-                        query = query.eq("add_power", add)
-                    else:
-                        query = query.is_("add_power", None)
-
-                    result = query.execute()
-
-                    if not result.data:
-                        st.warning(f"Data lensa tidak ditemukan: {item['merk_lensa']} {item['tipe_lensa']} {item['jenis_lensa']} SPH {sph} CYL {cyl}")
-                        st.stop()
-
-                    record = result.data[0]
-                    stock_lama = record["stock"] or 0
-
-                    if stock_lama <= 0:
-                        st.warning(f"Stock habis: {item['merk_lensa']} {item['tipe_lensa']} {item['jenis_lensa']} SPH {sph} CYL {cyl}")
-                        st.stop()
-
-                    supabase.table("lensa") \
-                        .update({"stock": stock_lama - 1}) \
-                        .eq("id", record["id"]) \
-                        .execute()
-
-                    catat_loglensa_supabase(
-                        jenis=item["jenis_lensa"],
-                        tipe=item["tipe_lensa"],
-                        merk=item["merk_lensa"],
-                        sph=sph, cyl=cyl, add_power=add,
-                        source="luarkota",
-                        status_lensa="Stock",
-                        id_transaksi=id_transaksi,
-                        nama=nama,
-                        user=user
-                    )
+                    stock_items.append({
+                        "tabel": "lensa",
+                        "key": {
+                            "tipe": item["tipe_lensa"],
+                            "jenis": item["jenis_lensa"],
+                            "merk": item["merk_lensa"],
+                            "sph": item[f"sph_{side}"],
+                            "cyl": item[f"cyl_{side}"],
+                            "add_power": item[f"add_{side}"] or None
+                        },
+                        "delta": -1
+                    })
+
+        # ===================== UPDATE STOK (SATU RPC) =====================
+        # Semua atau tidak sama sekali, sebelum header disimpan
+        try:
+            hasil_stock = adjust_stock_batch(stock_items)
+        except Exception as e:
+            st.session_state['simpan_pembayaran'] = False
+            if stock_tidak_cukup(e):
+                st.warning(f"Stock habis, pesanan dibatalkan: {e}")
+            else:
+                st.error(f"❌ Gagal update stock, pesanan dibatalkan: {e}")
+            st.stop()
+
+        # Item yang barisnya tidak ketemu dilewati RPC: kembalikan yang sudah dipotong
+        ketemu = {hasil["urutan"] for hasil in hasil_stock}
+        hilang = [stock_items[i] for i in range(len(stock_items)) if i + 1 not in ketemu]
+        if hilang:
+            adjust_stock_batch([
+                {**stock_items[hasil["urutan"] - 1], "delta": 1} for hasil in hasil_stock
+            ])
+            st.session_state['simpan_pembayaran'] = False
+            key = hilang[0]["key"]
+            st.warning(f"Data lensa tidak ditemukan: {key['merk']} {key['tipe']} {key['jenis']} SPH {key['sph']} CYL {key['cyl']}")
+            st.stop()
+
+        # ===================== INSERT HEADER =====================
+        insert_row_supabase("pesanan_luar_kota", {
+            "timestamp_log": now_jkt(),
+            "tanggal_ambil": tanggal_ambil,
+            "id_transaksi": id_transaksi,
+            "nama": nama,
+            "total_harga": int(total),
+            "user_name": user
+        })
+
+        # ===================== LOG LENSA =====================
+        # Satu log per SKU per transaksi (R/L yang sama cukup sekali)
+        log_lensa_rows = []
+        sudah_dicatat = set()
+
+        for hasil in hasil_stock:
+            key = stock_items[hasil["urutan"] - 1]["key"]
+            sku = tuple(key.values())
+            if sku in sudah_dicatat:
+                continue
+            sudah_dicatat.add(sku)
+
+            row_log = buat_row_loglensa(
+                jenis=key["jenis"],
+                tipe=key["tipe"],
+                merk=key["merk"],
+                sph=key["sph"], cyl=key["cyl"], add_power=key["add_power"],
+                source="luarkota",
+                status_lensa="Stock",
+                stock_lama=hasil["stock_lama"],
+                stock_baru=hasil["stock_baru"],
+                id_transaksi=id_transaksi,
+                nama=nama,
+                user=user
+            )
+            if row_log:
+                log_lensa_rows.append(row_log)
+
+        # ===================== INSERT DETAIL + LOG =====================
+        insert_rows_supabase("pesanan_luar_kota_detail", detail_rows)
+        insert_rows_supabase("log_lensa", log_lensa_rows, on_conflict=LOG_KEY)
 
         # ===================== INSERT PEMBAYARAN =====================
         insert_row_supabase("pembayaran_luar_kota", {
@@ -395,6 +404,7 @@ def run():
             "status": status,
             "sisa": sisa
         }
+        # Cache tabel yang ditulis sudah ditambal write-through oleh helper insert/adjust_stock_batch
         st.session_state['simpan_pembayaran'] = False
         st.rerun()
 
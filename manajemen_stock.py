@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from utils import get_table_cached, get_supabase
+from utils import get_table_cached, insert_row_supabase, update_row_supabase, cari_posisi, invalidate_tables
 
 def safe_int(val):
     try:
@@ -17,20 +18,18 @@ def now_jkt():
 
 
 def catat_log_frame(merk, kode, status, keterangan, user):
-    supabase = get_supabase()
-    supabase.table("log_frames").insert({
+    insert_row_supabase("log_frames", {
         "timestamp_log": now_jkt().strftime("%Y-%m-%d %H:%M:%S"),
         "merk": merk,
         "kode": kode,
         "status": status,
         "keterangan": keterangan,
         "user_name": user
-    }).execute()
+    })
 
 
 def catat_log_lensa(tipe, merk, jenis, sph, cyl, add_power, status, keterangan, user):
-    supabase = get_supabase()
-    supabase.table("log_lensa").insert({
+    insert_row_supabase("log_lensa", {
         "timestamp_log": now_jkt().strftime("%Y-%m-%d %H:%M:%S"),
         "tipe": tipe,
         "merk": merk,
@@ -41,29 +40,21 @@ def catat_log_lensa(tipe, merk, jenis, sph, cyl, add_power, status, keterangan,
         "status": status,
         "keterangan": keterangan,
         "user_name": user
-    }).execute()
+    })
 
 
 def run():
     st.title("🗂️ Manajemen Stock")
     user = st.session_state.get("user", "Unknown")
 
-    @st.cache_data(ttl=60)
-    def load_frame():
-        return get_table_cached("frames")
-
-    @st.cache_data(ttl=60)
-    def load_lensa():
-        return get_table_cached("lensa")
-
-    df_frame = load_frame()
+    df_frame = get_table_cached("frames")
     df_frame.columns = df_frame.columns.str.lower()
 
-    df_lensa = load_lensa()
+    df_lensa = get_table_cached("lensa")
     df_lensa.columns = df_lensa.columns.str.lower()
 
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        invalidate_tables("frames", "lensa")
         st.rerun()
 
     # ==============================
@@ -112,11 +103,12 @@ def run():
                     st.session_state.pop("edit_frame_id", None)
                     st.rerun()
 
-            df_hasil_frame = df_frame.copy()
+            posisi_frame = np.arange(len(df_frame))
             if cari_merk:
-                df_hasil_frame = df_hasil_frame[df_hasil_frame["merk"].str.contains(cari_merk.strip(), case=False, na=False)]
+                posisi_frame = np.intersect1d(posisi_frame, cari_posisi(df_frame, cari_merk.strip(), ["merk"]))
             if cari_kode:
-                df_hasil_frame = df_hasil_frame[df_hasil_frame["kode"].str.contains(cari_kode.strip(), case=False, na=False)]
+                posisi_frame = np.intersect1d(posisi_frame, cari_posisi(df_frame, str(cari_kode).strip(), ["kode"]))
+            df_hasil_frame = df_frame.iloc[posisi_frame]
 
             if cari_merk or cari_kode:
                 if df_hasil_frame.empty:
@@ -153,13 +145,12 @@ def run():
                                 col_save, col_cancel = st.columns(2)
                                 with col_save:
                                     if st.button("💾 Simpan", key=f"simpan_frame_{frame_id}"):
-                                        supabase = get_supabase()
-                                        supabase.table("frames").update({
+                                        update_row_supabase("frames", {
                                             "merk": merk_baru.strip(),
                                             "kode": kode_baru.strip(),
                                             "stock": stock_baru,
                                             "harga_jual": harga_jual_baru
-                                        }).eq("id", frame_id).execute()
+                                        }, frame_id)
 
                                         keterangan = (
                                             f"Revisi: merk {merk}→{merk_baru}, "
@@ -171,7 +162,6 @@ def run():
 
                                         st.success(f"Frame {merk} {kode} berhasil diupdate!")
                                         st.session_state.pop("edit_frame_id", None)
-                                        st.cache_data.clear()
                                         st.rerun()
                                 with col_cancel:
                                     if st.button("❌ Batal", key=f"batal_frame_{frame_id}"):
@@ -258,17 +248,15 @@ def run():
                                 col_save, col_cancel = st.columns(2)
                                 with col_save:
                                     if st.button("💾 Simpan", key=f"simpan_retur_{frame_id}"):
-                                        supabase = get_supabase()
-                                        supabase.table("frames").update({
+                                        update_row_supabase("frames", {
                                             "stock": stock_baru
-                                        }).eq("id", frame_id).execute()
+                                        }, frame_id)
 
                                         keterangan = f"Retur {jumlah_retur} pcs, stock {stock}→{stock_baru}. {keterangan_retur}"
                                         catat_log_frame(merk, kode, "retur", keterangan, user)
 
                                         st.success(f"Retur {merk} {kode} berhasil! Stock: {stock} → {stock_baru}")
                                         st.session_state.pop("retur_frame_id", None)
-                                        st.cache_data.clear()
                                         st.rerun()
                                 with col_cancel:
                                     if st.button("❌ Batal", key=f"batal_retur_{frame_id}"):
@@ -346,11 +334,10 @@ def run():
                             col_save, col_cancel = st.columns(2)
                             with col_save:
                                 if st.button("💾 Simpan", key=f"simpan_lensa_{lensa_id}"):
-                                    supabase = get_supabase()
-                                    supabase.table("lensa").update({
+                                    update_row_supabase("lensa", {
                                         "stock": stock_baru,
                                         "harga_jual": harga_jual_baru
-                                    }).eq("id", lensa_id).execute()
+                                    }, lensa_id)
 
                                     keterangan = (
                                         f"Revisi: stock {stock}→{stock_baru}, "
@@ -360,7 +347,6 @@ def run():
 
                                     st.success(f"Lensa {merk} {tipe} {jenis} SPH {sph} CYL {cyl} berhasil diupdate!")
                                     st.session_state.pop("edit_lensa_id", None)
-                                    st.cache_data.clear()
                                     st.rerun()
                             with col_cancel:
                                 if st.button("❌ Batal", key=f"batal_lensa_{lensa_id}"):
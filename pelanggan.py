@@ -1,84 +1,101 @@
 import streamlit as st
 import pandas as pd
-from utils import get_table_cached, get_supabase
+import numpy as np
+from utils import get_table_cached, update_row_supabase, invalidate_tables, clear_pelanggan_cache, cari_posisi
 
 
-def run():
-    st.title("👥 Database Pelanggan")
+LENS_COLS = [
+    "sph_r", "cyl_r", "axis_r", "add_r",
+    "sph_l", "cyl_l", "axis_l", "add_l"
+]
 
-    if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
-        st.rerun()
+CYL_NOL = ["0", "0.0", "0.00", "", "None"]
 
-    # ==============================
-    # Ambil Data dari Supabase
-    # ==============================
-    df_transaksi = get_table_cached("transaksi_detail")
-    df_pelanggan = get_table_cached("pelanggan")
-    
-    if df_transaksi.empty or df_pelanggan.empty:
-        st.warning("Data belum tersedia.")
-        return
 
-    # Merge pelanggan
-    df = df_transaksi.merge(
-        df_pelanggan[["id_pelanggan", "no_hp"]],
+def format_mata(sph, cyl, axis):
+    """Versi vektor: "sph" kalau cyl nol/kosong, selain itu "sph / cyl × axis".
+
+    sph, cyl, axis: array/Series teks dengan panjang sama.
+    Axis angka dibulatkan ke bawah jadi bilangan bulat ("90.0" -> "90").
+    """
+    sph = np.asarray(sph, dtype=object)
+    cyl = np.asarray(cyl, dtype=object)
+    axis = np.asarray(axis, dtype=object)
+
+    angka = pd.to_numeric(pd.Series(axis), errors="coerce").to_numpy(dtype=float)
+    valid = np.isfinite(angka)
+
+    axis_str = np.where(np.isin(axis, ["", "None"]), "", axis).astype(object)
+    axis_str[valid] = np.trunc(angka[valid]).astype(np.int64).astype(str)
+
+    lengkap = sph + " / " + cyl + " × " + axis_str
+    return np.where(np.isin(cyl, CYL_NOL), sph, lengkap)
+
+
+@st.cache_data(max_entries=2)
+def riwayat_ukuran(versi_transaksi, versi_pelanggan, _df_transaksi, _df_pelanggan):
+    # Ukuran terakhir per pelanggan per kombinasi ukuran lensa.
+    # Dihitung sekali per versi data, search cukup memfilter hasilnya.
+    df = _df_transaksi.merge(
+        _df_pelanggan[["id_pelanggan", "no_hp"]],
         on="id_pelanggan",
         how="left"
     )
 
     df["tanggal"] = pd.to_datetime(df["tanggal"], errors="coerce")
 
-    lens_cols = [
-        "sph_r", "cyl_r", "axis_r", "add_r",
-        "sph_l", "cyl_l", "axis_l", "add_l"
-    ]
-
-    for col in lens_cols:
+    for col in LENS_COLS:
         df[col] = df[col].astype(str).fillna("")
 
-    results = []
+    df = df.dropna(subset=["id_pelanggan", "tanggal"])
 
-    for cust_id, group in df.groupby("id_pelanggan"):
-        group = group.dropna(subset=["tanggal"])
-        if group.empty:
-            continue
+    # Satu sort + drop_duplicates: baris terakhir per (pelanggan, ukuran)
+    df = df.sort_values("tanggal", kind="stable")
+    df = df.drop_duplicates(subset=["id_pelanggan"] + LENS_COLS, keep="last")
+    df = df.sort_values(["id_pelanggan"] + LENS_COLS, kind="stable")
 
-        ukuran_group = group.groupby(lens_cols)
+    df_final = pd.DataFrame({
+        "ID Pelanggan": df["id_pelanggan"].to_numpy(),
+        "Nama": df["nama"].to_numpy(),
+        "No HP": df["no_hp"].to_numpy(),
+        "Mata R": format_mata(df["sph_r"], df["cyl_r"], df["axis_r"]),
+        "Mata L": format_mata(df["sph_l"], df["cyl_l"], df["axis_l"]),
+        "Add": df["add_r"].to_numpy(),
+        "Tanggal Terakhir": df["tanggal"].to_numpy(),
+    })
+    df_final.attrs["versi"] = ("ukuran", versi_transaksi, versi_pelanggan)
+    return df_final
 
-        for _, transaksi_group in ukuran_group:
-            if transaksi_group.empty:
-                continue
 
-            last_row = transaksi_group.sort_values("tanggal").iloc[-1]
+def run():
+    st.title("👥 Database Pelanggan")
 
-            def format_mata(sph, cyl, axis):
-                try:
-                    axis = str(int(float(axis))) if axis not in ["", None, "None"] else ""
-                except:
-                    axis = str(axis)
+    if st.button("🔄 Refresh Data"):
+        invalidate_tables("transaksi_detail", penuh=True)
+        invalidate_tables("pelanggan")
+        st.rerun()
 
-                if cyl in ["0", "0.0", "0.00", "", "None", None]:
-                    return f"{sph}"
-                return f"{sph} / {cyl} × {axis}"
+    # ==============================
+    # Ambil Data dari Supabase
+    # ==============================
+    df_transaksi = get_table_cached("transaksi_detail")
+    df_pelanggan = get_table_cached("pelanggan")
+    
+    if df_transaksi.empty or df_pelanggan.empty:
+        st.warning("Data belum tersedia.")
+        return
 
-            results.append({
-                "ID Pelanggan": cust_id,
-                "Nama": last_row["nama"],
-                "No HP": last_row["no_hp"],
-                "Mata R": format_mata(last_row["sph_r"], last_row["cyl_r"], last_row["axis_r"]),
-                "Mata L": format_mata(last_row["sph_l"], last_row["cyl_l"], last_row["axis_l"]),
-                "Add": last_row["add_r"],
-                "Tanggal Terakhir": last_row["tanggal"]
-            })
+    df_final = riwayat_ukuran(
+        df_transaksi.attrs.get("versi"),
+        df_pelanggan.attrs.get("versi"),
+        df_transaksi,
+        df_pelanggan
+    )
 
-    if not results:
+    if df_final.empty:
         st.warning("Belum ada data ukuran.")
         return
 
-    df_final = pd.DataFrame(results)
-    df_final = df_final.sort_values("ID Pelanggan", ascending=True)
-
     # ==============================
     # SEARCH
     # ==============================
@@ -92,10 +109,7 @@ def run():
 
     if search:
         st.session_state["search_pelanggan"] = search
-        df_final = df_final[
-            df_final["Nama"].str.contains(search, case=False, na=False) |
-            df_final["No HP"].str.contains(search, case=False, na=False)
-        ]
+        df_final = df_final.iloc[cari_posisi(df_final, search, ["Nama", "No HP"])]
 
     df_final = df_final.reset_index(drop=True)
     df_final.index = df_final.index + 1
@@ -105,7 +119,6 @@ def run():
 
     df_pel = df_pelanggan.copy()
     df_pel.columns = df_pel.columns.str.lower()
-    df_pel = df_pel.sort_values("nama").reset_index(drop=True)
     
     # ==============================
     # EDIT NO HP
@@ -118,11 +131,13 @@ def run():
     with col2:
         cari_id = st.text_input("Cari by ID Pelanggan", placeholder="contoh: OM001", key="cari_id_edit")
 
-    df_hasil = df_pel.copy()
+    # Cari di tabel utuh (posisi dari index), baru diurutkan per nama
+    posisi = np.arange(len(df_pel))
     if cari_nama:
-        df_hasil = df_hasil[df_hasil["nama"].str.contains(cari_nama.strip().lower(), case=False, na=False)]
+        posisi = np.intersect1d(posisi, cari_posisi(df_pel, cari_nama.strip(), ["nama"]))
     if cari_id:
-        df_hasil = df_hasil[df_hasil["id_pelanggan"].str.contains(cari_id.strip().upper(), case=False, na=False)]
+        posisi = np.intersect1d(posisi, cari_posisi(df_pel, cari_id.strip(), ["id_pelanggan"]))
+    df_hasil = df_pel.iloc[posisi].sort_values("nama").reset_index(drop=True)
 
     if cari_nama or cari_id:
         if df_hasil.empty:
@@ -163,14 +178,15 @@ def run():
                                 elif no_hp_baru.strip() == no_hp:
                                     st.info("No HP tidak berubah.")
                                 else:
-                                    supabase = get_supabase()
-                                    supabase.table("pelanggan") \
-                                        .update({"no_hp": no_hp_baru.strip()}) \
-                                        .eq("id_pelanggan", id_pel) \
-                                        .execute()
+                                    update_row_supabase(
+                                        "pelanggan",
+                                        {"no_hp": no_hp_baru.strip()},
+                                        id_pel,
+                                        kunci="id_pelanggan"
+                                    )
                                     st.success(f"No HP {nama.title()} berhasil diupdate!")
                                     st.session_state.pop("edit_pelanggan", None)
-                                    st.cache_data.clear()
+                                    clear_pelanggan_cache()
                                     st.rerun()
                         with col_cancel:
                             if st.button("❌ Batal", key=f"batal_{id_pel}"):
@@ -5,15 +5,21 @@ from datetime import datetime, date
 from zoneinfo import ZoneInfo
 from utils import (
     get_table_cached,
+    get_status_pembayaran,
+    get_ringkasan_item,
+    get_pembayaran_transaksi,
+    count_rows_cached,
     insert_row_supabase,
-    generate_id_pembayaran_supabase
+    generate_id_pembayaran_supabase,
+    invalidate_tables
 )
 
-@st.cache_data(ttl=30)
 def load_data():
-    df_pembayaran = get_table_cached("pembayaran")
-    df_transaksi = get_table_cached("transaksi_detail")
-    return df_pembayaran, df_transaksi
+    df_belum_lunas = get_status_pembayaran("pembayaran", belum_lunas=True)
+    df_transaksi = get_table_cached("transaksi_detail", columns=[
+        "id", "id_transaksi", "merk_frame", "merk_lensa", "jenis_lensa"
+    ])
+    return df_belum_lunas, df_transaksi
 
 
 def run():
@@ -27,38 +33,34 @@ def run():
             f"Sisa: Rp {info['sisa']:,.0f}".replace(",", ".")
         )
 
-    df_pembayaran, df_transaksi = load_data()
+    # ==============================
+    # Pembayaran terakhir per transaksi yang belum lunas (view pembayaran_status)
+    # ==============================
+    df_belum_lunas, df_transaksi = load_data()
 
-    if df_pembayaran.empty:
+    if df_belum_lunas.empty and count_rows_cached("pembayaran") == 0:
         st.success("Belum ada pembayaran.")
         return
 
-    # ==============================
-    # Ambil pembayaran terakhir per transaksi
-    # ==============================
-    df_status = (
-        df_pembayaran
-        .sort_values("pembayaran_ke")
-        .groupby("id_transaksi", as_index=False)
-        .last()
-    )
-
     # ==============================
     # HITUNG ULANG STATUS DARI SISA
     # ==============================
-    df_status["sisa"] = pd.to_numeric(df_status["sisa"], errors="coerce").fillna(0)
-    df_status["is_lunas"] = df_status["sisa"] <= 0
-
-    df_belum_lunas = df_status[~df_status["is_lunas"]]
+    if not df_belum_lunas.empty:
+        df_belum_lunas["sisa"] = pd.to_numeric(df_belum_lunas["sisa"], errors="coerce").fillna(0)
+        df_belum_lunas = df_belum_lunas[df_belum_lunas["sisa"] > 0]
 
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        invalidate_tables("transaksi_detail", penuh=True)
+        invalidate_tables("pembayaran")
         st.rerun()
 
     if df_belum_lunas.empty:
         st.success("Semua transaksi telah lunas!")
         return
 
+    # Teks item per transaksi, satu groupby untuk semua
+    item_per_transaksi = get_ringkasan_item(df_transaksi, ["merk_frame", "merk_lensa", "jenis_lensa"])
+
     # ==============================
     # Loop transaksi belum lunas
     # ==============================
@@ -73,18 +75,7 @@ def run():
         sisa_sekarang = float(row["sisa"])
 
         # Ambil item
-        df_item = df_transaksi[
-            df_transaksi["id_transaksi"] == id_transaksi
-        ]
-
-        items = df_item[
-            ["merk_frame", "merk_lensa", "jenis_lensa"]
-        ].fillna("-")
-
-        item_str = ", ".join(
-            f"{r.merk_frame} | {r.merk_lensa} | {r.jenis_lensa}"
-            for _, r in items.iterrows()
-        )
+        item_str = item_per_transaksi.get(id_transaksi, "")
 
         with st.expander(
             f"{id_transaksi} - {nama} "
@@ -140,9 +131,7 @@ def run():
                     st.warning("Nominal harus lebih dari 0")
                     st.stop()
 
-                df_all = df_pembayaran[
-                    df_pembayaran["id_transaksi"] == id_transaksi
-                ]
+                df_all = get_pembayaran_transaksi("pembayaran", id_transaksi)
 
                 total_sebelumnya = pd.to_numeric(
                     df_all["nominal_pembayaran"],
@@ -197,5 +186,4 @@ def run():
                     "status": status_baru
                 }
 
-                st.cache_data.clear()
                 st.rerun()
\ No newline at end of file
@@ -5,16 +5,28 @@ from datetime import datetime, date
 from zoneinfo import ZoneInfo
 from utils import (
     get_table_cached,
+    get_status_pembayaran,
+    get_ringkasan_item,
+    get_pembayaran_transaksi,
+    count_rows_cached,
     insert_row_supabase,
-    generate_id_pemb_skw_supabase
+    generate_id_pemb_skw_supabase,
+    invalidate_tables
 )
 
-@st.cache_data(ttl=30)
-def load_data():
-    df_pembayaran = get_table_cached("pembayaran_luar_kota")
-    df_detail = get_table_cached("pesanan_luar_kota_detail")
+def load_data(tahun):
+    # Riwayat cukup tahun berjalan (metrics), status dari view pembayaran_luar_kota_status
+    df_pembayaran = get_table_cached(
+        "pembayaran_luar_kota",
+        columns=["tanggal_bayar", "nominal_pembayaran"],
+        filters=[("gte", "tanggal_bayar", f"{tahun}-01-01")]
+    )
+    df_belum_lunas = get_status_pembayaran("pembayaran_luar_kota", belum_lunas=True)
+    df_detail = get_table_cached("pesanan_luar_kota_detail", columns=[
+        "id_transaksi", "merk_lensa", "nama_lensa", "jenis_lensa"
+    ])
     df_header = get_table_cached("pesanan_luar_kota")
-    return df_pembayaran, df_detail, df_header
+    return df_pembayaran, df_belum_lunas, df_detail, df_header
 
 
 def run():
@@ -27,25 +39,30 @@ def run():
             f"Sisa: Rp {info['sisa']:,.0f}".replace(",", ".")
         )
 
-    df_pembayaran, df_detail, df_header = load_data()
+    now = datetime.now()
+    bulan_ini = now.month
+    tahun_ini = now.year
+
+    df_pembayaran, df_belum_lunas, df_detail, df_header = load_data(tahun_ini)
 
-    if df_pembayaran.empty:
+    if df_pembayaran.empty and df_belum_lunas.empty and count_rows_cached("pembayaran_luar_kota") == 0:
         st.success("Belum ada pembayaran luar kota.")
         return
 
+    if not df_belum_lunas.empty:
+        df_belum_lunas["sisa"] = pd.to_numeric(df_belum_lunas["sisa"], errors="coerce").fillna(0)
+        df_belum_lunas = df_belum_lunas[df_belum_lunas["sisa"] > 0]
+
     # ==============================
     # METRICS
     # ==============================
     st.subheader("📊 Ringkasan")
 
     df_pmb = df_pembayaran.copy()
+    if df_pmb.empty:
+        df_pmb = pd.DataFrame(columns=["tanggal_bayar", "nominal_pembayaran"])
     df_pmb["tanggal_bayar"] = pd.to_datetime(df_pmb["tanggal_bayar"], errors="coerce")
     df_pmb["nominal_pembayaran"] = pd.to_numeric(df_pmb["nominal_pembayaran"], errors="coerce").fillna(0)
-    df_pmb["sisa"] = pd.to_numeric(df_pmb["sisa"], errors="coerce").fillna(0)
-
-    now = datetime.now()
-    bulan_ini = now.month
-    tahun_ini = now.year
 
     df_pmb["bulan"] = df_pmb["tanggal_bayar"].dt.month
     df_pmb["tahun"] = df_pmb["tanggal_bayar"].dt.year
@@ -59,17 +76,11 @@ def run():
     ]["nominal_pembayaran"].sum()
 
     # Sisa belum dibayar per orang (semua waktu)
-    df_status_terakhir = (
-        df_pembayaran
-        .sort_values("pembayaran_ke")
-        .groupby("id_transaksi", as_index=False)
-        .last()
-    )
-    df_status_terakhir["sisa"] = pd.to_numeric(df_status_terakhir["sisa"], errors="coerce").fillna(0)
-    df_belum = df_status_terakhir[df_status_terakhir["sisa"] > 0]
-
-    sisa_nelly = df_belum[df_belum["nama"] == "Nelly"]["sisa"].sum()
-    sisa_rahmat = df_belum[df_belum["nama"] == "Rahmat"]["sisa"].sum()
+    if df_belum_lunas.empty:
+        sisa_nelly = sisa_rahmat = 0
+    else:
+        sisa_nelly = df_belum_lunas[df_belum_lunas["nama"] == "Nelly"]["sisa"].sum()
+        sisa_rahmat = df_belum_lunas[df_belum_lunas["nama"] == "Rahmat"]["sisa"].sum()
 
     st.markdown("**Pemasukan**")
     m1, m2 = st.columns(2)
@@ -83,29 +94,17 @@ def run():
 
     st.divider()
 
-    # ==============================
-    # Ambil pembayaran terakhir
-    # ==============================
-    df_status = (
-        df_pembayaran
-        .sort_values("pembayaran_ke")
-        .groupby("id_transaksi", as_index=False)
-        .last()
-    )
-
-    df_status["sisa"] = pd.to_numeric(df_status["sisa"], errors="coerce").fillna(0)
-    df_status["is_lunas"] = df_status["sisa"] <= 0
-
-    df_belum_lunas = df_status[~df_status["is_lunas"]]
-
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        invalidate_tables("pembayaran_luar_kota", "pesanan_luar_kota_detail", "pesanan_luar_kota")
         st.rerun()
 
     if df_belum_lunas.empty:
         st.success("Semua pesanan luar kota telah lunas!")
         return
 
+    # Teks item per transaksi, satu groupby untuk semua
+    item_per_transaksi = get_ringkasan_item(df_detail, ["merk_lensa", "nama_lensa", "jenis_lensa"])
+
     # ==============================
     # LOOP TRANSAKSI BELUM LUNAS
     # ==============================
@@ -117,18 +116,7 @@ def run():
         metode = row["metode"]
         sisa_sekarang = float(row["sisa"])
 
-        df_item = df_detail[
-            df_detail["id_transaksi"] == id_transaksi
-        ]
-
-        items = df_item[
-            ["merk_lensa", "nama_lensa", "jenis_lensa"]
-        ].fillna("-")
-
-        item_str = ", ".join(
-            f"{r.merk_lensa} | {r.nama_lensa} | {r.jenis_lensa}"
-            for _, r in items.iterrows()
-        )
+        item_str = item_per_transaksi.get(id_transaksi, "")
 
         with st.expander(
             f"{id_transaksi} - {nama} "
@@ -177,9 +165,7 @@ def run():
                     st.warning("Nominal harus lebih dari 0")
                     st.stop()
 
-                df_all = df_pembayaran[
-                    df_pembayaran["id_transaksi"] == id_transaksi
-                ]
+                df_all = get_pembayaran_transaksi("pembayaran_luar_kota", id_transaksi)
 
                 total_sebelumnya = pd.to_numeric(
                     df_all["total_harga"] - df_all["sisa"],
@@ -229,5 +215,4 @@ def run():
                     "status": status_baru
                 }
 
-                st.cache_data.clear()
                 st.rerun()
@@ -0,0 +1,18 @@
+-- ==============================
+-- LOG: IDEMPOTENCY KEY
+-- ==============================
+-- Kunci dedupe log_frames / log_lensa, diisi dari utils (buat_row_logframe / buat_row_loglensa):
+--   kasir / luarkota : "<source>:<id_transaksi>:<sku>"
+--   ilensa           : "ilensa:<blok 5 menit>:<sku>:<keterangan>"
+--                      (utils juga cek key blok sebelumnya: jendela 5 menit ke belakang)
+--   lainnya          : null (tidak di-dedupe, null tidak bentrok di unique index)
+-- Insert pakai ON CONFLICT (idempotency_key) DO NOTHING, tanpa select dulu.
+
+alter table log_frames add column if not exists idempotency_key text;
+alter table log_lensa add column if not exists idempotency_key text;
+
+create unique index if not exists log_frames_idempotency_key
+    on log_frames (idempotency_key);
+
+create unique index if not exists log_lensa_idempotency_key
+    on log_lensa (idempotency_key);
@@ -0,0 +1,49 @@
+-- ==============================
+-- PELANGGAN: UNIQUE (nama, no_hp) + ID DARI COUNTER
+-- ==============================
+-- Butuh sql/sequence.sql (next_sequence).
+-- Kalau index gagal dibuat, bereskan dulu baris pelanggan yang dobel.
+
+create unique index if not exists pelanggan_nama_no_hp_key
+    on pelanggan (nama, no_hp);
+
+insert into sequence_counter as sc (nama, nilai)
+select 'OM', coalesce(max(substring(id_pelanggan from '^OM([0-9]+)$')::bigint), 0)
+from pelanggan
+where id_pelanggan ~ '^OM[0-9]+$'
+on conflict (nama) do update set nilai = greatest(sc.nilai, excluded.nilai);
+
+-- Satu panggilan: kembalikan id_pelanggan yang ada, atau buat baru (OM001, OM002, ...)
+create or replace function get_or_create_pelanggan(p_nama text, p_no_hp text)
+returns text
+language plpgsql
+as $$
+declare
+    v_id  text;
+    v_num bigint;
+begin
+    select id_pelanggan into v_id
+    from pelanggan
+    where nama = p_nama and no_hp = p_no_hp;
+
+    if found then
+        return v_id;
+    end if;
+
+    v_num := next_sequence('OM');
+
+    insert into pelanggan (id_pelanggan, nama, no_hp)
+    values ('OM' || lpad(v_num::text, greatest(3, length(v_num::text)), '0'), p_nama, p_no_hp)
+    on conflict (nama, no_hp) do nothing
+    returning id_pelanggan into v_id;
+
+    -- Kalah balapan dengan kasir lain: ambil baris yang baru mereka buat
+    if v_id is null then
+        select id_pelanggan into v_id
+        from pelanggan
+        where nama = p_nama and no_hp = p_no_hp;
+    end if;
+
+    return v_id;
+end;
+$$;
@@ -0,0 +1,133 @@
+-- ==============================
+-- PEMBAYARAN TERAKHIR PER TRANSAKSI
+-- ==============================
+-- Satu baris per id_transaksi berisi id baris pembayaran terakhir (pembayaran_ke terbesar).
+-- Dijaga trigger setiap insert/update/delete di pembayaran / pembayaran_luar_kota,
+-- jadi halaman angsuran cukup baca view *_status (sisa, status, pembayaran_ke terakhir)
+-- tanpa load seluruh riwayat lalu sort + groupby.
+
+create table if not exists pembayaran_terakhir (
+    id_transaksi text primary key,
+    id bigint not null
+);
+
+create table if not exists pembayaran_luar_kota_terakhir (
+    id_transaksi text primary key,
+    id bigint not null
+);
+
+create index if not exists pembayaran_id_transaksi_ke
+    on pembayaran (id_transaksi, pembayaran_ke, id);
+
+create index if not exists pembayaran_luar_kota_id_transaksi_ke
+    on pembayaran_luar_kota (id_transaksi, pembayaran_ke, id);
+
+-- ==============================
+-- REFRESH SATU TRANSAKSI
+-- ==============================
+-- p_tabel: 'pembayaran' | 'pembayaran_luar_kota'. Kalau transaksi tidak punya
+-- pembayaran lagi (dihapus semua), barisnya ikut dihapus.
+
+create or replace function refresh_pembayaran_terakhir(p_tabel text, p_id_transaksi text)
+returns void
+language plpgsql
+as $$
+declare
+    v_jumlah integer;
+begin
+    if p_tabel not in ('pembayaran', 'pembayaran_luar_kota') then
+        raise exception 'Tabel % tidak didukung', p_tabel;
+    end if;
+
+    if p_id_transaksi is null then
+        return;
+    end if;
+
+    execute format(
+        'insert into %2$I (id_transaksi, id)
+         select id_transaksi, id
+           from %1$I
+          where id_transaksi = $1
+          order by pembayaran_ke desc, id desc
+          limit 1
+         on conflict (id_transaksi) do update set id = excluded.id',
+        p_tabel, p_tabel || '_terakhir'
+    )
+    using p_id_transaksi;
+
+    get diagnostics v_jumlah = row_count;
+
+    if v_jumlah = 0 then
+        execute format('delete from %I where id_transaksi = $1', p_tabel || '_terakhir')
+        using p_id_transaksi;
+    end if;
+end;
+$$;
+
+-- Update yang hanya mengubah sisa/status/total tidak perlu refresh:
+-- view membaca baris pembayaran aslinya.
+create or replace function trg_pembayaran_terakhir()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'UPDATE'
+       and new.id_transaksi is not distinct from old.id_transaksi
+       and new.pembayaran_ke is not distinct from old.pembayaran_ke then
+        return null;
+    end if;
+
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform refresh_pembayaran_terakhir(tg_table_name, old.id_transaksi);
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform refresh_pembayaran_terakhir(tg_table_name, new.id_transaksi);
+    end if;
+
+    return null;
+end;
+$$;
+
+drop trigger if exists pembayaran_terakhir on pembayaran;
+create trigger pembayaran_terakhir
+    after insert or update or delete on pembayaran
+    for each row execute function trg_pembayaran_terakhir();
+
+drop trigger if exists pembayaran_luar_kota_terakhir on pembayaran_luar_kota;
+create trigger pembayaran_luar_kota_terakhir
+    after insert or update or delete on pembayaran_luar_kota
+    for each row execute function trg_pembayaran_terakhir();
+
+-- ==============================
+-- ISI AWAL
+-- ==============================
+
+insert into pembayaran_terakhir (id_transaksi, id)
+select distinct on (id_transaksi) id_transaksi, id
+  from pembayaran
+ where id_transaksi is not null
+ order by id_transaksi, pembayaran_ke desc, id desc
+on conflict (id_transaksi) do update set id = excluded.id;
+
+insert into pembayaran_luar_kota_terakhir (id_transaksi, id)
+select distinct on (id_transaksi) id_transaksi, id
+  from pembayaran_luar_kota
+ where id_transaksi is not null
+ order by id_transaksi, pembayaran_ke desc, id desc
+on conflict (id_transaksi) do update set id = excluded.id;
+
+-- ==============================
+-- VIEW STATUS
+-- ==============================
+-- Baris pembayaran terakhir lengkap per transaksi. Dibaca lewat utils.get_status_pembayaran.
+
+create or replace view pembayaran_status as
+select p.*
+  from pembayaran_terakhir t
+  join pembayaran p on p.id = t.id;
+
+create or replace view pembayaran_luar_kota_status as
+select p.*
+  from pembayaran_luar_kota_terakhir t
+  join pembayaran_luar_kota p on p.id = t.id;
@@ -0,0 +1,50 @@
+-- ==============================
+-- SEQUENCE COUNTER
+-- ==============================
+-- Satu baris per keluarga ID (OM/T, OM/P, OMSKW, OMSKW/P).
+-- next_sequence() menaikkan counter secara atomic lewat INSERT .. ON CONFLICT,
+-- jadi dua kasir yang menyimpan bersamaan tidak akan dapat nomor yang sama.
+
+create table if not exists sequence_counter (
+    nama  text primary key,
+    nilai bigint not null default 0
+);
+
+create or replace function next_sequence(p_nama text)
+returns bigint
+language sql
+as $$
+    insert into sequence_counter as sc (nama, nilai)
+    values (p_nama, 1)
+    on conflict (nama) do update set nilai = sc.nilai + 1
+    returning sc.nilai;
+$$;
+
+-- ==============================
+-- SEED DARI DATA YANG SUDAH ADA
+-- ==============================
+-- Jalankan sekali saat deploy; aman diulang (greatest).
+
+insert into sequence_counter as sc (nama, nilai)
+select 'OM/T', coalesce(max(split_part(id_transaksi, '/', 3)::bigint), 0)
+from transaksi
+where id_transaksi ~ '^[^/]*/[^/]*/[0-9]+/'
+on conflict (nama) do update set nilai = greatest(sc.nilai, excluded.nilai);
+
+insert into sequence_counter as sc (nama, nilai)
+select 'OM/P', coalesce(max(split_part(id_pembayaran, '/', 3)::bigint), 0)
+from pembayaran
+where id_pembayaran ~ '^OM/P/[0-9]+/'
+on conflict (nama) do update set nilai = greatest(sc.nilai, excluded.nilai);
+
+insert into sequence_counter as sc (nama, nilai)
+select 'OMSKW', coalesce(max(substring(id_transaksi from 'OMSKW/[0-9]+/([0-9]+)/')::bigint), 0)
+from pesanan_luar_kota
+where id_transaksi ~ 'OMSKW/[0-9]+/[0-9]+/'
+on conflict (nama) do update set nilai = greatest(sc.nilai, excluded.nilai);
+
+insert into sequence_counter as sc (nama, nilai)
+select 'OMSKW/P', coalesce(max(substring(id_pembayaran from 'OMSKW/P/[0-9]+/([0-9]+)/')::bigint), 0)
+from pembayaran_luar_kota
+where id_pembayaran ~ 'OMSKW/P/[0-9]+/[0-9]+/'
+on conflict (nama) do update set nilai = greatest(sc.nilai, excluded.nilai);
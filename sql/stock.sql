@@ -0,0 +1,98 @@
+-- ==============================
+-- WHERE DARI KEY JSONB
+-- ==============================
+-- {"merk": "A", "add_power": null} -> true and "merk" = 'A' and "add_power" is null
+
+create or replace function stock_where(p_key jsonb)
+returns text
+language plpgsql
+immutable
+as $$
+declare
+    v_where text := 'true';
+    v_kolom text;
+    v_nilai jsonb;
+begin
+    for v_kolom, v_nilai in select key, value from jsonb_each(p_key) loop
+        if v_nilai = 'null'::jsonb then
+            v_where := v_where || format(' and %I is null', v_kolom);
+        else
+            v_where := v_where || format(' and %I = %L', v_kolom, v_nilai #>> '{}');
+        end if;
+    end loop;
+
+    return v_where;
+end;
+$$;
+
+-- ==============================
+-- STOCK (SATU BARIS)
+-- ==============================
+-- Tambah/kurang stock secara atomik: satu UPDATE, baris terkunci selama update,
+-- jadi dua terminal yang menjual SKU yang sama tidak saling menimpa.
+-- Hasil: id, stock sebelum dan sesudah. Kosong kalau barisnya tidak ketemu.
+-- Kalau stock jadi minus, error dan tidak ada yang berubah.
+
+create or replace function adjust_stock(p_tabel text, p_key jsonb, p_delta integer)
+returns table (id bigint, stock_lama integer, stock_baru integer)
+language plpgsql
+as $$
+begin
+    if p_tabel not in ('frames', 'lensa') then
+        raise exception 'Tabel % tidak didukung', p_tabel;
+    end if;
+
+    execute format(
+        'update %1$I
+            set stock = coalesce(stock, 0) + $1
+          where id = (select id from %1$I where %2$s order by id limit 1)
+      returning id, stock - $1, stock',
+        p_tabel, stock_where(p_key)
+    )
+    using p_delta
+    into id, stock_lama, stock_baru;
+
+    if id is null then
+        return;
+    end if;
+
+    if stock_baru < 0 then
+        raise exception 'Stock tidak cukup: % % (stock %, perubahan %)',
+            p_tabel, p_key, stock_lama, p_delta
+            using errcode = 'check_violation';
+    end if;
+
+    return next;
+end;
+$$;
+
+-- ==============================
+-- STOCK BATCH
+-- ==============================
+-- p_items: [{"tabel": "frames"|"lensa", "key": {"kolom": nilai, ...}, "delta": -1}, ...]
+-- Semua item diubah dalam satu transaksi lewat adjust_stock. Item yang barisnya
+-- tidak ketemu dilewati; satu item yang stock-nya tidak cukup membatalkan semuanya.
+-- Hasil: satu baris per item yang ketemu, dengan stock sebelum dan sesudah.
+
+create or replace function adjust_stock_batch(p_items jsonb)
+returns table (urutan integer, tabel text, id bigint, stock_lama integer, stock_baru integer)
+language plpgsql
+as $$
+declare
+    v_item jsonb;
+begin
+    for v_item, urutan in
+        select value, ordinality::integer from jsonb_array_elements(p_items) with ordinality
+    loop
+        tabel := v_item->>'tabel';
+
+        select s.id, s.stock_lama, s.stock_baru
+          into id, stock_lama, stock_baru
+          from adjust_stock(tabel, v_item->'key', (v_item->>'delta')::integer) s;
+
+        if found then
+            return next;
+        end if;
+    end loop;
+end;
+$$;
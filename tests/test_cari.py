@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def _df_acak(rng, n):
+    kata = ["Budi", "SITI", "andi", "Nelly", "0812", "08-77", "a.b", "(x)", "ab+c", ""]
+
+    def teks():
+        if rng.random() < 0.1:
+            return None
+        return " ".join(rng.choice(kata, size=rng.integers(1, 3)))
+
+    return pd.DataFrame({
+        "nama": [teks() for _ in range(n)],
+        "no_hp": [teks() for _ in range(n)],
+    })
+
+
+def _posisi_lama(df, kueri, kolom):
+    cocok = np.zeros(len(df), dtype=bool)
+    for k in kolom:
+        cocok |= df[k].str.contains(kueri, case=False, regex=False, na=False).to_numpy()
+    return np.flatnonzero(cocok)
+
+
+def test_cari_posisi_kueri_kosong():
+    df = _df_acak(np.random.default_rng(1), 20)
+    assert utils.cari_posisi(df, "", ["nama"]).tolist() == list(range(20))
+
+
+def test_cari_posisi_sama_dengan_str_contains():
+    rng = np.random.default_rng(2)
+    kueri = ["bud", "BUDI", "i", "si", "08", "8-7", "a.b", ".", "(x", "b+c", "nelly s", "zzz", " "]
+    for _ in range(30):
+        df = _df_acak(rng, int(rng.integers(0, 60)))
+        for k in kueri:
+            for kolom in (["nama"], ["nama", "no_hp"]):
+                assert utils.cari_posisi(df, k, kolom).tolist() == _posisi_lama(df, k, kolom).tolist()
+
+
+def test_cari_posisi_index_per_versi():
+    df = _df_acak(np.random.default_rng(3), 40)
+    df.attrs["versi"] = ("pelanggan", 1)
+    for k in ["budi", "08", "ab+c"]:
+        assert utils.cari_posisi(df, k, ["nama", "no_hp"]).tolist() == \
+            _posisi_lama(df, k, ["nama", "no_hp"]).tolist()
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+import utils
+from dashboard import kategorikan_frame
+from pelanggan import format_mata
+
+
+# Versi per baris sebelumnya sebagai acuan
+def format_2digit_lama(val):
+    try:
+        return f"{float(val):.2f}"
+    except Exception:
+        return str(val).strip() if val is not None else ""
+
+
+def format_mata_lama(sph, cyl, axis):
+    try:
+        axis = str(int(float(axis))) if axis not in ["", None, "None"] else ""
+    except:
+        axis = str(axis)
+
+    if cyl in ["0", "0.0", "0.00", "", "None", None]:
+        return f"{sph}"
+    return f"{sph} / {cyl} × {axis}"
+
+
+def kategorikan_frame_lama(row):
+    if row["status_frame"] == "Punya Sendiri":
+        return "Punya Sendiri"
+    harga = pd.to_numeric(row.get("harga_frame", 0), errors="coerce") or 0
+    if harga < 300000:
+        return "<Rp300.000"
+    elif harga < 700000:
+        return "Rp300.000 - Rp700.000"
+    elif harga < 1500000:
+        return "Rp700.000 - Rp1.500.000"
+    else:
+        return ">Rp1.500.000"
+
+
+def test_format_2digit_series_sama_dengan_lama():
+    nilai = [
+        None, np.nan, "", " ", "1", "-1.25", " 2.5 ", "abc", " plano ", 0, 0.125,
+        -3, 1.005, "1e2", "inf", float("inf"), True, "0.00",
+    ]
+    seri = pd.Series(nilai, dtype=object)
+    assert utils.format_2digit_series(seri).tolist() == seri.apply(format_2digit_lama).tolist()
+
+    rng = np.random.default_rng(4)
+    acak = pd.Series(rng.choice(np.array(nilai, dtype=object), size=500), index=rng.permutation(500))
+    hasil = utils.format_2digit_series(acak)
+    assert hasil.index.equals(acak.index)
+    assert hasil.tolist() == acak.apply(format_2digit_lama).tolist()
+
+    angka = pd.Series(np.round(rng.uniform(-10, 10, size=500), 2))
+    assert utils.format_2digit_series(angka).tolist() == angka.apply(format_2digit_lama).tolist()
+
+
+def test_format_mata_sama_dengan_lama():
+    rng = np.random.default_rng(5)
+    sph = rng.choice(["-1.00", "0.00", "+2.25", "", "None"], size=300)
+    cyl = rng.choice(["0", "0.0", "0.00", "", "None", "-0.50", "-1.25"], size=300)
+    axis = rng.choice(["", "None", "90", "90.0", "180.7", "abc", "nan", "inf"], size=300)
+
+    lama = [format_mata_lama(s, c, a) for s, c, a in zip(sph, cyl, axis)]
+    assert format_mata(sph, cyl, axis).tolist() == lama
+
+
+def test_kategorikan_frame_sama_dengan_lama():
+    rng = np.random.default_rng(6)
+    df = pd.DataFrame({
+        "status_frame": rng.choice(["Punya Sendiri", "Stock", "Pesan"], size=300),
+        "harga_frame": rng.choice(
+            np.array([None, "", "abc", 0, 299999, 300000, 699999, 700000, 1499999, 1500000, "250000"],
+                     dtype=object),
+            size=300,
+        ),
+    })
+    assert kategorikan_frame(df).tolist() == df.apply(kategorikan_frame_lama, axis=1).tolist()
+
+    tanpa_harga = df[["status_frame"]]
+    assert kategorikan_frame(tanpa_harga).tolist() == \
+        tanpa_harga.apply(kategorikan_frame_lama, axis=1).tolist()
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+# Implementasi lama (filter DataFrame per panggilan) sebagai acuan
+def harga_stock_lama(df_stock, tipe, jenis, merk, sph, cyl, add, pakai_reseller=True):
+    df = df_stock.copy()
+    df.columns = df.columns.str.lower().str.strip().str.replace(" ", "_")
+    kolom_harga = 'harga_reseller' if pakai_reseller else 'harga_jual'
+
+    try:
+        sph = round(float(sph), 2)
+        cyl = round(float(cyl), 2)
+        add = round(float(add), 2) if add is not None else None
+    except:
+        return None
+
+    df['sph'] = pd.to_numeric(df['sph'], errors='coerce')
+    df['cyl'] = pd.to_numeric(df['cyl'], errors='coerce')
+    df['add_power'] = pd.to_numeric(df['add_power'], errors='coerce')
+
+    df_filtered = df[
+        (df['tipe'].str.lower() == tipe.lower()) &
+        (df['jenis'].str.lower() == jenis.lower()) &
+        (df['merk'].str.lower() == merk.lower()) &
+        (df['sph'].round(2) == sph) &
+        (df['cyl'].round(2) == cyl)
+    ]
+
+    if add is not None:
+        df_filtered = df_filtered[df_filtered['add_power'].round(2) == add]
+    else:
+        df_filtered = df_filtered[df_filtered['add_power'].isna()]
+
+    if df_filtered.empty:
+        return None
+
+    return int(float(df_filtered.iloc[0][kolom_harga]))
+
+
+def harga_luar_lama(df, tipe, jenis, nama_lensa, sph, cyl, add, pakai_reseller=True):
+    df = df.copy()
+    df.columns = df.columns.str.lower().str.strip()
+    kolom_harga = "harga_reseller" if pakai_reseller else "harga_jual"
+
+    try:
+        sph = round(float(sph), 2)
+        cyl = round(float(cyl), 2)
+        add = round(float(add), 2) if add not in ["", None] else None
+    except:
+        return None
+
+    df = df[
+        (df["tipe"].str.lower() == tipe.lower()) &
+        (df["jenis"].str.lower() == jenis.lower()) &
+        (df["nama_lensa"].str.lower() == nama_lensa.lower())
+    ]
+
+    if df.empty:
+        return None
+
+    query = (df["sph_min"] <= sph) & (df["sph_max"] >= sph)
+    query &= df["cyl_min"].isna() | ((df["cyl_min"] <= cyl) & (df["cyl_max"] >= cyl))
+    if add is not None:
+        query &= df["add_min_power"].isna() | (
+            (df["add_min_power"] <= add) & (df["add_max_power"] >= add)
+        )
+    else:
+        query &= df["add_min_power"].isna()
+
+    df_filtered = df[query]
+
+    if df_filtered.empty:
+        return None
+
+    prioritas = (
+        df_filtered["cyl_min"].notna().astype(int) * 2 +
+        df_filtered["add_min_power"].notna().astype(int)
+    )
+    # Urutan seri di implementasi baru = urutan baris di tabel
+    df_filtered = df_filtered.assign(prioritas=prioritas).sort_values(
+        "prioritas", ascending=False, kind="stable"
+    )
+
+    return int(df_filtered.iloc[0][kolom_harga])
+
+
+GRID = np.round(np.arange(-4, 4.01, 0.25), 2)
+
+
+def _df_stock(rng, n):
+    add = rng.choice([None, "1.00", "1.50", "2.00", "abc"], size=n)
+    return pd.DataFrame({
+        "tipe": rng.choice(["Single Vision", "Progressive"], size=n),
+        "jenis": rng.choice(["HMC", "Blue"], size=n),
+        "merk": rng.choice(["Essilor", "Hoya", "ESSILOR"], size=n),
+        "sph": [f"{v:.2f}" for v in rng.choice(GRID, size=n)],
+        "cyl": [f"{v:.2f}" for v in rng.choice(GRID[:9], size=n)],
+        "add_power": add,
+        "harga_jual": rng.integers(100, 900, size=n) * 1000,
+        "harga_reseller": rng.integers(50, 500, size=n) * 1000,
+    })
+
+
+def _df_luar(rng, n):
+    sph_a = rng.choice(GRID, size=n)
+    sph_b = rng.choice(GRID, size=n)
+    ada_cyl = rng.random(n) < 0.5
+    ada_add = rng.random(n) < 0.4
+    return pd.DataFrame({
+        "tipe": rng.choice(["Single Vision", "Progressive"], size=n),
+        "jenis": rng.choice(["HMC", "Blue"], size=n),
+        "nama_lensa": rng.choice(["Kodak", "Zeiss"], size=n),
+        "sph_min": np.minimum(sph_a, sph_b),
+        "sph_max": np.maximum(sph_a, sph_b),
+        "cyl_min": np.where(ada_cyl, -2.0, np.nan),
+        "cyl_max": np.where(ada_cyl, rng.choice([-1.0, 0.0], size=n), np.nan),
+        "add_min_power": np.where(ada_add, 1.0, np.nan),
+        "add_max_power": np.where(ada_add, rng.choice([2.0, 3.0], size=n), np.nan),
+        "status": rng.choice(["Stock", "Pesan"], size=n),
+        "harga_jual": rng.integers(100, 900, size=n) * 1000,
+        "harga_reseller": rng.integers(50, 500, size=n) * 1000,
+    })
+
+
+def test_harga_lensa_stock_sama_dengan_lama():
+    rng = np.random.default_rng(11)
+    for _ in range(8):
+        df = _df_stock(rng, int(rng.integers(1, 150)))
+        for _ in range(30):
+            args = (
+                str(rng.choice(["single vision", "Progressive", "Bifocal"])),
+                str(rng.choice(["HMC", "blue"])),
+                str(rng.choice(["essilor", "Hoya"])),
+                float(rng.choice(GRID)),
+                str(rng.choice(GRID[:9])),
+                rng.choice([None, 1.0, "1.5", 2.0, "x"]),
+            )
+            for reseller in (True, False):
+                assert utils.cari_harga_lensa_stock(df, *args, pakai_reseller=reseller) == \
+                    harga_stock_lama(df, *args, pakai_reseller=reseller)
+
+
+def test_harga_lensa_luar_sama_dengan_lama():
+    rng = np.random.default_rng(12)
+    for _ in range(8):
+        df = _df_luar(rng, int(rng.integers(1, 80)))
+        for _ in range(30):
+            args = (
+                str(rng.choice(["single vision", "Progressive"])),
+                str(rng.choice(["hmc", "Blue"])),
+                str(rng.choice(["KODAK", "Zeiss", "Nikon"])),
+                float(rng.choice(GRID)) + float(rng.choice([0, 0.1])),
+                float(rng.choice(GRID[:12])),
+                rng.choice([None, "", 1.0, 1.5, 2.5, 3.5]),
+            )
+            for reseller in (True, False):
+                assert utils.cari_harga_lensa_luar(df, *args, pakai_reseller=reseller) == \
+                    harga_luar_lama(df, *args, pakai_reseller=reseller)
+
+            status = str(rng.choice(["Stock", "Pesan"]))
+            assert utils.cari_harga_lensa_luar(df, *args, status=status) == \
+                harga_luar_lama(df[df["status"] == status], *args)
+
+
+def test_harga_lensa_pakai_index_per_versi():
+    rng = np.random.default_rng(13)
+    df = _df_stock(rng, 50)
+    df.attrs["versi"] = ("lensa", 1)
+    baris = df.iloc[7]
+    add = baris["add_power"]
+    add = None if add in (None, "abc") else add
+    assert utils.cari_harga_lensa_stock(
+        df, baris["tipe"], baris["jenis"], baris["merk"], baris["sph"], baris["cyl"], add
+    ) == harga_stock_lama(
+        df, baris["tipe"], baris["jenis"], baris["merk"], baris["sph"], baris["cyl"], add
+    )
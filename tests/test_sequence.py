@@ -0,0 +1,68 @@
+import threading
+from datetime import date
+
+import pytest
+
+import utils
+
+
+@pytest.fixture
+def sequence_lokal():
+    lama = utils._sequence_backend
+    backend = utils.LocalSequence()
+    utils.set_sequence_backend(backend)
+    yield backend
+    utils.set_sequence_backend(lama)
+
+
+def test_local_sequence_mulai_dari_start():
+    seq = utils.LocalSequence({"OM/T": 41})
+    assert seq.next("OM/T") == 42
+    assert seq.next("OM/P") == 1
+
+
+def test_local_sequence_unik_banyak_thread():
+    seq = utils.LocalSequence()
+    hasil = []
+    lock = threading.Lock()
+
+    def ambil():
+        nomor = [seq.next("OM/T") for _ in range(500)]
+        with lock:
+            hasil.extend(nomor)
+
+    threads = [threading.Thread(target=ambil) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(hasil) == list(range(1, 8 * 500 + 1))
+
+
+def test_format_id(sequence_lokal):
+    tanggal = date(2025, 5, 10)
+    assert utils.generate_id_transaksi_supabase(tanggal) == "OM/T/001/10-05/2025"
+    assert utils.generate_id_transaksi_supabase(tanggal) == "OM/T/002/10-05/2025"
+    assert utils.generate_id_pembayaran_supabase(tanggal) == "OM/P/001/10-05/2025"
+    assert utils.generate_id_skw_supabase("Nelly", "2025-05-10") == "OMSKW/01/001/10-05-2025"
+    assert utils.generate_id_pemb_skw_supabase("Budi", "2025-05-10") == "OMSKW/P/02/001/10-05-2025"
+
+
+def test_id_unik_banyak_thread(sequence_lokal):
+    tanggal = date(2025, 5, 10)
+    hasil = []
+    lock = threading.Lock()
+
+    def buat():
+        ids = [utils.generate_id_transaksi_supabase(tanggal) for _ in range(200)]
+        with lock:
+            hasil.extend(ids)
+
+    threads = [threading.Thread(target=buat) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(hasil)) == len(hasil) == 1200
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def test_store_key_filter_list_bisa_di_hash():
+    key = utils._store_key("frames", ["id"], [("in_", "status", ["a", "b"])], "id.desc")
+    assert hash(key) == hash(utils._store_key("frames", ["id"], [("in_", "status", ("a", "b"))], "id.desc"))
+
+
+def _df(rows):
+    return pd.DataFrame(rows, columns=["id", "nama", "harga"])
+
+
+def test_gabung_delta_kosong():
+    lama = _df([(1, "a", 10)])
+    df, berubah, hanya_tambah = utils._gabung_delta(lama, _df([]), "id")
+    assert df is lama
+    assert not berubah and hanya_tambah
+
+
+def test_gabung_delta_tambah_id_baru():
+    lama = _df([(1, "a", 10), (2, "b", 20)])
+    df, berubah, hanya_tambah = utils._gabung_delta(lama, _df([(3, "c", 30)]), "id")
+    assert df["id"].tolist() == [1, 2, 3]
+    assert berubah and hanya_tambah
+
+
+def test_gabung_delta_overlap_sama_dibuang():
+    lama = _df([(1, "a", 10), (2, "b", 20)])
+    df, berubah, hanya_tambah = utils._gabung_delta(lama, _df([(2, "b", 20)]), "id")
+    assert df is lama
+    assert not berubah and hanya_tambah
+
+
+def test_gabung_delta_overlap_sama_plus_baru():
+    lama = _df([(1, "a", 10), (2, "b", 20)])
+    baru = _df([(2, "b", 20), (3, "c", 30)])
+    df, berubah, hanya_tambah = utils._gabung_delta(lama, baru, "id")
+    assert df["id"].tolist() == [1, 2, 3]
+    assert berubah and hanya_tambah
+
+
+def test_gabung_delta_id_terlambat():
+    # Insert terminal lain dengan id lebih kecil dari baris hasil patch
+    lama = _df([(1, "a", 10), (5, "e", 50)])
+    df, berubah, hanya_tambah = utils._gabung_delta(lama, _df([(3, "c", 30)]), "id")
+    assert sorted(df["id"].tolist()) == [1, 3, 5]
+    assert berubah and not hanya_tambah
+
+
+def test_gabung_delta_baris_berubah():
+    lama = _df([(1, "a", 10), (2, "b", 20)])
+    df, berubah, hanya_tambah = utils._gabung_delta(lama, _df([(2, "b", 25)]), "id")
+    assert df.set_index("id").loc[2, "harga"] == 25
+    assert len(df) == 2
+    assert berubah and not hanya_tambah
+
+
+def test_terapkan_patch_update():
+    df = _df([(1, "a", 10), (2, "b", 20)])
+    rows = pd.DataFrame([{"id": 1, "harga": 15}])
+    hasil, hanya_tambah = utils._terapkan_patch(df, rows, "id")
+    assert hasil.to_dict("records") == [
+        {"id": 1, "nama": "a", "harga": 15},
+        {"id": 2, "nama": "b", "harga": 20},
+    ]
+    assert not hanya_tambah
+    # df asli tidak ikut berubah
+    assert df.loc[0, "harga"] == 10
+
+
+def test_terapkan_patch_append():
+    df = _df([(1, "a", 10)])
+    hasil, hanya_tambah = utils._terapkan_patch(df, _df([(2, "b", 20)]), "id")
+    assert hasil["id"].tolist() == [1, 2]
+    assert hanya_tambah
+
+
+def test_terapkan_patch_append_id_lebih_kecil():
+    df = _df([(5, "e", 50)])
+    hasil, hanya_tambah = utils._terapkan_patch(df, _df([(2, "b", 20)]), "id")
+    assert hasil["id"].tolist() == [5, 2]
+    assert not hanya_tambah
+
+
+def test_terapkan_patch_tidak_bisa():
+    df = _df([(1, "a", 10)])
+    # Baris baru tanpa semua kolom
+    assert utils._terapkan_patch(df, pd.DataFrame([{"id": 2, "harga": 5}]), "id") is None
+    # Kolom kunci tidak ada
+    assert utils._terapkan_patch(df, pd.DataFrame([{"nama": "x"}]), "id") is None
+    # Kunci dobel di salinan lokal
+    dobel = _df([(1, "a", 10), (1, "b", 20)])
+    assert utils._terapkan_patch(dobel, _df([(1, "c", 30)]), "id") is None
+
+
+def test_terapkan_patch_acak_sama_dengan_dict():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        ids = rng.choice(60, size=rng.integers(0, 30), replace=False)
+        df = _df([(int(i), f"n{i}", int(rng.integers(100))) for i in ids])
+
+        ref = {r["id"]: dict(r) for r in df.to_dict("records")}
+        rows = []
+        for i in rng.integers(0, 80, size=rng.integers(1, 10)):
+            row = {"id": int(i), "nama": f"m{i}", "harga": int(rng.integers(100))}
+            rows.append(row)
+            ref[int(i)] = row
+
+        hasil, _ = utils._terapkan_patch(df, pd.DataFrame(rows), "id")
+        assert {r["id"]: r for r in hasil.to_dict("records")} == ref
+        assert hasil["id"].tolist()[:len(df)] == df["id"].tolist()
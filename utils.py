@@ -1,6 +1,16 @@
 import pandas as pd
 import numpy as np
-from datetime import date, datetime, timedelta
+import threading
+import time
+import pickle
+import sqlite3
+import uuid
+import os
+import hashlib
+import pyarrow as pa
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import date, datetime
 import streamlit as st
 from zoneinfo import ZoneInfo
 from supabase import create_client
@@ -29,26 +39,111 @@ def get_dataframe_supabase(table_name):
     response = supabase.table(table_name).select("*").execute()
     return pd.DataFrame(response.data)
 
-def get_table_raw(table_name):
+# Ukuran halaman & jumlah thread untuk get_table_raw
+PAGE_SIZE = 1000
+FETCH_WORKERS = 4
+
+# Kolom unik per tabel untuk urutan halaman get_table_raw. Setiap halaman
+# adalah query terpisah; tanpa ORDER BY yang unik PostgreSQL tidak menjamin
+# urutan baris sama antar query, range bisa tumpang tindih atau melompat.
+KUNCI_URUT = {
+    "transaksi_detail": "id",
+    "pembayaran": "id",
+    "log_lensa": "id",
+    "log_frames": "id",
+    "frames": "id",
+    "lensa": "id",
+    "pesanan_luar_kota_detail": "id",
+    "pelanggan": "id_pelanggan",
+}
+
+def _query_table(table_name, columns=None, filters=None, order=None, **select_kwargs):
     supabase = get_supabase()
+    query = supabase.table(table_name).select(",".join(columns) if columns else "*", **select_kwargs)
+
+    # filters: list of (op, kolom, nilai), contoh [("gte", "tanggal", "2025-01-01")]
+    # op boleh bertingkat: ("not_.is_", "tanggal", "null")
+    for op, kolom, nilai in filters or []:
+        fungsi = query
+        for bagian in op.split("."):
+            fungsi = getattr(fungsi, bagian)
+        query = fungsi(kolom, nilai)
+
+    # order: "kolom", "kolom.desc", atau beberapa dipisah koma "tanggal.desc,id.desc"
+    for urutan in (order or "").split(","):
+        if urutan:
+            kolom, _, arah = urutan.partition(".")
+            query = query.order(kolom, desc=(arah == "desc"))
+
+    return query
+
+def _fetch_page(table_name, page, page_size, columns=None, filters=None, order=None):
+    response = (
+        _query_table(table_name, columns, filters, order)
+        .range(page * page_size, (page + 1) * page_size - 1)
+        .execute()
+    )
+    return response.data or []
+
+def count_rows(table_name, filters=None):
+    # Count-only request, tanpa mengambil isi baris
+    response = _query_table(table_name, filters=filters, count="exact", head=True).execute()
+    return response.count
+
+def get_table_raw(table_name, columns=None, filters=None, order=None,
+                  page_size=None, max_workers=None, parallel=True):
+    page_size = page_size or PAGE_SIZE
+    max_workers = max_workers or FETCH_WORKERS
     all_data = []
     page = 0
-    page_size = 1000
-
-    while True:
-        response = (
-            supabase.table(table_name)
-            .select("*")
-            .range(page * page_size, (page + 1) * page_size - 1)
-            .execute()
-        )
 
-        if not response.data:
+    # Urutan halaman harus stabil: kolom unik tabel ditambahkan sebagai
+    # penentu terakhir. Tabel tanpa kolom unik yang diketahui dan tanpa
+    # order dari pemanggil diambil berurutan saja.
+    kunci = KUNCI_URUT.get(table_name)
+    if kunci:
+        if kunci not in [u.partition(".")[0] for u in (order or "").split(",")]:
+            order = f"{order},{kunci}" if order else kunci
+    elif not order:
+        parallel = False
+
+    # ==============================
+    # MODE PARALEL
+    # ==============================
+    # Hitung jumlah baris dulu, lalu semua range diambil bersamaan
+    total = count_rows(table_name, filters) if parallel and max_workers > 1 else None
+
+    if total:
+        n_pages = -(-total // page_size)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, n_pages)) as executor:
+            pages = executor.map(
+                lambda p: _fetch_page(table_name, p, page_size, columns, filters, order),
+                range(n_pages)
+            )
+            for data in pages:
+                all_data.extend(data)
+
+        # Halaman terakhir penuh -> ada baris baru sejak count, lanjut berurutan
+        if len(all_data) < n_pages * page_size:
+            page = None
+        else:
+            page = n_pages
+    elif total == 0:
+        page = None
+
+    # ==============================
+    # MODE BERURUTAN
+    # ==============================
+    while page is not None:
+        data = _fetch_page(table_name, page, page_size, columns, filters, order)
+
+        if not data:
             break
 
-        all_data.extend(response.data)
+        all_data.extend(data)
 
-        if len(response.data) < page_size:
+        if len(data) < page_size:
             break
 
         page += 1
@@ -69,46 +164,1045 @@ def get_table_raw(table_name):
 
     return df
 
+# ==============================
+# CACHE BERSAMA (LINTAS PROSES)
+# ==============================
+# st.cache_data/st.cache_resource hanya hidup di satu proses. Kalau app jalan
+# di beberapa replika, backend ini dipakai bersama semua proses di host:
+# salinan tabel hasil fetch satu proses langsung dipakai proses lain yang
+# masih dingin, dan invalidate_tables menaikkan stamp tabel di semua proses.
+# Default CacheLokal (tidak berbagi, perilaku lama). SqliteCache aktif kalau
+# secrets punya [cache] sqlite_path = "...", atau lewat set_cache_backend().
+
+# Umur maksimal snapshot bersama yang masih dipakai, sama dengan TTL get_table_cached
+BERSAMA_DETIK = 300
+
+class CacheLokal:
+    """Tanpa cache bersama: setiap proses fetch sendiri."""
+
+    def stamp(self, tables):
+        return {t: (0, 0) for t in tables}
+
+    def naikkan(self, tables, reset=False):
+        pass
+
+    def info(self, kunci):
+        return None
+
+    def muat(self, kunci):
+        return None
+
+    def simpan(self, kunci, tabel, stamp, token, df):
+        pass
+
+class SqliteCache:
+    """Snapshot tabel + stamp per tabel di satu file SQLite (mode WAL).
+
+    stamp tabel = (nilai, reset): nilai naik setiap invalidate_tables,
+    reset naik kalau penuh=True supaya proses lain load penuh, bukan delta.
+    Snapshot disimpan per key sync_table (pickle DataFrame) beserta stamp
+    saat di-fetch; hanya dipakai selama stamp tabelnya belum berubah.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=normal")
+        self.conn.execute(
+            "create table if not exists stamp ("
+            " tabel text primary key,"
+            " nilai integer not null default 0,"
+            " reset integer not null default 0)"
+        )
+        self.conn.execute(
+            "create table if not exists snapshot ("
+            " kunci text primary key,"
+            " tabel text not null,"
+            " stamp integer not null,"
+            " token text not null,"
+            " disimpan real not null,"
+            " data blob not null)"
+        )
+
+    def stamp(self, tables):
+        hasil = {t: (0, 0) for t in tables}
+        if not tables:
+            return hasil
+        with self.lock:
+            rows = self.conn.execute(
+                f"select tabel, nilai, reset from stamp where tabel in ({','.join('?' * len(tables))})",
+                list(tables)
+            ).fetchall()
+        for tabel, nilai, reset in rows:
+            hasil[tabel] = (nilai, reset)
+        return hasil
+
+    def naikkan(self, tables, reset=False):
+        with self.lock:
+            self.conn.executemany(
+                "insert into stamp (tabel, nilai, reset) values (?, 1, ?) "
+                "on conflict(tabel) do update set "
+                "nilai = nilai + 1, reset = reset + excluded.reset",
+                [(t, int(reset)) for t in tables]
+            )
+
+    def info(self, kunci):
+        # (stamp, token, disimpan) tanpa memuat datanya
+        with self.lock:
+            return self.conn.execute(
+                "select stamp, token, disimpan from snapshot where kunci = ?",
+                (kunci,)
+            ).fetchone()
+
+    def muat(self, kunci):
+        with self.lock:
+            row = self.conn.execute(
+                "select data from snapshot where kunci = ?", (kunci,)
+            ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def simpan(self, kunci, tabel, stamp, token, df):
+        data = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.conn.execute(
+                "insert or replace into snapshot values (?, ?, ?, ?, ?, ?)",
+                (kunci, tabel, stamp, token, time.time(), data)
+            )
+
+_cache_backend = None
+
+def set_cache_backend(backend):
+    global _cache_backend
+    _cache_backend = backend
+
+def get_cache_backend():
+    global _cache_backend
+    if _cache_backend is None:
+        try:
+            path = st.secrets.get("cache", {}).get("sqlite_path")
+        except Exception:
+            path = None
+        _cache_backend = SqliteCache(path) if path else CacheLokal()
+    return _cache_backend
+
+# Backend bersama tidak boleh menggagalkan app: kalau error, jalan seperti CacheLokal
+def _stamp_bersama(*tables):
+    try:
+        return get_cache_backend().stamp(tables)
+    except Exception as e:
+        print(f"Error cache bersama (stamp): {e}")
+        return {t: (0, 0) for t in tables}
+
+def _naikkan_bersama(tables, reset=False):
+    try:
+        get_cache_backend().naikkan(tables, reset=reset)
+    except Exception as e:
+        print(f"Error cache bersama (naikkan): {e}")
+
+def _ambil_bersama(key, entry, stamp):
+    # Snapshot proses lain untuk key ini; None kalau tidak ada, stamp-nya beda,
+    # sudah kedaluwarsa, atau snapshot itu yang sedang dipegang entry
+    try:
+        backend = get_cache_backend()
+        info = backend.info(repr(key))
+        if info is None:
+            return None
+        stamp_snapshot, token, disimpan = info
+        if (
+            stamp_snapshot != stamp[0]
+            or token == entry["token"]
+            or time.time() - disimpan > BERSAMA_DETIK
+        ):
+            return None
+        df = backend.muat(repr(key))
+    except Exception as e:
+        print(f"Error cache bersama (ambil {key[0]}): {e}")
+        return None
+
+    if df is not None:
+        entry["token"] = token
+    return df
+
+def _bagikan(key, entry):
+    # Isi entry ke backend bersama, dicap stamp saat fetch dimulai. Pickle dan
+    # tulis jalan di background (_latar), bukan di jalur request/sambil pegang lock.
+    token = uuid.uuid4().hex
+    entry["token"] = token
+    _latar().submit(_tulis_bersama, repr(key), key[0], entry["stamp"][0], token, entry["df"])
+
+def _tulis_bersama(kunci, tabel, stamp, token, df):
+    try:
+        get_cache_backend().simpan(kunci, tabel, stamp, token, df)
+    except Exception as e:
+        print(f"Error cache bersama (simpan {tabel}): {e}")
+
+# ==============================
+# SNAPSHOT DISK (COLD START)
+# ==============================
+# Setiap sync yang mengubah isi, salinan tabel tanpa filters/order ditulis
+# (di background) ke .cache/tabel sebagai file Arrow IPC tanpa kompresi.
+# Proses yang baru start membaca file itu lewat memory map dan langsung
+# memakainya; load penuh ke Supabase jalan di background lalu menggantikannya.
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tabel")
+SNAPSHOT_AKTIF = True
+
+@st.cache_resource
+def _latar():
+    # Thread background untuk tulis snapshot dan refresh setelah cold start
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="snapshot")
+
+def _path_snapshot(key):
+    nama = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{key[0]}-{nama}.arrow")
+
+def _pakai_snapshot(key):
+    _, _, filters, order = key
+    return SNAPSHOT_AKTIF and not filters and not order
+
+def _tulis_snapshot(key, df):
+    try:
+        tabel = pa.Table.from_pandas(df, preserve_index=False)
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        path = _path_snapshot(key)
+        # Tulis ke file sementara lalu rename, pembaca tidak pernah melihat file setengah jadi
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, tabel.schema) as writer:
+                writer.write_table(tabel)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"Error tulis snapshot ({key[0]}): {e}")
+
+def _simpan_snapshot(key, df):
+    # df dipakai bersama dan tidak pernah diubah in-place, aman ditulis dari thread lain
+    if _pakai_snapshot(key):
+        _latar().submit(_tulis_snapshot, key, df)
+
+def _baca_snapshot(key):
+    if not _pakai_snapshot(key):
+        return None
+    path = _path_snapshot(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        sumber = pa.memory_map(path)
+        return pa.ipc.open_file(sumber).read_all().to_pandas()
+    except Exception as e:
+        print(f"Error baca snapshot ({key[0]}): {e}")
+        return None
+
+def _refresh_latar(key, kolom_hwm, versi_awal):
+    # Load penuh setelah cold start dari snapshot disk. Tidak cukup delta:
+    # baris lama di snapshot mungkin sudah di-UPDATE sejak file ditulis.
+    table_name, columns, _, _ = key
+    entry = _store_entry(key)
+    try:
+        stamp = _stamp_bersama(table_name)[table_name]
+        df = get_table_raw(table_name, list(columns) if columns else None)
+    except Exception as e:
+        print(f"Error refresh snapshot ({table_name}): {e}")
+        df = None
+
+    with entry["lock"]:
+        if df is None or entry["versi"] != versi_awal:
+            # Gagal, atau entry sudah diubah delta/patch selama fetch:
+            # sync berikutnya load penuh seperti biasa
+            entry["hwm"] = None
+            if df is not None:
+                _naikkan_generasi_lokal([table_name])
+            return
+
+        if df.equals(entry["df"]):
+            return
+
+        entry["stamp"] = stamp
+        _set_hwm(entry, df, kolom_hwm)
+        _simpan_df(entry, df, basis_baru=True)
+        _simpan_snapshot(key, df)
+        _bagikan(key, entry)
+
+        # Rerun berikutnya cache miss dan langsung memakai hasil refresh ini
+        _naikkan_generasi_lokal([table_name])
+        entry["segar"] = (generasi_tabel(table_name), time.monotonic())
+
+# ==============================
+# SINGLE-FLIGHT
+# ==============================
+# Cache miss bersamaan untuk key yang sama tidak masing-masing fetch:
+# pemanggil pertama menjalankan fetch, yang datang selama fetch itu berjalan
+# menunggu dan memakai hasil yang sama. Counter per tabel bisa dilihat lewat
+# statistik_single_flight().
+
+@st.cache_resource
+def _single_flight():
+    return {"lock": threading.Lock(), "jalan": {}, "statistik": {}}
+
+def satu_fetch(kunci, fungsi):
+    """Jalankan ``fungsi()`` sekali untuk panggilan bersamaan dengan ``kunci`` sama.
+
+    kunci: tuple hashable, elemen pertama nama tabel (untuk counter).
+    Exception dari fungsi diteruskan ke semua yang menunggu.
+    """
+    sf = _single_flight()
+    with sf["lock"]:
+        statistik = sf["statistik"].setdefault(kunci[0], {"fetch": 0, "digabung": 0})
+        future = sf["jalan"].get(kunci)
+        pemilik = future is None
+        if pemilik:
+            future = Future()
+            sf["jalan"][kunci] = future
+            statistik["fetch"] += 1
+        else:
+            statistik["digabung"] += 1
+
+    if not pemilik:
+        return future.result()
+
+    try:
+        hasil = fungsi()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(hasil)
+        return hasil
+    finally:
+        with sf["lock"]:
+            sf["jalan"].pop(kunci, None)
+
+def statistik_single_flight():
+    # {tabel: {"fetch": jumlah sync yang benar-benar jalan, "digabung": yang ikut menunggu}}
+    sf = _single_flight()
+    with sf["lock"]:
+        return {t: dict(v) for t, v in sf["statistik"].items()}
+
+# ==============================
+# DELTA SYNC
+# ==============================
+# Tabel yang hanya bertambah -> kolom high-water mark (numerik).
+# Setelah load pertama, yang diambil cuma baris dengan kolom ini > hwm - DELTA_OVERLAP.
+DELTA_TABLES = {
+    "transaksi_detail": "id",
+    "pembayaran": "id",
+    "log_lensa": "id",
+    "log_frames": "id",
+}
+
+# Jendela di bawah hwm yang selalu diambil ulang: baris yang commit belakangan
+# dengan id lebih kecil (dua kasir simpan bersamaan) tetap ikut terambil
+DELTA_OVERLAP = 200
+
+# Setiap sekian kali delta, load penuh sekali (UPDATE/DELETE baris lama dari
+# replika lain yang tidak terlihat oleh delta). Dengan TTL 300 detik ~ 30 menit.
+DELTA_PENUH_SETIAP = 6
+
+@st.cache_resource
+def _table_store():
+    # Salinan lokal tiap tabel, dipakai bersama semua session di proses ini
+    return {"lock": threading.Lock(), "tabel": {}, "versi": 0}
+
+def _next_versi():
+    # Nomor versi unik untuk semua tabel/proyeksi di proses ini
+    store = _table_store()
+    with store["lock"]:
+        store["versi"] += 1
+        return store["versi"]
+
+def _nilai_key(nilai):
+    # Nilai filter list (mis. op in_) dijadikan tuple supaya key bisa di-hash
+    if isinstance(nilai, (list, tuple)):
+        return tuple(_nilai_key(v) for v in nilai)
+    return nilai
+
+def _store_key(table_name, columns=None, filters=None, order=None):
+    return (
+        table_name,
+        tuple(columns) if columns else None,
+        tuple(tuple(_nilai_key(v) for v in f) for f in filters) if filters else None,
+        order or None,
+    )
+
+def _store_entry(key):
+    store = _table_store()
+    with store["lock"]:
+        if key not in store["tabel"]:
+            store["tabel"][key] = {
+                "df": None,
+                "hwm": None,
+                "versi": 0,
+                "basis": 0,
+                "segar": None,
+                "stamp": None,
+                "token": None,
+                "jumlah_delta": 0,
+                "lock": threading.Lock(),
+            }
+        return store["tabel"][key]
+
+def sync_table(table_name, columns=None, filters=None, order=None, generasi=None):
+    """Samakan salinan lokal dengan Supabase lalu kembalikan DataFrame-nya.
+
+    Tabel di DELTA_TABLES hanya mengambil baris baru (> high-water mark),
+    tabel lain di-load penuh. Setiap kombinasi columns/filters/order punya
+    salinan sendiri; delta hanya dipakai tanpa filters/order dan kalau
+    kolom hwm ikut terambil. ``df.attrs["versi"]`` naik setiap isi berubah;
+    ``df.attrs["basis"]`` hanya berubah saat load penuh, selama sama berarti
+    baris lama tidak berubah dan yang baru hanya ditambahkan di belakang.
+    DataFrame yang dikembalikan dipakai bersama, jangan diubah in-place.
+
+    generasi: generasi_tabel(table_name) dari pemanggil. Kalau salinan baru
+    saja ditambal patch_table_cache di generasi yang sama (< SEGAR_DETIK),
+    fetch dilewati.
+
+    Load penuh lebih dulu memakai snapshot proses lain dari cache bersama
+    (kalau stamp tabelnya masih sama); hasil fetch sendiri dibagikan ke sana.
+    Load pertama di proses ini memakai snapshot disk kalau ada, lalu
+    load penuh dijalankan di background (_refresh_latar).
+
+    Panggilan bersamaan untuk key dan generasi yang sama (mis. banyak session
+    kena TTL sekaligus) hanya menjalankan satu sync, sisanya menunggu hasilnya
+    (satu_fetch). Pemanggil dengan generasi lebih baru (sesudah ada tulisan)
+    tidak ikut fetch yang dimulai sebelum tulisan itu.
+    """
+    key = _store_key(table_name, columns, filters, order)
+    return satu_fetch(
+        key + (generasi,),
+        lambda: _sync_table(key, table_name, columns, filters, order, generasi)
+    )
+
+def _sync_table(key, table_name, columns, filters, order, generasi):
+    entry = _store_entry(key)
+    kolom_hwm = DELTA_TABLES.get(table_name)
+
+    if filters or order or (columns and kolom_hwm not in columns):
+        kolom_hwm = None
+
+    with entry["lock"]:
+        df_lama = entry["df"]
+
+        if df_lama is not None and generasi is not None and _masih_segar(entry, generasi):
+            return df_lama
+
+        # Stamp dibaca sebelum fetch: snapshot tidak pernah dicap lebih baru dari isinya
+        stamp = _stamp_bersama(table_name)[table_name]
+        if entry["stamp"] is not None and entry["stamp"][1] != stamp[1]:
+            # Proses lain invalidate_tables(penuh=True): baris lama mungkin berubah
+            entry["hwm"] = None
+        entry["stamp"] = stamp
+
+        load_penuh = df_lama is None or kolom_hwm is None or entry["hwm"] is None
+        resync = not load_penuh and entry["jumlah_delta"] >= DELTA_PENUH_SETIAP
+        df_bersama = _ambil_bersama(key, entry, stamp) if load_penuh else None
+        df_disk = None
+        if df_lama is None and df_bersama is None:
+            df_disk = _baca_snapshot(key)
+
+        if df_bersama is not None:
+            df = df_bersama
+            berubah = df_lama is None or not df.equals(df_lama)
+        elif df_disk is not None:
+            df = df_disk
+            berubah = True
+        elif load_penuh or resync:
+            load_penuh = True
+            df = get_table_raw(table_name, columns, filters, order)
+            berubah = df_lama is None or not df.equals(df_lama)
+            entry["jumlah_delta"] = 0
+        else:
+            # Delta biasanya kecil, langsung berurutan tanpa count dulu
+            df_baru = get_table_raw(
+                table_name,
+                columns,
+                filters=[("gt", kolom_hwm, entry["hwm"] - DELTA_OVERLAP)],
+                parallel=False
+            )
+            df, berubah, hanya_tambah = _gabung_delta(df_lama, df_baru, kolom_hwm)
+            if not hanya_tambah:
+                load_penuh = True
+            entry["jumlah_delta"] += 1
+
+        _set_hwm(entry, df, kolom_hwm)
+
+        if berubah:
+            _simpan_df(entry, df, basis_baru=load_penuh)
+
+        if df_disk is not None:
+            _latar().submit(_refresh_latar, key, kolom_hwm, entry["versi"])
+        elif df_bersama is None and berubah:
+            _simpan_snapshot(key, df)
+            _bagikan(key, entry)
+
+        return entry["df"]
+
+def _set_hwm(entry, df, kolom_hwm):
+    if kolom_hwm and kolom_hwm in df.columns and not df.empty:
+        entry["hwm"] = df[kolom_hwm].max()
+    else:
+        entry["hwm"] = None
+
+def _simpan_df(entry, df, basis_baru):
+    # Pasang df sebagai isi baru entry (dipanggil di dalam entry["lock"])
+    entry["versi"] = _next_versi()
+    if basis_baru:
+        entry["basis"] = entry["versi"]
+    df.attrs["versi"] = entry["versi"]
+    df.attrs["basis"] = entry["basis"]
+    entry["df"] = df
+
+def _gabung_delta(df_lama, df_baru, kolom):
+    # Gabung baris hasil fetch delta ke salinan lokal.
+    # Hasil: (df, berubah, hanya_tambah). hanya_tambah False kalau ada baris
+    # lama yang isinya berubah, atau baris baru yang hwm-nya tidak lebih besar
+    # dari yang sudah ada (insert terminal lain yang terlewati karena baris
+    # hasil patch_table_cache) -> agregat inkremental harus dibangun ulang.
+    if df_baru.empty:
+        return df_lama, False, True
+
+    sudah_ada = df_baru[kolom].isin(df_lama[kolom])
+    hanya_tambah = True
+
+    if sudah_ada.any():
+        # Biasanya baris yang sudah ditambal patch_table_cache, isinya sama
+        df_ganti = df_baru[sudah_ada].drop_duplicates(subset=kolom, keep="last")
+        sama = set(df_ganti.columns) <= set(df_lama.columns)
+        if sama:
+            df_cocok = (
+                df_lama.drop_duplicates(subset=kolom, keep="last")
+                .set_index(kolom)
+                .reindex(df_ganti[kolom])
+            )
+            kolom_isi = [c for c in df_ganti.columns if c != kolom]
+            sama = (
+                df_cocok[kolom_isi].astype(str).to_numpy().tolist()
+                == df_ganti[kolom_isi].astype(str).to_numpy().tolist()
+            )
+        if sama:
+            df_baru = df_baru[~sudah_ada]
+            if df_baru.empty:
+                return df_lama, False, True
+        else:
+            hanya_tambah = False
+
+    if not df_lama.empty and df_baru[kolom].min() <= df_lama[kolom].max():
+        hanya_tambah = False
+
+    df = pd.concat([df_lama, df_baru], ignore_index=True)
+    df = df.drop_duplicates(subset=kolom, keep="last").reset_index(drop=True)
+    return df, True, hanya_tambah
+
+def reset_table_sync(table_name):
+    # Panggil setelah UPDATE/DELETE baris lama, delta sync hanya melihat baris baru
+    store = _table_store()
+    with store["lock"]:
+        entries = [e for k, e in store["tabel"].items() if k[0] == table_name]
+    for entry in entries:
+        with entry["lock"]:
+            entry["hwm"] = None
+            entry["segar"] = None
+
+# ==============================
+# INVALIDASI CACHE PER TABEL
+# ==============================
+# Setiap tabel punya nomor generasi yang ikut jadi key cache_data
+# (get_table_cached, _sync_versi, get_halaman, ...). invalidate_tables menaikkan
+# generasi tabel yang ditulis: entry lamanya tidak dipakai lagi (dibuang TTL),
+# tabel lain tetap di cache. Pengganti st.cache_data.clear() setelah simpan.
+
+# View yang isinya ikut berubah kalau tabel dasarnya ditulis
+TABEL_TURUNAN = {
+    "pembayaran": ["pembayaran_status"],
+    "pembayaran_luar_kota": ["pembayaran_luar_kota_status"],
+}
+
+@st.cache_resource
+def _generasi_store():
+    return {"lock": threading.Lock(), "generasi": {}}
+
+def generasi_tabel(*tables):
+    # Tuple generasi, dipakai sebagai argumen fungsi cache_data yang membaca tabel ini
+    # Generasi lokal + stamp cache bersama (tulisan dari proses lain)
+    store = _generasi_store()
+    stamp = _stamp_bersama(*tables)
+    return tuple(store["generasi"].get(t, 0) + stamp[t][0] for t in tables)
+
+def _naikkan_generasi_lokal(tables):
+    store = _generasi_store()
+    with store["lock"]:
+        for t in tables:
+            store["generasi"][t] = store["generasi"].get(t, 0) + 1
+
+def invalidate_tables(*tables, penuh=False):
+    """Buang cache ``tables`` (dan view turunannya) untuk semua session.
+
+    penuh=True juga mereset delta sync (reset_table_sync); pakai setelah
+    UPDATE/DELETE baris lama. Cukup penuh=False kalau hanya INSERT.
+    """
+    semua = []
+    for t in tables:
+        semua.append(t)
+        semua.extend(TABEL_TURUNAN.get(t, []))
+
+    _naikkan_generasi_lokal(semua)
+    _naikkan_bersama(semua, reset=penuh)
+
+    if penuh:
+        for t in semua:
+            reset_table_sync(t)
+
+def get_table_cached(table_name, columns=None, filters=None, order=None):
+    """Tabel dari cache. columns/filters/order diteruskan ke Supabase.
+
+    columns: list nama kolom, default semua (select("*"))
+    filters: list of (op, kolom, nilai), op: eq/neq/gt/gte/lt/lte/is_/in_/ilike/not_.is_
+    order  : "kolom", "kolom.desc", atau "kolom.desc,kolom2.desc"
+    Setiap kombinasi argumen punya entry cache sendiri, berlaku sampai TTL
+    atau invalidate_tables(table_name).
+    """
+    return _get_table_cached(table_name, columns, filters, order, generasi_tabel(table_name))
+
 @st.cache_data(ttl=300)
-def get_table_cached(table_name):
+def _get_table_cached(table_name, columns, filters, order, generasi):
     try:
-        df = get_table_raw(table_name)
+        df = sync_table(table_name, columns, filters, order, generasi)
 
         if df is None:
             return pd.DataFrame()
 
-        return df
+        return df.copy()
 
     except Exception as e:
         print(f"Error get_table_cached({table_name}): {e}")
         return pd.DataFrame()
-  
-# Tambahkan satu baris ke tabel supabase  
+
+# ==============================
+# WRITE-THROUGH
+# ==============================
+# Baris hasil tulis aplikasi ini sendiri (insert_row_supabase, insert_rows_supabase,
+# update_row_supabase, adjust_stock) langsung ditambal ke salinan lokal, lalu
+# generasi tabelnya dinaikkan. Rerun berikutnya cache miss, tapi sync_table
+# memakai salinan yang sudah ditambal tanpa fetch ke Supabase.
+# hwm sengaja tidak dimajukan: delta sync berikutnya tetap mengambil baris
+# terminal lain yang id-nya lebih kecil dari baris hasil patch.
+
+# Lama salinan hasil patch dipakai tanpa fetch; cache miss sesudahnya (TTL)
+# kembali sync ke Supabase seperti biasa
+SEGAR_DETIK = 60
+
+def _masih_segar(entry, generasi):
+    segar = entry["segar"]
+    return (
+        segar is not None
+        and segar[0] == generasi
+        and time.monotonic() - segar[1] < SEGAR_DETIK
+    )
+
+def _rapikan_df(df):
+    # Normalisasi yang sama dengan get_table_raw
+    if df.empty:
+        return df
+
+    df = df.replace([np.inf, -np.inf], np.nan)
+
+    numeric_cols = ["harga_modal", "harga_jual", "stock"]
+
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(
+                df[col],
+                errors="coerce"
+            ).fillna(0)
+
+    return df
+
+def _terapkan_patch(df, df_rows, kunci):
+    # Baris yang kuncinya sudah ada -> update kolom yang ada di df_rows,
+    # sisanya append (harus punya semua kolom df).
+    # Hasil: (df_baru, hanya_tambah), None kalau tidak bisa ditambal (fetch saja).
+    if kunci not in df.columns or kunci not in df_rows.columns:
+        return None
+    if df[kunci].duplicated().any():
+        return None
+
+    df_rows = df_rows.drop_duplicates(subset=kunci, keep="last")
+    sudah_ada = df_rows[kunci].isin(df[kunci])
+    df_tambah = df_rows[~sudah_ada]
+
+    if not df_tambah.empty and not set(df.columns) <= set(df_tambah.columns):
+        return None
+
+    df = df.copy()
+    hanya_tambah = True
+
+    if sudah_ada.any():
+        df_ganti = df_rows[sudah_ada]
+        posisi = pd.Index(df[kunci]).get_indexer(df_ganti[kunci])
+        for col in df_ganti.columns:
+            if col != kunci and col in df.columns:
+                df.iloc[posisi, df.columns.get_loc(col)] = df_ganti[col].to_numpy()
+        hanya_tambah = False
+
+    if not df_tambah.empty:
+        if not df.empty and df_tambah[kunci].min() <= df[kunci].max():
+            hanya_tambah = False
+        df = pd.concat([df, df_tambah[list(df.columns)]], ignore_index=True)
+
+    return df, hanya_tambah
+
+def patch_table_cache(table_name, rows, kunci="id"):
+    """Tambal salinan lokal ``table_name`` dengan baris hasil tulis sendiri.
+
+    rows: list of dict (response.data dari insert/update). Baris yang kuncinya
+    sudah ada di-update per kolom, sisanya di-append. Salinan dengan
+    filters/order, atau proyeksi tanpa kolom kunci, tidak ditambal dan
+    di-fetch ulang seperti biasa. Generasi tabel (dan view turunannya) ikut
+    naik, pemanggil tidak perlu invalidate_tables lagi.
+    """
+    rows = [r for r in rows or [] if r.get(kunci) is not None]
+
+    invalidate_tables(table_name)
+    if not rows:
+        return
+
+    generasi = generasi_tabel(table_name)
+    df_rows = _rapikan_df(pd.DataFrame(rows))
+
+    store = _table_store()
+    with store["lock"]:
+        entries = [(k, e) for k, e in store["tabel"].items() if k[0] == table_name]
+
+    for key, entry in entries:
+        _, columns, filters, order = key
+        with entry["lock"]:
+            entry["segar"] = None
+            if entry["df"] is None or filters or order:
+                continue
+
+            kolom = [c for c in df_rows.columns if not columns or c in columns]
+            try:
+                hasil = _terapkan_patch(entry["df"], df_rows[kolom], kunci)
+            except Exception as e:
+                print(f"Error patch_table_cache({table_name}): {e}")
+                hasil = None
+            if hasil is None:
+                continue
+
+            df, hanya_tambah = hasil
+            _simpan_df(entry, df, basis_baru=not hanya_tambah)
+            entry["segar"] = (generasi, time.monotonic())
+            entry["stamp"] = _stamp_bersama(table_name)[table_name]
+            _simpan_snapshot(key, df)
+            # Tabel riwayat (DELTA_TABLES) tidak dibagikan per patch: proses lain
+            # cukup delta kecil, menulis ulang seluruh tabel per baris terlalu mahal
+            if table_name not in DELTA_TABLES:
+                _bagikan(key, entry)
+
+# ==============================
+# ROLLUP (AGREGAT INKREMENTAL)
+# ==============================
+# Agregat lokal dari tabel di DELTA_TABLES: baris baru (> hwm) saja yang
+# diagregasi lalu digabung ke hasil sebelumnya. Dibangun ulang dari awal
+# kalau tabel di-load penuh (reset_table_sync / data lama berubah).
+@st.cache_resource
+def _rollup_store():
+    return {"lock": threading.Lock(), "rollup": {}}
+
+@st.cache_data(ttl=300)
+def _sync_versi(table_name, columns=None, generasi=None):
+    # Ikut TTL & invalidate_tables yang sama dengan get_table_cached
+    df = sync_table(table_name, columns, generasi=generasi)
+    return df.attrs.get("versi")
+
+def get_rollup(nama, table_name, columns, agregasi, gabung):
+    """Agregat ``nama`` dari ``table_name`` yang diperbarui inkremental.
+
+    agregasi(df) -> agregat dari sekumpulan baris
+    gabung(lama, baru) -> agregat gabungan
+    Hasil dipakai bersama semua session, jangan diubah in-place.
+    None kalau tabel gagal diambil.
+    """
+    try:
+        _sync_versi(table_name, columns, generasi_tabel(table_name))
+        entry = _store_entry(_store_key(table_name, columns))
+        df = entry["df"]
+        if df is None:
+            df = sync_table(table_name, columns)
+    except Exception as e:
+        print(f"Error get_rollup({nama}): {e}")
+        return None
+
+    store = _rollup_store()
+    with store["lock"]:
+        state = store["rollup"].setdefault(nama, {
+            "agg": None, "versi": None, "basis": None, "hwm": None,
+            "lock": threading.Lock(),
+        })
+
+    kolom_hwm = DELTA_TABLES.get(table_name)
+    if columns and kolom_hwm not in columns:
+        kolom_hwm = None
+    versi = df.attrs.get("versi")
+    basis = df.attrs.get("basis")
+
+    with state["lock"]:
+        if state["agg"] is not None and state["versi"] == versi:
+            return state["agg"]
+
+        inkremental = (
+            state["agg"] is not None
+            and kolom_hwm is not None
+            and state["hwm"] is not None
+            and state["basis"] == basis
+        )
+
+        if inkremental:
+            df_baru = df[df[kolom_hwm] > state["hwm"]]
+            agg = gabung(state["agg"], agregasi(df_baru)) if not df_baru.empty else state["agg"]
+        else:
+            agg = agregasi(df)
+
+        state["agg"] = agg
+        state["versi"] = versi
+        state["basis"] = basis
+        state["hwm"] = df[kolom_hwm].max() if kolom_hwm and not df.empty else None
+
+        return agg
+
+# ==============================
+# STATUS PEMBAYARAN TERAKHIR
+# ==============================
+# View satu baris per id_transaksi (pembayaran terakhir), dijaga trigger
+# di Supabase (sql/pembayaran_status.sql). Ganti sort + groupby().last().
+STATUS_PEMBAYARAN = {
+    "pembayaran": "pembayaran_status",
+    "pembayaran_luar_kota": "pembayaran_luar_kota_status",
+}
+
+def get_status_pembayaran(table_name, columns=None, belum_lunas=False):
+    """Pembayaran terakhir per transaksi dari view status.
+
+    belum_lunas=True hanya mengambil transaksi dengan sisa > 0.
+    """
+    filters = [("gt", "sisa", 0)] if belum_lunas else None
+    return get_table_cached(STATUS_PEMBAYARAN[table_name], columns, filters)
+
+def get_pembayaran_transaksi(table_name, id_transaksi):
+    # Semua pembayaran satu transaksi, langsung dari Supabase (tanpa cache)
+    return get_table_raw(
+        table_name,
+        filters=[("eq", "id_transaksi", id_transaksi)],
+        order="pembayaran_ke",
+        parallel=False
+    )
+
+# ==============================
+# TABEL BERHALAMAN (SERVER-SIDE)
+# ==============================
+# Supabase diminta satu halaman saja (range + order + filter di server),
+# jumlah baris dari count-only query. Waktu buka halaman tidak tergantung
+# panjang tabel.
+HALAMAN_SIZE = 50
+
+def count_rows_cached(table_name, filters=None):
+    return _count_rows_cached(table_name, filters, generasi_tabel(table_name))
+
+@st.cache_data(ttl=30)
+def _count_rows_cached(table_name, filters, generasi):
+    return count_rows(table_name, filters)
+
+def get_halaman(table_name, page, page_size=None, columns=None, filters=None, order=None):
+    # page mulai dari 0
+    page_size = page_size or HALAMAN_SIZE
+    return _get_halaman(table_name, page, page_size, columns, filters, order, generasi_tabel(table_name))
+
+@st.cache_data(ttl=30)
+def _get_halaman(table_name, page, page_size, columns, filters, order, generasi):
+    return pd.DataFrame(_fetch_page(table_name, page, page_size, columns, filters, order))
+
+def pola_ilike(teks):
+    # "ab%c" -> "%ab\\%c%", dipakai untuk filter ("ilike", kolom, pola)
+    teks = str(teks).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{teks}%"
+
+def tabel_halaman(table_name, key, columns=None, filters=None, order=None,
+                  page_size=None, siapkan=None, satuan="baris",
+                  kosong="Tidak ada data ditemukan."):
+    """Tampilkan ``table_name`` per halaman dengan pilihan nomor halaman.
+
+    filters/order sama seperti get_table_cached, sebaiknya order diakhiri
+    kolom unik (mis. "timestamp_log.desc,id.desc") supaya halaman stabil.
+    siapkan(df_halaman) -> DataFrame yang ditampilkan (format kolom dsb).
+    Nomor halaman kembali ke 1 setiap filter berubah.
+    Hasil: jumlah baris yang cocok dengan filter.
+    """
+    page_size = page_size or HALAMAN_SIZE
+    filters = [tuple(f) for f in filters or []] or None
+
+    total = count_rows_cached(table_name, filters) or 0
+
+    if total == 0:
+        st.info(kosong)
+        return 0
+
+    n_pages = -(-total // page_size)
+
+    key_page = f"{key}_halaman"
+    key_filter = f"{key}_filter"
+    if st.session_state.get(key_filter) != filters:
+        st.session_state[key_filter] = filters
+        st.session_state[key_page] = 1
+    if st.session_state.get(key_page, 1) > n_pages:
+        st.session_state[key_page] = n_pages
+
+    halaman = st.number_input(
+        f"Halaman (dari {n_pages})",
+        min_value=1,
+        max_value=n_pages,
+        step=1,
+        key=key_page
+    )
+
+    df = get_halaman(table_name, halaman - 1, page_size, columns, filters, order)
+    if siapkan is not None and not df.empty:
+        df = siapkan(df)
+
+    awal = (halaman - 1) * page_size
+    st.caption(f"Menampilkan {awal + 1}–{awal + len(df)} dari {total} {satuan}")
+
+    df = df.reset_index(drop=True)
+    df.index = df.index + awal + 1
+    df.index.name = "No"
+
+    st.dataframe(df, use_container_width=True)
+    return total
+
+# Rapikan satu nilai supaya bisa dikirim sebagai JSON
+def _bersihkan_nilai(value):
+    # ✅ Convert date & datetime
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    # ✅ Convert pandas timestamp
+    elif isinstance(value, (pd.Timestamp, np.datetime64)):
+        return str(value)
+    # ✅ Convert numpy numbers
+    elif isinstance(value, (np.integer, np.int64)):
+        return int(value)
+    elif isinstance(value, (np.floating,)):
+        return float(value)
+    elif isinstance(value, str) and value == "":
+        return None
+    return value
+
+# Rapikan satu baris supaya bisa dikirim sebagai JSON
+def _bersihkan_row(data_dict):
+    return {key: _bersihkan_nilai(value) for key, value in data_dict.items()}
+
+_bersihkan_array = np.frompyfunc(_bersihkan_nilai, 1, 1)
+
+# Rapikan banyak baris sekaligus, per kolom (bukan per sel)
+# Array dtype=object supaya tipe tidak berubah (int + null tidak jadi float)
+# Kolom yang tidak ada di sebuah baris dikirim sebagai null
+def _bersihkan_rows(rows):
+    semua_kolom = list(dict.fromkeys(kolom for row in rows for kolom in row))
+    kolom_bersih = {}
+
+    for kolom in semua_kolom:
+        nilai = np.empty(len(rows), dtype=object)
+        nilai[:] = [row.get(kolom) for row in rows]
+        nilai = _bersihkan_array(nilai).astype(object)
+        # NaN / NaT / "" -> null
+        nilai[pd.isna(nilai)] = None
+        kolom_bersih[kolom] = nilai.tolist()
+
+    return [dict(zip(kolom_bersih, baris)) for baris in zip(*kolom_bersih.values())]
+
+# Tambahkan satu baris ke tabel supabase, baris hasilnya ditambal ke cache (write-through)
 def insert_row_supabase(table_name, data_dict):
     supabase = get_supabase()
-    clean_data = {}
-    for key, value in data_dict.items():
-        # ✅ Convert date & datetime
-        if isinstance(value, (date, datetime)):
-            clean_data[key] = value.isoformat()
-        # ✅ Convert pandas timestamp
-        elif isinstance(value, (pd.Timestamp, np.datetime64)):
-            clean_data[key] = str(value)
-        # ✅ Convert numpy numbers
-        elif isinstance(value, (np.integer, np.int64)):
-            clean_data[key] = int(value)
-        elif isinstance(value, (np.floating,)):
-            clean_data[key] = float(value)
-        elif value == "":
-            clean_data[key] = None
-        else:
-            clean_data[key] = value
+    clean_data = _bersihkan_row(data_dict)
     response = supabase.table(table_name).insert(clean_data).execute()
+    patch_table_cache(table_name, response.data)
     return response
 
-def get_or_create_pelanggan_id_supabase(nama, no_hp):
+# Update baris dengan kunci == nilai_kunci, hasilnya ditambal ke cache (write-through)
+def update_row_supabase(table_name, data_dict, nilai_kunci, kunci="id"):
+    supabase = get_supabase()
+    clean_data = _bersihkan_row(data_dict)
+    response = supabase.table(table_name).update(clean_data).eq(kunci, nilai_kunci).execute()
+    patch_table_cache(table_name, response.data, kunci=kunci)
+    return response
+
+INSERT_CHUNK_SIZE = 500
+
+# Tambahkan banyak baris sekaligus, dikirim per chunk (satu request per chunk)
+# on_conflict: kolom unique, baris yang bentrok dilewati (insert ... on conflict do nothing)
+# Hasil: list response, satu per chunk ([] kalau rows kosong)
+def insert_rows_supabase(table_name, rows, chunk_size=None, on_conflict=None):
+    rows = list(rows)
+    if not rows:
+        return []
+
+    chunk_size = chunk_size or INSERT_CHUNK_SIZE
     supabase = get_supabase()
+    clean_rows = _bersihkan_rows(rows)
+
+    responses = []
+    for start in range(0, len(clean_rows), chunk_size):
+        chunk = clean_rows[start:start + chunk_size]
+        if on_conflict:
+            query = supabase.table(table_name).upsert(
+                chunk, on_conflict=on_conflict, ignore_duplicates=True
+            )
+        else:
+            query = supabase.table(table_name).insert(chunk)
+        responses.append(query.execute())
+
+    patch_table_cache(table_name, [r for resp in responses for r in resp.data or []])
+    return responses
+
+# Tambah/kurang stock satu baris frames/lensa secara atomik (RPC adjust_stock, sql/stock.sql)
+# key: kolom pencari baris, mis. {"merk": ..., "kode": ...}; nilai None -> "is null"
+# Hasil: {"id", "stock_lama", "stock_baru"}, None kalau baris tidak ketemu.
+# Kalau stock jadi minus, RPC error (exception dari supabase) dan stock tidak berubah.
+def adjust_stock(table_name, key, delta):
+    response = get_supabase().rpc("adjust_stock", {
+        "p_tabel": table_name,
+        "p_key": key,
+        "p_delta": int(delta)
+    }).execute()
+    hasil = response.data[0] if response.data else None
+    if hasil:
+        patch_table_cache(table_name, [{"id": hasil["id"], "stock": hasil["stock_baru"]}])
+    return hasil
+
+# Error dari adjust_stock/adjust_stock_batch karena stock tidak cukup
+# (raise ... using errcode = 'check_violation' di sql/stock.sql)
+ERRCODE_STOCK_KURANG = "23514"
+
+def stock_tidak_cukup(error):
+    return getattr(error, "code", None) == ERRCODE_STOCK_KURANG
+
+# Ubah stock banyak baris frames/lensa dalam satu RPC (sql/stock.sql)
+# items: [{"tabel": "frames", "key": {"merk": ..., "kode": ...}, "delta": -1}, ...]
+# Hasil: list of {"urutan", "tabel", "id", "stock_lama", "stock_baru"}, urutan mulai 1
+# Satu item yang stock-nya tidak cukup membatalkan semua item (exception).
+def adjust_stock_batch(items):
+    if not items:
+        return []
+    response = get_supabase().rpc("adjust_stock_batch", {"p_items": items}).execute()
+    hasil = response.data or []
+
+    per_tabel = {}
+    for h in hasil:
+        per_tabel.setdefault(h["tabel"], []).append({"id": h["id"], "stock": h["stock_baru"]})
+    for table_name, rows in per_tabel.items():
+        patch_table_cache(table_name, rows)
+    return hasil
 
+def get_or_create_pelanggan_id_supabase(nama, no_hp):
     # ==============================
     # Normalisasi input
     # ==============================
@@ -121,78 +1215,72 @@ def get_or_create_pelanggan_id_supabase(nama, no_hp):
     if not no_hp_clean:
         raise ValueError("No HP tidak boleh kosong")
 
-    # ==============================
-    # 1️⃣ Cek EXACT MATCH nama + no_hp
-    # ==============================
-    existing = supabase.table("pelanggan") \
-        .select("id_pelanggan") \
-        .eq("nama", nama_clean) \
-        .eq("no_hp", no_hp_clean) \
-        .execute()
+    return _resolve_pelanggan(nama_clean, no_hp_clean, generasi_tabel("pelanggan"))
+
+# Pelanggan yang baru di-resolve disimpan di cache, pelanggan yang datang lagi
+# tidak perlu ke database. generasi (termasuk stamp cache bersama) ikut key:
+# edit pelanggan di proses lain langsung berlaku kalau cache bersama dipakai,
+# tanpa cache bersama paling lambat setelah TTL
+@st.cache_data(ttl=300, max_entries=1024)
+def _resolve_pelanggan(nama_clean, no_hp_clean, generasi):
+    # RPC get_or_create_pelanggan (sql/pelanggan.sql): cari by (nama, no_hp),
+    # kalau belum ada insert dengan ID baru dari counter "OM"
+    response = get_supabase().rpc("get_or_create_pelanggan", {
+        "p_nama": nama_clean,
+        "p_no_hp": no_hp_clean
+    }).execute()
 
-    if existing.data:
-        return existing.data[0]["id_pelanggan"]
+    if response.data:
+        return response.data
+    else:
+        raise Exception("Gagal insert pelanggan ke Supabase")
 
-    # ==============================
-    # 2️⃣ Generate ID baru
-    # ==============================
-    response_all = supabase.table("pelanggan") \
-        .select("id_pelanggan") \
-        .execute()
+def clear_pelanggan_cache():
+    # Panggil setelah data pelanggan diubah (mis. ganti no HP); proses lain
+    # ikut lewat generasi_tabel("pelanggan"), ini membuang entri lama di proses ini
+    _resolve_pelanggan.clear()
 
-    existing_ids = [
-        row["id_pelanggan"]
-        for row in response_all.data
-        if row.get("id_pelanggan", "").startswith("OM")
-    ]
+# ==============================
+# SEQUENCE ALLOCATOR
+# ==============================
+# Keluarga ID -> nama counter di tabel sequence_counter (sql/sequence.sql)
+SEQ_TRANSAKSI = "OM/T"
+SEQ_PEMBAYARAN = "OM/P"
+SEQ_SKW = "OMSKW"
+SEQ_PEMB_SKW = "OMSKW/P"
 
-    nomor_list = []
-    for pid in existing_ids:
-        try:
-            nomor = int(pid.replace("OM", ""))
-            nomor_list.append(nomor)
-        except:
-            continue
+class SupabaseSequence:
+    """Nomor urut lewat RPC next_sequence, satu panggilan dan atomic di Postgres."""
 
-    urutan = max(nomor_list) + 1 if nomor_list else 1
-    id_baru = f"OM{urutan:03d}"
+    def next(self, nama):
+        response = get_supabase().rpc("next_sequence", {"p_nama": nama}).execute()
+        return int(response.data)
 
-    # ==============================
-    # 3️⃣ Insert pelanggan baru
-    # ==============================
-    insert_result = supabase.table("pelanggan").insert({
-        "id_pelanggan": id_baru,
-        "nama": nama_clean,
-        "no_hp": no_hp_clean
-    }).execute()
+class LocalSequence:
+    """Pengganti lokal untuk test: counter di memori, aman dipakai banyak thread."""
 
-    if insert_result.data:
-        return id_baru
-    else:
-        raise Exception("Gagal insert pelanggan ke Supabase")
-    
-# Buat id transaksi
-def generate_id_transaksi_supabase(tanggal_transaksi):
-    supabase = get_supabase()
+    def __init__(self, start=None):
+        self._lock = threading.Lock()
+        self._nilai = dict(start or {})
 
-    # Ambil semua id_transaksi
-    response = supabase.table("transaksi") \
-        .select("id_transaksi") \
-        .execute()
+    def next(self, nama):
+        with self._lock:
+            self._nilai[nama] = self._nilai.get(nama, 0) + 1
+            return self._nilai[nama]
 
-    existing_ids = [row["id_transaksi"] for row in response.data if row.get("id_transaksi")]
+_sequence_backend = SupabaseSequence()
 
-    nomor_list = []
+def set_sequence_backend(backend):
+    global _sequence_backend
+    _sequence_backend = backend
 
-    for tid in existing_ids:
-        try:
-            # Format: OM/T/001/10-05/2025
-            nomor = int(tid.split("/")[2])
-            nomor_list.append(nomor)
-        except:
-            continue
+def next_sequence(nama):
+    return _sequence_backend.next(nama)
 
-    urutan = max(nomor_list) + 1 if nomor_list else 1
+# Buat id transaksi
+def generate_id_transaksi_supabase(tanggal_transaksi):
+    # Format: OM/T/001/10-05/2025
+    urutan = next_sequence(SEQ_TRANSAKSI)
 
     hari_bulan = tanggal_transaksi.strftime("%d-%m")
     tahun = tanggal_transaksi.strftime("%Y")
@@ -201,59 +1289,17 @@ def generate_id_transaksi_supabase(tanggal_transaksi):
 
 # Buat id transaksi pesanan luar kota
 def generate_id_skw_supabase(nama, tanggal_ambil):
-
-    supabase = get_supabase()
-
     kode = "01" if nama == "Nelly" else "02"
     tanggal_str = pd.to_datetime(tanggal_ambil).strftime("%d-%m-%Y")
 
-    # Ambil semua id_transaksi yang valid
-    response = supabase.table("pesanan_luar_kota") \
-        .select("id_transaksi") \
-        .execute()
-
-    data = response.data
-
-    if not data:
-        next_num = 1
-    else:
-        df = pd.DataFrame(data)
-
-        df = df[df["id_transaksi"].str.contains(r"OMSKW/\d+/\d+/")]
-
-        if df.empty:
-            next_num = 1
-        else:
-            df["urutan"] = df["id_transaksi"] \
-                .str.extract(r"OMSKW/\d+/(\d+)/")[0] \
-                .astype(int)
-
-            next_num = df["urutan"].max() + 1
+    next_num = next_sequence(SEQ_SKW)
 
     return f"OMSKW/{kode}/{next_num:03}/{tanggal_str}"
 
 # Buat id pembayaran
 def generate_id_pembayaran_supabase(tanggal_pembayaran):
-    supabase = get_supabase()
-
-    response = supabase.table("pembayaran") \
-        .select("id_pembayaran") \
-        .execute()
-
-    existing_ids = [row["id_pembayaran"] for row in response.data if row.get("id_pembayaran")]
-
-    nomor_list = []
-
-    for pid in existing_ids:
-        try:
-            # Format: OM/P/001/10-05/2025
-            if pid.startswith("OM/P/"):
-                nomor = int(pid.split("/")[2])
-                nomor_list.append(nomor)
-        except:
-            continue
-
-    urutan = max(nomor_list) + 1 if nomor_list else 1
+    # Format: OM/P/001/10-05/2025
+    urutan = next_sequence(SEQ_PEMBAYARAN)
 
     hari_bulan = tanggal_pembayaran.strftime("%d-%m")
     tahun = tanggal_pembayaran.strftime("%Y")
@@ -262,40 +1308,278 @@ def generate_id_pembayaran_supabase(tanggal_pembayaran):
 
 # Buat id pembayaran pesanan luar kota
 def generate_id_pemb_skw_supabase(nama, tanggal_ambil):
-
-    supabase = get_supabase()
-
     kode = "01" if nama == "Nelly" else "02"
     tanggal_str = pd.to_datetime(tanggal_ambil).strftime("%d-%m-%Y")
 
-    response = supabase.table("pembayaran_luar_kota") \
-        .select("id_pembayaran") \
-        .execute()
+    next_num = next_sequence(SEQ_PEMB_SKW)
 
-    data = response.data
+    return f"OMSKW/P/{kode}/{next_num:03}/{tanggal_str}"
 
-    if not data:
-        next_num = 1
+# ==============================
+# CASCADE PILIHAN (SELECTBOX BERTINGKAT)
+# ==============================
+# Node: {"opsi": tuple terurut nilai kolom ini, "anak": {nilai: node kolom berikutnya}}
+# Nilai kosong (NaN/None) tidak masuk, sama seperti sorted(df[...].dropna().unique())
+def _bangun_cascade(df, kolom):
+    pertama, sisa = kolom[0], kolom[1:]
+    node = {"opsi": tuple(sorted(df[pertama].dropna().unique())), "anak": {}}
+
+    if sisa:
+        for nilai, grup in df.groupby(pertama, observed=True, sort=False):
+            node["anak"][nilai] = _bangun_cascade(grup, sisa)
+
+    return node
+
+@st.cache_resource(max_entries=8)
+def _cascade_cached(versi, jumlah_baris, kolom, _df):
+    return _bangun_cascade(_df, kolom)
+
+def get_cascade(df, kolom):
+    """Index pilihan bertingkat dari ``df`` untuk urutan ``kolom``,
+    contoh ["merk", "kode"]. Dibangun sekali per versi data (df.attrs["versi"]);
+    kirim tabel utuh, bukan hasil filter.
+    """
+    kolom = tuple(kolom)
+    versi = df.attrs.get("versi")
+    if versi is None:
+        return _bangun_cascade(df, kolom)
+    return _cascade_cached(versi, len(df), kolom, df)
+
+def cascade_opsi(cascade, *pilihan):
+    # Pilihan untuk tingkat berikutnya setelah ``pilihan``; () kalau tidak ada
+    node = cascade
+    for nilai in pilihan:
+        node = node["anak"].get(nilai)
+        if node is None:
+            return ()
+    return node["opsi"]
+
+# ==============================
+# RINGKASAN ITEM PER TRANSAKSI
+# ==============================
+# {id_transaksi: "a | b | c, a | b | c"}, urutan item sama dengan urutan baris.
+# Nilai kosong jadi "-".
+def _bangun_ringkasan_item(df, kolom):
+    if df.empty:
+        return {}
+
+    teks = df[kolom[0]].fillna("-").astype(str)
+    for k in kolom[1:]:
+        teks = teks + " | " + df[k].fillna("-").astype(str)
+
+    return teks.groupby(df["id_transaksi"], sort=False).agg(", ".join).to_dict()
+
+@st.cache_resource(max_entries=4)
+def _ringkasan_item_cached(versi, jumlah_baris, kolom, _df):
+    return _bangun_ringkasan_item(_df, kolom)
+
+def get_ringkasan_item(df, kolom):
+    """Teks item per id_transaksi dari tabel detail ``df`` untuk ``kolom``,
+    contoh ["merk_frame", "merk_lensa", "jenis_lensa"]. Satu groupby per
+    versi data (df.attrs["versi"]); kirim tabel utuh, bukan hasil filter.
+    """
+    kolom = tuple(kolom)
+    versi = df.attrs.get("versi")
+    if versi is None:
+        return _bangun_ringkasan_item(df, kolom)
+    return _ringkasan_item_cached(versi, len(df), kolom, df)
+
+# ==============================
+# INDEX PENCARIAN (SEARCH-AS-YOU-TYPE)
+# ==============================
+# Per kolom: nilai unik (lowercase) + kode nilai per baris, dan trigram ->
+# id nilai unik. Kata kunci >= 3 huruf cukup cek kandidat dari irisan trigram,
+# yang lebih pendek cek semua nilai unik (jauh lebih sedikit dari jumlah baris).
+# Cocok = substring, tidak peka huruf besar/kecil, nilai kosong tidak pernah cocok.
+PANJANG_GRAM = 3
+
+def _bangun_index_kolom(seri):
+    kode, unik = pd.factorize(seri, use_na_sentinel=True)
+    teks = [str(v).lower() for v in unik]
+
+    gram = {}
+    for i, t in enumerate(teks):
+        for g in {t[j:j + PANJANG_GRAM] for j in range(len(t) - PANJANG_GRAM + 1)}:
+            gram.setdefault(g, []).append(i)
+
+    return {
+        "kode": kode,
+        "teks": teks,
+        "gram": {g: np.array(ids, dtype=np.int64) for g, ids in gram.items()},
+    }
+
+def _bangun_index_cari(df, kolom):
+    return {
+        "jumlah_baris": len(df),
+        "kolom": {k: _bangun_index_kolom(df[k]) for k in kolom},
+    }
+
+@st.cache_resource(max_entries=8)
+def _index_cari_cached(versi, jumlah_baris, kolom, _df):
+    return _bangun_index_cari(_df, kolom)
+
+def get_index_cari(df, kolom):
+    """Index pencarian untuk ``kolom`` dari ``df``, contoh ["nama", "no_hp"].
+    Dibangun sekali per versi data (df.attrs["versi"]); kirim tabel utuh,
+    bukan hasil filter/sort, karena hasil cari berupa posisi baris.
+    """
+    kolom = tuple(kolom)
+    versi = df.attrs.get("versi")
+    if versi is None:
+        return _bangun_index_cari(df, kolom)
+    return _index_cari_cached(versi, len(df), kolom, df)
+
+def _cari_di_kolom(idx, kueri):
+    if len(kueri) >= PANJANG_GRAM:
+        grams = {kueri[j:j + PANJANG_GRAM] for j in range(len(kueri) - PANJANG_GRAM + 1)}
+        postings = [idx["gram"].get(g) for g in grams]
+        if any(p is None for p in postings):
+            return np.zeros(len(idx["kode"]), dtype=bool)
+
+        postings.sort(key=len)
+        kandidat = postings[0]
+        for p in postings[1:]:
+            kandidat = np.intersect1d(kandidat, p, assume_unique=True)
     else:
-        df = pd.DataFrame(data)
+        kandidat = range(len(idx["teks"]))
+
+    teks = idx["teks"]
+    cocok_unik = np.zeros(len(teks) + 1, dtype=bool)
+    cocok_unik[[i for i in kandidat if kueri in teks[i]]] = True
+
+    # kode -1 (nilai kosong) menunjuk slot terakhir yang selalu False
+    return cocok_unik[idx["kode"]]
+
+def cari_posisi(df, kueri, kolom):
+    """Posisi baris ``df`` (urut naik) yang salah satu ``kolom``-nya memuat
+    ``kueri``, tanpa membedakan huruf besar/kecil. Pengganti
+    ``df[k].str.contains(kueri, case=False, na=False)``, tapi kueri dibaca
+    apa adanya (bukan regex). Kueri kosong = semua baris.
+    Pakai hasilnya dengan ``df.iloc[posisi]``.
+    """
+    index = get_index_cari(df, kolom)
+    kueri = str(kueri).lower()
+
+    if not kueri:
+        return np.arange(index["jumlah_baris"])
+
+    cocok = np.zeros(index["jumlah_baris"], dtype=bool)
+    for k in kolom:
+        cocok |= _cari_di_kolom(index["kolom"][k], kueri)
+
+    return np.flatnonzero(cocok)
+
+# ==============================
+# KATALOG LENSA STOCK
+# ==============================
+# Sama dengan format_2digit per baris di halaman, tapi sekaligus satu kolom:
+# angka -> "0.00", None -> "", NaN -> "nan", teks lain -> di-strip
+def format_2digit_series(seri):
+    asli = seri.to_numpy(dtype=object)
+    angka = pd.to_numeric(seri, errors="coerce").to_numpy(dtype=float)
+
+    hasil = np.char.mod("%.2f", angka).astype(object)
+
+    bukan_angka = np.isnan(angka)
+    if bukan_angka.any():
+        kosong = np.equal(asli, None)
+        hasil[bukan_angka & kosong] = ""
+        hasil[bukan_angka & ~kosong & pd.isna(asli)] = "nan"
+        teks = bukan_angka & ~pd.isna(asli)
+        hasil[teks] = [str(v).strip() for v in asli[teks]]
+
+    return pd.Series(hasil, index=seri.index, dtype=object)
+
+def _bangun_lensa_catalog(df_raw):
+    df = df_raw.copy()
+    df.columns = df.columns.str.lower()
+
+    for col in ['sph', 'cyl', 'add_power']:
+        df[col] = format_2digit_series(df[col])
+    for col in ['jenis', 'tipe', 'merk']:
+        df[col] = df[col].astype(str).str.strip().astype("category")
+
+    # Versi sendiri supaya index harga tidak tertukar dengan tabel mentah
+    df.attrs["versi"] = ("katalog", df_raw.attrs.get("versi"))
+
+    def urut(seri):
+        return sorted(seri.dropna().unique())
+
+    return {
+        "df": df,
+        "cascade": _bangun_cascade(df, ('tipe', 'merk', 'jenis')),
+        "sph": urut(df['sph']),
+        "cyl": urut(df['cyl']),
+        "add_power": urut(df['add_power']),
+    }
+
+@st.cache_resource(max_entries=2)
+def _lensa_catalog_cached(versi, jumlah_baris, _df_raw):
+    return _bangun_lensa_catalog(_df_raw)
+
+def get_lensa_catalog():
+    """Katalog lensa stock yang sudah dinormalisasi, satu per versi data.
+
+    Isi: ``df`` (sph/cyl/add_power format "0.00", tipe/jenis/merk categorical),
+    ``cascade`` (tipe -> merk -> jenis, baca dengan cascade_opsi),
+    ``sph`` / ``cyl`` / ``add_power`` (list). Dipakai bersama semua halaman,
+    jangan diubah.
+    """
+    df_raw = get_table_cached("lensa")
+    versi = df_raw.attrs.get("versi")
+    if versi is None:
+        return _bangun_lensa_catalog(df_raw)
+    return _lensa_catalog_cached(versi, len(df_raw), df_raw)
+
+# ==============================
+# INDEX HARGA LENSA STOCK
+# ==============================
+# (tipe, jenis, merk, sph, cyl, add) -> posisi baris pertama yang cocok,
+# dibangun sekali per versi data (df.attrs["versi"] dari get_table_cached)
+def _bangun_index_harga_lensa(df_stock):
+    df = df_stock.copy(deep=False)
+    df.columns = df.columns.str.lower().str.strip().str.replace(" ", "_")
 
-        df = df[df["id_pembayaran"].str.contains(r"OMSKW/P/\d+/\d+/")]
+    tipe = df['tipe'].str.lower()
+    jenis = df['jenis'].str.lower()
+    merk = df['merk'].str.lower()
+    sph = pd.to_numeric(df['sph'], errors='coerce').round(2)
+    cyl = pd.to_numeric(df['cyl'], errors='coerce').round(2)
+    add = pd.to_numeric(df['add_power'], errors='coerce').round(2)
 
-        if df.empty:
-            next_num = 1
-        else:
-            df["urutan"] = df["id_pembayaran"] \
-                .str.extract(r"OMSKW/P/\d+/(\d+)/")[0] \
-                .astype(int)
+    valid = (tipe.notna() & jenis.notna() & merk.notna() & sph.notna() & cyl.notna()).to_numpy()
 
-            next_num = df["urutan"].max() + 1
+    index = {}
+    for posisi, t, j, m, s, c, a in zip(
+        range(len(df)), tipe, jenis, merk, sph, cyl, add
+    ):
+        if not valid[posisi]:
+            continue
+        # add kosong/bukan angka -> None, sama seperti filter isna() sebelumnya
+        key = (t, j, m, s, c, None if pd.isna(a) else a)
+        index.setdefault(key, posisi)
 
-    return f"OMSKW/P/{kode}/{next_num:03}/{tanggal_str}"
+    harga = {
+        kolom: df[kolom].to_numpy(dtype=object)
+        for kolom in ['harga_jual', 'harga_reseller']
+        if kolom in df.columns
+    }
+
+    return {"index": index, "harga": harga}
+
+@st.cache_resource(max_entries=4)
+def _index_harga_lensa_cached(versi, jumlah_baris, _df_stock):
+    return _bangun_index_harga_lensa(_df_stock)
+
+# Kirim tabel lensa utuh (bukan hasil filter) supaya cache per versi tetap benar
+def index_harga_lensa(df_stock):
+    versi = df_stock.attrs.get("versi")
+    if versi is None:
+        return _bangun_index_harga_lensa(df_stock)
+    return _index_harga_lensa_cached(versi, len(df_stock), df_stock)
 
 # Cari harga lensa stock
 def cari_harga_lensa_stock(df_stock, tipe, jenis, merk, sph, cyl, add, pakai_reseller=True):
-    df = df_stock.copy()
-    df.columns = df.columns.str.lower().str.strip().str.replace(" ", "_")
     kolom_harga = 'harga_reseller' if pakai_reseller else 'harga_jual'
 
     try:
@@ -305,33 +1589,89 @@ def cari_harga_lensa_stock(df_stock, tipe, jenis, merk, sph, cyl, add, pakai_res
     except:
         return None
 
-    # Convert kolom ke numeric dulu
-    df['sph'] = pd.to_numeric(df['sph'], errors='coerce')
-    df['cyl'] = pd.to_numeric(df['cyl'], errors='coerce')
-    df['add_power'] = pd.to_numeric(df['add_power'], errors='coerce')
-
-    df_filtered = df[
-        (df['tipe'].str.lower() == tipe.lower()) &
-        (df['jenis'].str.lower() == jenis.lower()) &
-        (df['merk'].str.lower() == merk.lower()) &
-        (df['sph'].round(2) == sph) &
-        (df['cyl'].round(2) == cyl)
-    ]
-
-    if add is not None:
-        df_filtered = df_filtered[df_filtered['add_power'].round(2) == add]
-    else:
-        df_filtered = df_filtered[df_filtered['add_power'].isna()]
+    index_harga = index_harga_lensa(df_stock)
+    posisi = index_harga["index"].get(
+        (tipe.lower(), jenis.lower(), merk.lower(), sph, cyl, add)
+    )
 
-    if df_filtered.empty:
+    if posisi is None:
         return None
 
-    return int(float(df_filtered.iloc[0][kolom_harga]))
+    return int(float(index_harga["harga"][kolom_harga][posisi]))
+
+# ==============================
+# INDEX HARGA LENSA LUAR
+# ==============================
+# Per (tipe, jenis, nama_lensa): titik-titik batas sph yang terurut, dan untuk tiap
+# potongan sph daftar baris yang mencakupnya, sudah urut paling spesifik dulu
+# (ada rentang cyl = +2, ada rentang add = +1; seri -> urutan baris di tabel).
+# Potongan genap = tepat di titik batas, potongan ganjil = di antara dua titik.
+def _bangun_index_harga_lensa_luar(df_luar):
+    df = df_luar.copy(deep=False)
+    df.columns = df.columns.str.lower().str.strip()
+
+    kolom_angka = ["sph_min", "sph_max", "cyl_min", "cyl_max", "add_min_power", "add_max_power"]
+    angka = {
+        kolom: [None if pd.isna(v) else float(v) for v in df[kolom]]
+        for kolom in kolom_angka
+    }
+    status = df["status"].tolist() if "status" in df.columns else [None] * len(df)
+
+    grup = {}
+    for posisi, key in enumerate(zip(
+        df["tipe"].str.lower(), df["jenis"].str.lower(), df["nama_lensa"].str.lower()
+    )):
+        if any(pd.isna(k) for k in key):
+            continue
+        if angka["sph_min"][posisi] is None or angka["sph_max"][posisi] is None:
+            continue
+        grup.setdefault(key, []).append(posisi)
+
+    index = {}
+    for key, baris in grup.items():
+        prioritas = {
+            p: (angka["cyl_min"][p] is not None) * 2 + (angka["add_min_power"][p] is not None)
+            for p in baris
+        }
+        # sorted() stabil: prioritas sama -> urutan baris di tabel
+        baris = sorted(baris, key=lambda p: -prioritas[p])
+
+        titik = sorted({angka["sph_min"][p] for p in baris} | {angka["sph_max"][p] for p in baris})
+        potongan = []
+        for i, t in enumerate(titik):
+            potongan.append([
+                p for p in baris
+                if angka["sph_min"][p] <= t <= angka["sph_max"][p]
+            ])
+            if i + 1 < len(titik):
+                potongan.append([
+                    p for p in baris
+                    if angka["sph_min"][p] <= t and angka["sph_max"][p] >= titik[i + 1]
+                ])
+
+        index[key] = {"titik": titik, "potongan": potongan}
+
+    harga = {
+        kolom: df[kolom].to_numpy(dtype=object)
+        for kolom in ["harga_jual", "harga_reseller"]
+        if kolom in df.columns
+    }
+
+    return {"index": index, "angka": angka, "status": status, "harga": harga}
+
+@st.cache_resource(max_entries=4)
+def _index_harga_lensa_luar_cached(versi, jumlah_baris, _df_luar):
+    return _bangun_index_harga_lensa_luar(_df_luar)
+
+# Kirim tabel lensa_luar_stock utuh, filter status lewat parameter status
+def index_harga_lensa_luar(df_luar):
+    versi = df_luar.attrs.get("versi")
+    if versi is None:
+        return _bangun_index_harga_lensa_luar(df_luar)
+    return _index_harga_lensa_luar_cached(versi, len(df_luar), df_luar)
 
 # Cari Harga Lensa Luar Stock
-def cari_harga_lensa_luar(df, tipe, jenis, nama_lensa, sph, cyl, add, pakai_reseller=True):
-    df = df.copy()
-    df.columns = df.columns.str.lower().str.strip()
+def cari_harga_lensa_luar(df, tipe, jenis, nama_lensa, sph, cyl, add, pakai_reseller=True, status=None):
     kolom_harga = "harga_reseller" if pakai_reseller else "harga_jual"
 
     try:
@@ -341,54 +1681,77 @@ def cari_harga_lensa_luar(df, tipe, jenis, nama_lensa, sph, cyl, add, pakai_rese
     except:
         return None
 
-    # Filter awal
-    df = df[
-        (df["tipe"].str.lower() == tipe.lower()) &
-        (df["jenis"].str.lower() == jenis.lower()) &
-        (df["nama_lensa"].str.lower() == nama_lensa.lower())
-    ]
+    index_harga = index_harga_lensa_luar(df)
+    grup = index_harga["index"].get((tipe.lower(), jenis.lower(), nama_lensa.lower()))
 
-    if df.empty:
+    if grup is None:
         return None
 
-    # =========================================
-    # FILTER NUMERIC (NO LOOP 🔥)
-    # =========================================
-
-    query = (
-        (df["sph_min"] <= sph) &
-        (df["sph_max"] >= sph)
-    )
+    # Cari potongan sph (binary search)
+    titik = grup["titik"]
+    i = bisect_left(titik, sph)
+    if i < len(titik) and titik[i] == sph:
+        kandidat = grup["potongan"][2 * i]
+    elif 0 < i < len(titik):
+        kandidat = grup["potongan"][2 * i - 1]
+    else:
+        return None
 
-    # CYL optional
-    query &= (
-        df["cyl_min"].isna() |
-        ((df["cyl_min"] <= cyl) & (df["cyl_max"] >= cyl))
-    )
+    angka = index_harga["angka"]
 
-    # ADD optional
-    if add is not None:
-        query &= (
-            df["add_min_power"].isna() |
-            ((df["add_min_power"] <= add) & (df["add_max_power"] >= add))
-        )
-    else:
-        query &= df["add_min_power"].isna()
+    for p in kandidat:
+        if status is not None and index_harga["status"][p] != status:
+            continue
 
-    df_filtered = df[query]
+        # CYL optional
+        cyl_min, cyl_max = angka["cyl_min"][p], angka["cyl_max"][p]
+        if cyl_min is not None and not (cyl_max is not None and cyl_min <= cyl <= cyl_max):
+            continue
 
-    if df_filtered.empty:
-        return None
+        # ADD optional
+        add_min, add_max = angka["add_min_power"][p], angka["add_max_power"][p]
+        if add is None:
+            if add_min is not None:
+                continue
+        elif add_min is not None and not (add_max is not None and add_min <= add <= add_max):
+            continue
 
-    # Ambil prioritas terbaik (opsional tapi bagus)
-    df_filtered["prioritas"] = (
-        df_filtered["cyl_min"].notna().astype(int) * 2 +
-        df_filtered["add_min_power"].notna().astype(int)
+        return int(index_harga["harga"][kolom_harga][p])
+
+    return None
+
+# Nilai kolom status di log_frames/log_lensa (buat_*_status di bawah,
+# manajemen_stock, revisi di logtransaksi)
+STATUS_LOG = ["masuk", "terjual", "revisi", "retur", "koreksi", "rusak", "pengganti", "tukar"]
+
+# ==============================
+# PILIHAN FILTER HALAMAN LOG
+# ==============================
+# Kombinasi unik kolom filter yang pernah tercatat di tabel log, dijaga
+# inkremental lewat get_rollup (delta sync hanya membawa baris log baru).
+# Termasuk merk/kode yang sudah diganti atau dihapus dari tabel master.
+def _kombinasi_log(df):
+    return df.drop(columns=["id"]).drop_duplicates(ignore_index=True)
+
+def _gabung_kombinasi_log(lama, baru):
+    return pd.concat([lama, baru], ignore_index=True).drop_duplicates(ignore_index=True)
+
+def get_opsi_log(table_name, kolom):
+    """Kombinasi unik ``kolom`` di ``table_name`` (log_frames/log_lensa),
+    contoh ["merk", "kode", "status"]. DataFrame kosong kalau gagal diambil.
+    """
+    kolom = list(kolom)
+    df = get_rollup(
+        f"opsi_{table_name}_{'_'.join(kolom)}", table_name, ["id"] + kolom,
+        _kombinasi_log, _gabung_kombinasi_log
     )
+    if df is None:
+        return pd.DataFrame(columns=kolom)
+    return df
 
-    df_filtered = df_filtered.sort_values("prioritas", ascending=False)
-
-    return int(df_filtered.iloc[0][kolom_harga])
+def opsi_status_log(df_opsi):
+    # STATUS_LOG + status lain yang ada di log (data lama / penulis lain)
+    return sorted(set(STATUS_LOG) | set(df_opsi["status"].dropna()))
 
 # Buat status log untuk frame
 def buat_logframe_status(source: str, mode=None, status_frame=None, merk=None, kode=None, jumlah_input=None, stock_lama=None, stock_baru=None, id_transaksi=None, nama=None):
@@ -417,8 +1780,52 @@ def buat_loglensa_status(source: str, mode=None, status_lensa=None, jenis=None,
         if status_lensa == 'Stock':
             return 'terjual', f'terjual dalam transaksi: {id_transaksi}, Nama: {nama}'
 
-# Catat Log Frame
-def catat_logframe_supabase(
+# ==============================
+# IDEMPOTENCY KEY LOG (sql/log.sql)
+# ==============================
+LOG_KEY = "idempotency_key"
+LOG_WINDOW_MENIT = 5
+
+def buat_idempotency_key_log(source, sku, timestamp, id_transaksi=None, keterangan=None):
+    sku = "|".join("" if v is None else str(v) for v in sku)
+
+    # Penjualan: satu log per SKU per transaksi
+    if source in ["kasir", "luarkota"] and id_transaksi:
+        return f"{source}:{id_transaksi}:{sku}"
+
+    # Input stock lensa: log yang sama dalam blok 5 menit dianggap dobel klik.
+    # Blok sebelumnya dicek terpisah (log_ilensa_dobel), jadi tetap jendela 5 menit
+    # ke belakang seperti select-before-insert sebelumnya
+    if source == "ilensa":
+        blok = int(timestamp.timestamp() // (LOG_WINDOW_MENIT * 60))
+        return f"ilensa:{blok}:{sku}:{keterangan}"
+
+    return None
+
+def log_ilensa_dobel(table_name, row_log):
+    # True kalau log sama (key blok sebelumnya) tercatat < LOG_WINDOW_MENIT menit
+    # sebelum row_log. Bentrok di blok yang sama sudah ditangani unique index.
+    _, blok, sisa = row_log[LOG_KEY].split(":", 2)
+    response = (
+        get_supabase()
+        .table(table_name)
+        .select("timestamp_log")
+        .eq(LOG_KEY, f"ilensa:{int(blok) - 1}:{sisa}")
+        .limit(1)
+        .execute()
+    )
+    if not response.data:
+        return False
+
+    waktu_lalu = pd.to_datetime(response.data[0]["timestamp_log"], errors="coerce")
+    if pd.isna(waktu_lalu):
+        return False
+
+    waktu = pd.Timestamp(row_log["timestamp_log"])
+    return waktu - waktu_lalu.tz_localize(None) <= pd.Timedelta(minutes=LOG_WINDOW_MENIT)
+
+# Susun baris log_frames, None kalau tidak perlu dicatat
+def buat_row_logframe(
     merk,
     kode,
     source,
@@ -446,46 +1853,56 @@ def catat_logframe_supabase(
     )
 
     if not status_log or not keterangan:
-        return
-
-    supabase = get_supabase()
+        return None
 
     timestamp = datetime.now(ZoneInfo("Asia/Jakarta"))
-    timestamp_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-    # ==============================
-    # CEK DUPLICATE FRAME LOG DI SUPABASE
-    # ==============================
 
-    response = supabase.table("log_frames") \
-        .select("*") \
-        .eq("merk", merk) \
-        .eq("kode", kode) \
-        .execute()
-
-    df_log = pd.DataFrame(response.data)
+    return {
+        "timestamp_log": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "merk": merk,
+        "kode": kode,
+        "status": status_log,
+        "keterangan": keterangan,
+        "user_name": user,
+        LOG_KEY: buat_idempotency_key_log(
+            source, (merk, kode), timestamp, id_transaksi, keterangan
+        )
+    }
 
-    duplicate = False
+# Catat Log Frame
+def catat_logframe_supabase(
+    merk,
+    kode,
+    source,
+    mode=None,
+    status_frame=None,
+    jumlah_input=None,
+    stock_lama=None,
+    stock_baru=None,
+    id_transaksi=None,
+    nama=None,
+    user="Unknown"
+):
 
-    if not df_log.empty:
-        if source == "kasir" and id_transaksi:
-            duplicate = df_log["keterangan"].str.contains(
-                id_transaksi, na=False
-            ).any()
+    row_log = buat_row_logframe(
+        merk,
+        kode,
+        source,
+        mode=mode,
+        status_frame=status_frame,
+        jumlah_input=jumlah_input,
+        stock_lama=stock_lama,
+        stock_baru=stock_baru,
+        id_transaksi=id_transaksi,
+        nama=nama,
+        user=user
+    )
 
-    # ==============================
-    # INSERT JIKA TIDAK DUPLICATE
-    # ==============================
+    if row_log is None:
+        return
 
-    if not duplicate:
-        supabase.table("log_frames").insert({
-            "timestamp_log": timestamp_str,
-            "merk": merk,
-            "kode": kode,
-            "status": status_log,
-            "keterangan": keterangan,
-            "user_name": user
-        }).execute()
+    # Log yang sudah ada (idempotency_key sama) dilewati di database
+    insert_rows_supabase("log_frames", [row_log], on_conflict=LOG_KEY)
             
 # Catat Log Lensa
 def buat_loglensa_status(
@@ -513,7 +1930,8 @@ def buat_loglensa_status(
 
     return None, None
 
-def catat_loglensa_supabase(
+# Susun baris log_lensa, None kalau tidak perlu dicatat
+def buat_row_loglensa(
     jenis,
     tipe,
     merk,
@@ -549,68 +1967,67 @@ def catat_loglensa_supabase(
     )
 
     if not status_log or not keterangan:
-        return
+        return None
 
-    supabase = get_supabase()
     timestamp = datetime.now(ZoneInfo("Asia/Jakarta"))
-    five_min_ago = timestamp - timedelta(minutes=5)
-
-    # ==============================
-    # CEK DUPLICATE
-    # ==============================
-
-    response = supabase.table("log_lensa") \
-        .select("*") \
-        .eq("merk", merk) \
-        .eq("jenis", jenis) \
-        .eq("tipe", tipe) \
-        .eq("sph", str(sph)) \
-        .eq("cyl", str(cyl)) \
-        .eq("add_power", str(add_power)) \
-        .execute()
-
-    df_log = pd.DataFrame(response.data)
-    duplicate = False
-
-    if not df_log.empty:
-
-        # Duplicate untuk kasir / luarkota
-        if source in ["kasir", "luarkota"] and id_transaksi:
-            duplicate = df_log["keterangan"].str.contains(
-                id_transaksi, na=False
-            ).any()
-
-        # Duplicate untuk ilensa (5 menit)
-        elif source == "ilensa":
 
-            df_log["timestamp_log"] = pd.to_datetime(
-                df_log["timestamp_log"], errors="coerce"
-            ).dt.tz_localize(None)  # strip timezone supaya bisa dibanding
+    return {
+        "timestamp_log": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "tipe": tipe,
+        "merk": merk,
+        "jenis": jenis,
+        "sph": str(sph),
+        "cyl": str(cyl),
+        "add_power": str(add_power),
+        "status": status_log,
+        "keterangan": keterangan,
+        "user_name": user,
+        LOG_KEY: buat_idempotency_key_log(
+            source, (tipe, jenis, merk, sph, cyl, add_power), timestamp, id_transaksi, keterangan
+        )
+    }
 
-            five_min_ago_naive = five_min_ago.replace(tzinfo=None)  # strip juga
+def catat_loglensa_supabase(
+    jenis,
+    tipe,
+    merk,
+    sph,
+    cyl,
+    add_power,
+    source,
+    mode=None,
+    status_lensa=None,
+    jumlah_input=None,
+    stock_lama=None,
+    stock_baru=None,
+    id_transaksi=None,
+    nama=None,
+    user="Unknown"
+):
 
-            mask = (
-                (df_log["status"] == status_log) &
-                (df_log["keterangan"] == keterangan) &
-                (df_log["timestamp_log"] >= five_min_ago_naive)
-            )
+    row_log = buat_row_loglensa(
+        jenis,
+        tipe,
+        merk,
+        sph,
+        cyl,
+        add_power,
+        source,
+        mode=mode,
+        status_lensa=status_lensa,
+        jumlah_input=jumlah_input,
+        stock_lama=stock_lama,
+        stock_baru=stock_baru,
+        id_transaksi=id_transaksi,
+        nama=nama,
+        user=user
+    )
 
-            duplicate = mask.any()
+    if row_log is None:
+        return
 
-    # ==============================
-    # INSERT JIKA TIDAK DUPLICATE
-    # ==============================
+    if source == "ilensa" and log_ilensa_dobel("log_lensa", row_log):
+        return
 
-    if not duplicate:
-        supabase.table("log_lensa").insert({
-            "timestamp_log": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            "tipe": tipe,
-            "merk": merk,
-            "jenis": jenis,
-            "sph": str(sph),
-            "cyl": str(cyl),
-            "add_power": str(add_power),
-            "status": status_log,
-            "keterangan": keterangan,
-            "user_name": user
-        }).execute()
\ No newline at end of file
+    # Log yang sudah ada (idempotency_key sama) dilewati di database
+    insert_rows_supabase("log_lensa", [row_log], on_conflict=LOG_KEY)